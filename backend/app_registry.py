@@ -0,0 +1,200 @@
+"""
+Apps and websites that "open ..." commands can launch, loaded from config.
+
+``apps.json`` (``APP_REGISTRY_FILE``) maps each app to a URL and optional
+aliases; ``users`` holds per-user apps that extend or override the shared
+ones:
+
+    {
+      "apps": {"google maps": {"url": "https://maps.google.com", "aliases": ["maps"]}},
+      "users": {"alice": {"apps": {"wiki": {"url": "https://wiki.example.com"}}}}
+    }
+
+``{CLIENT_BASE_URL}`` in a URL is replaced with that setting.
+
+All aliases compile into one word-level Aho-Corasick automaton (a trie with
+failure links), so a command is matched in a single pass over its words no
+matter how many aliases there are. Matches
+are word-bounded ("google" does not match inside "googled") and the longest
+one wins ("open google maps" finds google maps, not google). A user's own
+apps win ties with the shared ones.
+
+The file is re-read when its mtime or size changes, checked at most every
+``reload_interval`` seconds on lookup; a file that fails to parse leaves the
+previous registry in place.
+"""
+import json
+import os
+import re
+import threading
+import time
+from collections import deque
+from typing import Any, Dict, Generic, Iterable, List, Optional, Tuple, TypeVar
+
+from structured_logging import get_logger
+
+log = get_logger("app_registry")
+
+REGISTRY_FILE = os.getenv("APP_REGISTRY_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "apps.json"))
+WORD_RE = re.compile(r"[a-z0-9]+")
+END = object()   # trie key marking the end of an alias: (length in words, alias, value)
+FAIL = object()  # failure link: node of the longest proper suffix that is also a trie path
+OUT = object()   # nearest node along the failure links where an alias ends
+
+T = TypeVar("T")
+
+
+def alias_words(text: str) -> List[str]:
+    return WORD_RE.findall(text.lower())
+
+
+class AliasMatcher(Generic[T]):
+    """Aho-Corasick automaton over alias words returning the longest alias found in a text"""
+
+    def __init__(self, entries: Iterable[Tuple[str, T]] = ()):
+        self.root: Dict[Any, Any] = {}
+        self.size = 0
+        self._compiled = False
+        for alias, value in entries:
+            self.add(alias, value)
+        self.compile()
+
+    def add(self, alias: str, value: T):
+        words = alias_words(alias)
+        if not words:
+            return
+        node = self.root
+        for word in words:
+            node = node.setdefault(word, {})
+        if END not in node:
+            self.size += 1
+        node[END] = (len(words), " ".join(words), value)
+        self._compiled = False
+
+    def compile(self):
+        """Set the failure and output links (breadth first); done again after ``add``"""
+        queue = deque()
+        for word, child in self.root.items():
+            if isinstance(word, str):
+                child[FAIL] = self.root
+                child.pop(OUT, None)
+                queue.append(child)
+        while queue:
+            node = queue.popleft()
+            for word, child in node.items():
+                if not isinstance(word, str):
+                    continue
+                fallback = node[FAIL]
+                while word not in fallback and fallback is not self.root:
+                    fallback = fallback[FAIL]
+                child[FAIL] = fallback.get(word, self.root)
+                target = child[FAIL]
+                out = target if END in target else target.get(OUT)
+                if out is None:
+                    child.pop(OUT, None)
+                else:
+                    child[OUT] = out
+                queue.append(child)
+        self._compiled = True
+
+    def match(self, text: str) -> Optional[Tuple[int, str, T]]:
+        """(length in words, alias, value) of the longest alias in ``text``; earliest wins ties"""
+        if not self._compiled:
+            self.compile()
+        best = None
+        node = self.root
+        for word in alias_words(text):
+            while word not in node and node is not self.root:
+                node = node[FAIL]
+            node = node.get(word, self.root)
+            # The longest alias ending at this word is this node's own, else the
+            # nearest one along the failure links
+            found = node if END in node else node.get(OUT)
+            # Only a strictly longer alias replaces one that ended earlier (and so started earlier)
+            if found is not None and (best is None or found[END][0] > best[0]):
+                best = found[END]
+        return best
+
+
+class AppRegistry:
+    """Shared and per-user apps from a JSON file, reloaded when it changes"""
+
+    def __init__(self, path: str = REGISTRY_FILE, client_base_url: str = "", reload_interval: float = 1.0):
+        self.path = path
+        self.client_base_url = client_base_url
+        self.reload_interval = reload_interval
+        self.apps: AliasMatcher[Dict[str, str]] = AliasMatcher()
+        self.users: Dict[str, AliasMatcher[Dict[str, str]]] = {}
+        self.loaded_at = 0.0
+        self.reloads = 0
+        self._signature: Optional[Tuple[int, int]] = None
+        self._checked = 0.0
+        self._lock = threading.Lock()
+        self.reload()
+
+    def _compile(self, apps: Dict[str, Any]) -> AliasMatcher[Dict[str, str]]:
+        matcher: AliasMatcher[Dict[str, str]] = AliasMatcher()
+        for name, spec in apps.items():
+            if isinstance(spec, str):
+                spec = {"url": spec}
+            app = {"name": name, "url": spec["url"].replace("{CLIENT_BASE_URL}", self.client_base_url)}
+            for alias in [name, *spec.get("aliases", [])]:
+                matcher.add(alias, app)
+        matcher.compile()
+        return matcher
+
+    def reload(self) -> bool:
+        """Re-read the config file; False (and the old registry kept) if it is missing or invalid"""
+        with self._lock:
+            self._checked = time.monotonic()
+            try:
+                info = os.stat(self.path)
+                # Remembered even if parsing fails, so a broken file is reported once
+                self._signature = (info.st_mtime_ns, info.st_size)
+                with open(self.path, "r", encoding="utf-8") as f:
+                    config = json.load(f)
+                apps = self._compile(config.get("apps", {}))
+                users = {user_id: self._compile(user.get("apps", {}))
+                         for user_id, user in config.get("users", {}).items()}
+            except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+                log.warning("app_registry_load_failed", path=self.path, error=str(e))
+                return False
+            self.apps, self.users = apps, users
+            self.loaded_at = time.time()
+            self.reloads += 1
+            log.info("app_registry_loaded", path=self.path, aliases=apps.size, users=len(users))
+            return True
+
+    def maybe_reload(self):
+        now = time.monotonic()
+        if now - self._checked < self.reload_interval:
+            return
+        self._checked = now
+        try:
+            info = os.stat(self.path)
+        except OSError:
+            return
+        if (info.st_mtime_ns, info.st_size) != self._signature:
+            self.reload()
+
+    def lookup(self, command: str, user_id: Optional[str] = None) -> Optional[Dict[str, str]]:
+        """The app a command names, as {"name", "url", "alias"}, or None"""
+        self.maybe_reload()
+        best = self.apps.match(command)
+        user_apps = self.users.get(user_id) if user_id else None
+        if user_apps is not None:
+            mine = user_apps.match(command)
+            if mine is not None and (best is None or mine[0] >= best[0]):
+                best = mine
+        if best is None:
+            return None
+        return {**best[2], "alias": best[1]}
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "path": self.path,
+            "aliases": self.apps.size,
+            "users": len(self.users),
+            "loaded_at": self.loaded_at,
+            "reloads": self.reloads,
+        }
@@ -0,0 +1,396 @@
+#!/usr/bin/env python3
+"""
+Benchmark suite for the backend voice-command pipeline.
+
+Covers:
+  - parsers: fallback_intent_detection, parse_reminder_request, parse_email_manually
+  - the reminders JSON store (load/save and the add/list/delete endpoints) at increasing sizes
+  - open_app lookups against app registries with thousands of aliases
+  - end-to-end /mcp/intent throughput through an in-process ASGI client
+
+Nothing leaves the process: the MCP self-calls made by the intent handler
+are routed back into the app, and the external upstreams (Hugging Face,
+Gemini, joke/quote/fact APIs) are answered by local stubs. The run happens
+in a temporary directory, so reminders.json and email_drafts/ are untouched.
+
+Results are written as JSON for comparing runs across commits:
+
+    python benchmark.py                      # writes <tmp>/voiceagent_benchmark_results.json
+    python benchmark.py -o run.json          # or anywhere else
+    python benchmark.py --quick -o -         # smaller run, JSON to stdout
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List
+
+import httpx
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+APP_HOST = "bench.local"
+
+UTTERANCES = [
+    "what's the weather like today",
+    "what time is it",
+    "tell me a joke",
+    "give me an inspiring quote",
+    "tell me a fun fact",
+    "open youtube",
+    "please launch my calendar",
+    "remind me to call mom tomorrow at 6 pm",
+    "set a reminder for the dentist appointment on 7 september at 10:30 am",
+    "schedule a meeting tomorrow at 3pm",
+    "draft an email to alex@example.com about the meeting next week",
+    "write a follow up mail to hr@company.com",
+    "who wrote pride and prejudice",
+    "don't open youtube",
+    "how far away is the moon",
+]
+
+# Weather questions and the place weather_location must find (None: no place).
+# Checked before timing, so a parser regression fails the run
+WEATHER_QUESTIONS = [
+    ("what is the weather in new york today", "New York"),
+    ("weather for tomorrow in berlin", "Berlin"),
+    ("weather in berlin for tomorrow", "Berlin"),
+    ("forecast for friday in paris", "Paris"),
+    ("weather at the weekend in são paulo", "São Paulo"),
+    ("what's the weather in the uk", "UK"),
+    ("weather in washington dc", "Washington DC"),
+    ("weather tonight in the city", None),
+    ("forecast for the next few days", None),
+    ("weather for the next hour", None),
+    ("whats the weather at home", None),
+    ("weather in my area", None),
+    ("weather for tomorrow", None),
+]
+
+EMAILS = [
+    "send an email to jane.doe@example.com saying she has been selected for the interview",
+    "draft a mail to team@company.io about the meeting on friday",
+    "write a follow up email to recruiter@jobs.com",
+    "email bob@example.org that he has been shortlisted",
+    "compose an email thanking everyone for their time",
+]
+
+
+# --- Local stubs for every upstream -------------------------------------------
+
+def stub_upstream(request: httpx.Request) -> httpx.Response:
+    """Canned responses for the third-party APIs the routers call"""
+    host = request.url.host
+    if host == "api-inference.huggingface.co":
+        payload = json.loads(request.content or b"{}")
+        if "sequence" in payload:
+            # Zero-shot intent classification: answer like the fallback would
+            from routers.intent import fallback_intent_detection
+            label = fallback_intent_detection(payload["sequence"])
+            return httpx.Response(200, json={"sequence": payload["sequence"], "labels": [label], "scores": [0.9]})
+        return httpx.Response(200, json={"answer": "Here is what I found."})
+    if host == "generativelanguage.googleapis.com":
+        url = "https://mail.google.com/mail/?view=cm&fs=1&to=alex%40example.com&su=Meeting&body=Hi%20Alex"
+        return httpx.Response(200, json={"candidates": [{"content": {"parts": [{"text": url}]}}]})
+    if host == "official-joke-api.appspot.com":
+        return httpx.Response(200, json={"setup": "Why did the function return early?", "punchline": "It had a date."})
+    if host == "type.fit":
+        return httpx.Response(200, json=[{"text": "Stay hungry, stay foolish.", "author": "Steve Jobs"}] * 50)
+    if host == "uselessfacts.jsph.pl":
+        return httpx.Response(200, json={"text": "Honey never spoils."})
+    return httpx.Response(502, json={"error": f"no stub for {host}"})
+
+
+class RoutingTransport(httpx.AsyncBaseTransport):
+    """Send MCP self-calls to the in-process app and everything else to the stubs"""
+
+    def __init__(self, app):
+        self.app = httpx.ASGITransport(app=app)
+        self.upstream = httpx.MockTransport(stub_upstream)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if request.url.host == APP_HOST:
+            return await self.app.handle_async_request(request)
+        return await self.upstream.handle_async_request(request)
+
+
+def load_app(workdir: str):
+    """Import the backend inside ``workdir`` with every HTTP client wired to the stubs"""
+    os.chdir(workdir)
+    os.environ["BASE_URL"] = f"http://{APP_HOST}/mcp"
+    os.environ["HF_TOKEN"] = "bench"
+    os.environ["GEMINI_API_KEY"] = "bench"
+    sys.path.insert(0, HERE)
+    import main
+
+    transport = RoutingTransport(main.app)
+    original = httpx.AsyncClient
+
+    class StubbedAsyncClient(original):
+        def __init__(self, *args, **kwargs):
+            kwargs["transport"] = transport
+            super().__init__(*args, **kwargs)
+
+    # Routers create their clients through ``httpx.AsyncClient`` at call time
+    httpx.AsyncClient = StubbedAsyncClient
+    return main.app, transport
+
+
+# --- Measurement helpers -------------------------------------------------------
+
+def percentile(ordered: List[float], p: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))]
+
+
+def summarize(samples_ms: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples_ms)
+    return {
+        "count": len(ordered),
+        "mean_ms": round(statistics.fmean(ordered), 4) if ordered else 0.0,
+        "p50_ms": round(percentile(ordered, 0.50), 4),
+        "p95_ms": round(percentile(ordered, 0.95), 4),
+        "p99_ms": round(percentile(ordered, 0.99), 4),
+        "max_ms": round(ordered[-1], 4) if ordered else 0.0,
+    }
+
+
+def bench_function(func: Callable[[Any], Any], inputs: List[Any], iterations: int, repeats: int = 5) -> Dict[str, float]:
+    """Time ``func`` over ``inputs``; reports the best of ``repeats`` rounds as per-call cost"""
+    rounds = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        for i in range(iterations):
+            func(inputs[i % len(inputs)])
+        rounds.append((time.perf_counter() - start) / iterations)
+    best = min(rounds)
+    return {
+        "iterations": iterations,
+        "repeats": repeats,
+        "best_us_per_call": round(best * 1e6, 3),
+        "median_us_per_call": round(statistics.median(rounds) * 1e6, 3),
+        "calls_per_second": round(1 / best) if best else 0,
+    }
+
+
+def future_datetime(offset_minutes: int) -> str:
+    return (datetime.now() + timedelta(days=1, minutes=offset_minutes)).strftime("%Y-%m-%d %H:%M:%S")
+
+
+# --- Benchmarks -------------------------------------------------------------------
+
+def bench_parsers(iterations: int) -> Dict[str, Dict]:
+    from routers.intent import fallback_intent_detection, parse_reminder_request, weather_location
+    from routers.email_draft import parse_email_manually
+
+    wrong = [(text, expected, weather_location(text)) for text, expected in WEATHER_QUESTIONS
+             if weather_location(text) != expected]
+    if wrong:
+        raise SystemExit("weather_location regressions (text, expected, got):\n" + "\n".join(map(repr, wrong)))
+    reminders = [u for u in UTTERANCES if fallback_intent_detection(u) == "reminders"]
+    return {
+        "weather_location": bench_function(weather_location, [text for text, _ in WEATHER_QUESTIONS], iterations),
+        "fallback_intent_detection": bench_function(fallback_intent_detection, UTTERANCES, iterations),
+        "parse_reminder_request": bench_function(parse_reminder_request, reminders, iterations),
+        "parse_email_manually": bench_function(parse_email_manually, EMAILS, iterations),
+    }
+
+
+async def bench_reminder_store(client: httpx.AsyncClient, sizes: List[int], operations: int) -> Dict[str, Dict]:
+    from routers import reminders
+
+    results = {}
+    for size in sizes:
+        existing = [{"text": f"Reminder {i}", "datetime": future_datetime(i)} for i in range(size)]
+        reminders.save_reminders(existing)
+        samples: Dict[str, List[float]] = {"load": [], "save": [], "add": [], "list": [], "delete": []}
+
+        for i in range(operations):
+            start = time.perf_counter()
+            stored = reminders.load_reminders()
+            samples["load"].append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            reminders.save_reminders(stored)
+            samples["save"].append((time.perf_counter() - start) * 1000)
+
+            new = {"text": f"Bench {i}", "datetime": future_datetime(size + i)}
+            start = time.perf_counter()
+            await client.post("/mcp/reminders", json=new)
+            samples["add"].append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            await client.get("/mcp/reminders")
+            samples["list"].append((time.perf_counter() - start) * 1000)
+
+            start = time.perf_counter()
+            await client.request("DELETE", "/mcp/reminders", json=new)
+            samples["delete"].append((time.perf_counter() - start) * 1000)
+
+        results[str(size)] = {op: summarize(values) for op, values in samples.items()}
+    return results
+
+
+def bench_app_registry(alias_counts: List[int], iterations: int, seed: int) -> Dict[str, Dict]:
+    """Registry load time and lookup cost versus the old per-request substring scan"""
+    from app_registry import AppRegistry
+
+    rng = random.Random(seed)
+    syllables = ["ka", "lo", "mi", "ne", "ru", "so", "ta", "vi", "zu", "pe", "qua", "dor"]
+    results = {}
+    for count in alias_counts:
+        names = set()
+        while len(names) < count:
+            words = ["".join(rng.choices(syllables, k=rng.randint(2, 4))) for _ in range(rng.randint(1, 3))]
+            names.add(" ".join(words))
+        names = sorted(names)
+        path = os.path.join(os.getcwd(), f"apps-{count}.json")
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({"apps": {name: {"url": f"https://{name.replace(' ', '-')}.example"} for name in names}}, f)
+
+        start = time.perf_counter()
+        registry = AppRegistry(path, reload_interval=3600)
+        load_ms = (time.perf_counter() - start) * 1000
+
+        commands = [f"please open {rng.choice(names)} for me" for _ in range(50)]
+        commands += [f"open the {rng.choice(syllables)}{rng.choice(syllables)} thing" for _ in range(50)]
+        urls = {name: f"https://{name.replace(' ', '-')}.example" for name in names}
+
+        def substring_scan(command):
+            lowered = command.lower()
+            for name, url in urls.items():
+                if name in lowered:
+                    return url
+            return None
+
+        results[str(count)] = {
+            "load_ms": round(load_ms, 2),
+            "lookup": bench_function(registry.lookup, commands, iterations),
+            "substring_scan": bench_function(substring_scan, commands, max(1, iterations // 20)),
+        }
+    return results
+
+
+async def bench_intent(client: httpx.AsyncClient, requests: int, concurrency: int, seed: int) -> Dict[str, Any]:
+    from routers.intent import fallback_intent_detection
+
+    rng = random.Random(seed)
+    workload = [rng.choice(UTTERANCES) for _ in range(requests)]
+    latencies: Dict[str, List[float]] = {}
+    statuses: Dict[str, int] = {}
+    queue = asyncio.Queue()
+    for text in workload:
+        queue.put_nowait(text)
+
+    async def worker():
+        while not queue.empty():
+            text = queue.get_nowait()
+            start = time.perf_counter()
+            response = await client.post("/mcp/intent", json={"text": text})
+            elapsed = (time.perf_counter() - start) * 1000
+            latencies.setdefault(fallback_intent_detection(text), []).append(elapsed)
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_rps": round(requests / elapsed, 1) if elapsed else 0.0,
+        "status": statuses,
+        "latency": summarize([ms for values in latencies.values() for ms in values]),
+        "by_intent": {intent: summarize(values) for intent, values in sorted(latencies.items())},
+    }
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "HEAD"], cwd=HERE, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return ""
+
+
+async def run(args) -> Dict[str, Any]:
+    app, transport = load_app(args.workdir)
+    results: Dict[str, Any] = {
+        "meta": {
+            "commit": git_commit(),
+            "timestamp": datetime.now().isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "quick": args.quick,
+        },
+        "parsers": bench_parsers(args.iterations),
+        "app_registry": bench_app_registry(args.alias_counts, args.iterations, args.seed),
+    }
+    async with httpx.AsyncClient(transport=transport, base_url=f"http://{APP_HOST}") as client:
+        results["reminder_store"] = await bench_reminder_store(client, args.sizes, args.store_ops)
+        await bench_intent(client, min(50, args.requests), args.concurrency, args.seed)  # warm-up
+        results["intent_e2e"] = await bench_intent(client, args.requests, args.concurrency, args.seed)
+    return results
+
+
+def print_summary(results: Dict[str, Any]):
+    print("\nparsers (best µs/call):")
+    for name, stats in results["parsers"].items():
+        print(f"  {name:28}{stats['best_us_per_call']:>10.2f}")
+    print("\nreminder store (p50 ms):")
+    for size, ops in results["reminder_store"].items():
+        print(f"  {size:>7} reminders  " + "  ".join(f"{op} {stats['p50_ms']:.2f}" for op, stats in ops.items()))
+    print("\napp registry (best µs/lookup):")
+    for count, stats in results["app_registry"].items():
+        print(f"  {count:>7} aliases  load {stats['load_ms']:.1f} ms  lookup {stats['lookup']['best_us_per_call']:.2f}"
+              f"  substring scan {stats['substring_scan']['best_us_per_call']:.2f}")
+    e2e = results["intent_e2e"]
+    print(f"\n/mcp/intent: {e2e['throughput_rps']} req/s at concurrency {e2e['concurrency']}, "
+          f"p50 {e2e['latency']['p50_ms']:.2f} ms, p99 {e2e['latency']['p99_ms']:.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    # Outside the source tree so results never end up committed by accident
+    parser.add_argument("-o", "--output", default=os.path.join(tempfile.gettempdir(), "voiceagent_benchmark_results.json"),
+                        help="where to write the JSON results ('-' for stdout)")
+    parser.add_argument("--quick", action="store_true", help="smaller sizes and fewer iterations")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--concurrency", type=int, default=16)
+    args = parser.parse_args()
+
+    # Per-request logging goes through the background log queue; keep it out
+    # of the terminal (set LOG_LEVEL to see it)
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    args.output = args.output if args.output == "-" else os.path.abspath(args.output)
+    args.iterations = 2000 if args.quick else 20000
+    args.sizes = [10, 100, 1000] if args.quick else [10, 100, 1000, 10000]
+    args.store_ops = 5 if args.quick else 20
+    args.alias_counts = [1000, 5000] if args.quick else [1000, 10000, 50000]
+    args.requests = 200 if args.quick else 2000
+
+    with tempfile.TemporaryDirectory(prefix="voiceagent-bench-") as workdir:
+        args.workdir = workdir
+        results = asyncio.run(run(args))
+        os.chdir(HERE)
+
+    if args.output == "-":
+        json.dump(results, sys.stdout, indent=2)
+        print()
+        return
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print_summary(results)
+    print(f"\nResults written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
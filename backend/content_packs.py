@@ -0,0 +1,150 @@
+"""
+Offline jokes, quotes and facts for the fun router.
+
+Each pack is a small tab-separated file under ``content/`` (one item per
+line, first column the category) loaded once into in-memory arrays, with
+a per-category id list and an inverted word index (item text and category
+names) for keyword lookup. A keyword search prefers items matching all of
+its words and falls back to items matching any of them.
+
+Picking is O(1): a random index into the pool. For a user, items are
+rotated without repeats: each (user, pool) walks the pool along a random
+affine permutation ``(a * i + b) mod n``, so the state per user is three
+integers no matter how big the pack is. A new permutation starts once every
+item in the pool has been served.
+
+More items can be merged in with ``add``; duplicates (same normalized
+text) are ignored. A pool that grows starts its users' rotations over.
+"""
+import csv
+import math
+import os
+import random
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+CONTENT_DIR = os.getenv("FUN_CONTENT_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "content"))
+
+WORD_RE = re.compile(r"[a-z0-9']+")
+STOPWORDS = frozenset("a an and are as at be by for from i in is it me of on or that the this to was what with you".split())
+
+
+def words(text: str) -> List[str]:
+    return [w for w in WORD_RE.findall(text.lower()) if w not in STOPWORDS]
+
+
+def normalize(text: str) -> str:
+    return " ".join(WORD_RE.findall(text.lower()))
+
+
+class ContentPack:
+    """One kind of content (jokes, quotes or facts) held in memory"""
+
+    def __init__(self, name: str, fields: Sequence[str], text_fields: Sequence[str], max_users: int = 10000):
+        self.name = name
+        self.fields = tuple(fields)            # e.g. ("category", "setup", "punchline")
+        self.text_fields = tuple(text_fields)  # fields that identify an item and are searchable
+        self.max_users = max_users
+        self.items: List[Tuple[str, ...]] = []
+        self.by_category: Dict[str, List[int]] = {}
+        self.by_word: Dict[str, List[int]] = {}
+        self._seen: set = set()
+        self._rotations: "OrderedDict[Tuple[str, str], List[int]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    @classmethod
+    def load(cls, name: str, fields: Sequence[str], text_fields: Sequence[str], directory: str = CONTENT_DIR) -> "ContentPack":
+        pack = cls(name, fields, text_fields)
+        path = os.path.join(directory, f"{name}.tsv")
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            rows = [row for row in csv.reader(f, delimiter="\t", quoting=csv.QUOTE_NONE) if row and not row[0].startswith("#")]
+        pack.add(rows)
+        return pack
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def add(self, rows: Iterable[Sequence[str]]) -> int:
+        """Append items (tuples in ``fields`` order); returns how many were new"""
+        added = 0
+        with self._lock:
+            for row in rows:
+                item = tuple(str(value).strip() for value in row)
+                if len(item) != len(self.fields):
+                    continue
+                record = dict(zip(self.fields, item))
+                key = normalize(" ".join(record[field] for field in self.text_fields))
+                if not key or key in self._seen:
+                    continue
+                self._seen.add(key)
+                index = len(self.items)
+                self.items.append(item)
+                self.by_category.setdefault(record["category"].lower(), []).append(index)
+                # Category names are searchable too ("a programming joke")
+                for word in set(words(key)) | set(words(record["category"])):
+                    self.by_word.setdefault(word, []).append(index)
+                added += 1
+        return added
+
+    def categories(self) -> Dict[str, int]:
+        return {category: len(ids) for category, ids in sorted(self.by_category.items())}
+
+    def _pool(self, category: Optional[str], keyword: Optional[str]) -> Optional[List[int]]:
+        """Candidate ids, or None for the whole pack"""
+        pool = None
+        if category:
+            pool = self.by_category.get(category.lower(), [])
+        if keyword:
+            # Items matching every word, else items matching any of them
+            matches = [set(self.by_word.get(word, ())) for word in dict.fromkeys(words(keyword))]
+            if matches:
+                ids = set.intersection(*matches) or set.union(*matches)
+                pool = sorted(ids) if pool is None else [i for i in pool if i in ids]
+        return pool
+
+    def pick(self, user_id: Optional[str] = None, category: Optional[str] = None,
+             keyword: Optional[str] = None) -> Optional[Dict[str, str]]:
+        """A random item (never repeating for ``user_id`` until its pool is exhausted)"""
+        with self._lock:
+            pool = self._pool(category, keyword)
+            size = len(self.items) if pool is None else len(pool)
+            if not size:
+                return None
+            if user_id:
+                position = self._next_position(user_id, f"{category or ''}|{keyword or ''}", size)
+            else:
+                position = random.randrange(size)
+            index = position if pool is None else pool[position]
+            return dict(zip(self.fields, self.items[index]), id=str(index))
+
+    def _next_position(self, user_id: str, pool_key: str, size: int) -> int:
+        key = (user_id, pool_key)
+        state = self._rotations.get(key)
+        if state is None or state[2] >= size or state[3] != size:
+            # New permutation: any multiplier coprime with the size visits every slot once
+            a = random.randrange(1, size + 1) if size > 1 else 1
+            while math.gcd(a, size) != 1:
+                a += 1
+            state = [a, random.randrange(size), 0, size]
+            self._rotations[key] = state
+        self._rotations.move_to_end(key)
+        while len(self._rotations) > self.max_users:
+            self._rotations.popitem(last=False)
+        a, b, step, _ = state
+        state[2] = step + 1
+        return (a * step + b) % size
+
+    def forget_user(self, user_id: str):
+        with self._lock:
+            for key in [key for key in self._rotations if key[0] == user_id]:
+                del self._rotations[key]
+
+
+def load_packs(directory: str = CONTENT_DIR) -> Dict[str, ContentPack]:
+    return {
+        "jokes": ContentPack.load("jokes", ("category", "setup", "punchline"), ("setup", "punchline"), directory),
+        "quotes": ContentPack.load("quotes", ("category", "text", "author"), ("text",), directory),
+        "facts": ContentPack.load("facts", ("category", "text"), ("text",), directory),
+    }
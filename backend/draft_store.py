@@ -0,0 +1,218 @@
+"""
+Saved email drafts in one SQLite database with a full-text index.
+
+Drafts live in a ``drafts`` table; an FTS5 table over subject and body is
+kept in sync by triggers, so search is an index lookup ranked by BM25
+(subject matches weigh more than body matches) instead of a directory scan.
+Listing pages by id (newest first) with a cursor, so every page costs the
+same no matter how deep it is.
+
+Drafts saved before the store existed were loose ``.txt`` files in
+``email_drafts/``; import them with
+
+    python draft_store.py migrate [--dir email_drafts] [--db path]
+
+Importing is idempotent: each file is recorded by name and skipped the
+second time. The copies ``EMAIL_DRAFT_FILES=1`` writes are recorded the same
+way when saved, so they are never imported as second drafts.
+"""
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
+
+from structured_logging import get_logger
+
+log = get_logger("draft_store")
+
+DEFAULT_DB = os.getenv("EMAIL_DRAFT_DB", os.path.join("email_drafts", "drafts.sqlite"))
+FILENAME_TIME_RE = re.compile(r"^(\d{8}_\d{6})_")
+TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def safe_filename(subject: str, max_length: int = 60) -> str:
+    """Subject reduced to characters that are safe in a filename on any OS"""
+    name = re.sub(r"[^A-Za-z0-9._-]+", "_", subject).strip("._")[:max_length]
+    return name or "draft"
+
+
+def match_query(text: str) -> Optional[str]:
+    """Free text as an FTS5 query: every word must match, the last one as a prefix"""
+    tokens = TOKEN_RE.findall(text)
+    if not tokens:
+        return None
+    quoted = [f'"{token}"' for token in tokens]
+    quoted[-1] += "*"
+    return " ".join(quoted)
+
+
+class DraftStore:
+    """Email drafts with FTS5 search over subject and body"""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS drafts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        created_at TEXT NOT NULL,
+        to_addr TEXT NOT NULL DEFAULT '',
+        subject TEXT NOT NULL,
+        body TEXT NOT NULL,
+        source TEXT UNIQUE
+    );
+    CREATE VIRTUAL TABLE IF NOT EXISTS drafts_fts USING fts5(
+        subject, body, content='drafts', content_rowid='id'
+    );
+    CREATE TRIGGER IF NOT EXISTS drafts_ai AFTER INSERT ON drafts BEGIN
+        INSERT INTO drafts_fts (rowid, subject, body) VALUES (new.id, new.subject, new.body);
+    END;
+    CREATE TRIGGER IF NOT EXISTS drafts_ad AFTER DELETE ON drafts BEGIN
+        INSERT INTO drafts_fts (drafts_fts, rowid, subject, body) VALUES ('delete', old.id, old.subject, old.body);
+    END;
+    CREATE TRIGGER IF NOT EXISTS drafts_au AFTER UPDATE ON drafts BEGIN
+        INSERT INTO drafts_fts (drafts_fts, rowid, subject, body) VALUES ('delete', old.id, old.subject, old.body);
+        INSERT INTO drafts_fts (rowid, subject, body) VALUES (new.id, new.subject, new.body);
+    END;
+    """
+    COLUMNS = ("id", "created_at", "to_addr", "subject", "body")
+
+    def __init__(self, path: str = DEFAULT_DB):
+        self.path = path
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._local = threading.local()
+        self._conn().executescript(self.SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread, WAL so readers don't wait on the writer
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=10, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    def _row(self, row: Tuple) -> Dict[str, Any]:
+        draft = dict(zip(self.COLUMNS, row))
+        draft["to"] = draft.pop("to_addr")
+        return draft
+
+    def save(self, subject: str, body: str, to: str = "", created_at: Optional[str] = None,
+             source: Optional[str] = None) -> Optional[int]:
+        """Store a draft; returns its id (None if ``source`` was already imported)"""
+        cursor = self._conn().execute(
+            "INSERT OR IGNORE INTO drafts (created_at, to_addr, subject, body, source) VALUES (?, ?, ?, ?, ?)",
+            (created_at or datetime.now().isoformat(timespec="seconds"), to or "", subject, body, source)
+        )
+        return cursor.lastrowid if cursor.rowcount else None
+
+    def set_source(self, draft_id: int, source: str) -> bool:
+        """Record the file a draft was also written to, so importing that file skips it"""
+        return self._conn().execute("UPDATE drafts SET source = ? WHERE id = ?", (source, draft_id)).rowcount > 0
+
+    def get(self, draft_id: int) -> Optional[Dict[str, Any]]:
+        row = self._conn().execute(
+            f"SELECT {', '.join(self.COLUMNS)} FROM drafts WHERE id = ?", (draft_id,)
+        ).fetchone()
+        return self._row(row) if row else None
+
+    def delete(self, draft_id: int) -> bool:
+        return self._conn().execute("DELETE FROM drafts WHERE id = ?", (draft_id,)).rowcount > 0
+
+    def count(self) -> int:
+        return self._conn().execute("SELECT COUNT(*) FROM drafts").fetchone()[0]
+
+    def page(self, limit: int = 20, before: Optional[int] = None) -> Dict[str, Any]:
+        """Newest drafts first; pass the returned ``next_cursor`` as ``before`` for the next page"""
+        rows = self._conn().execute(
+            f"SELECT {', '.join(self.COLUMNS)} FROM drafts WHERE id < ? ORDER BY id DESC LIMIT ?",
+            (before if before is not None else 2 ** 63 - 1, limit + 1)
+        ).fetchall()
+        drafts = [self._row(row) for row in rows[:limit]]
+        return {
+            "drafts": drafts,
+            "next_cursor": drafts[-1]["id"] if len(rows) > limit else None,
+        }
+
+    def search(self, text: str, limit: int = 20, offset: int = 0) -> List[Dict[str, Any]]:
+        """Best matches for ``text`` with a highlighted snippet of the body"""
+        query = match_query(text)
+        if query is None:
+            return []
+        rows = self._conn().execute(
+            f"""SELECT {', '.join('d.' + c for c in self.COLUMNS)},
+                       snippet(drafts_fts, 1, '[', ']', '...', 12), bm25(drafts_fts, 4.0, 1.0)
+                FROM drafts_fts JOIN drafts d ON d.id = drafts_fts.rowid
+                WHERE drafts_fts MATCH ?
+                ORDER BY bm25(drafts_fts, 4.0, 1.0) LIMIT ? OFFSET ?""",
+            (query, limit, offset)
+        ).fetchall()
+        results = []
+        for row in rows:
+            draft = self._row(row[:len(self.COLUMNS)])
+            draft["snippet"] = row[-2]
+            draft["score"] = round(-row[-1], 4)
+            results.append(draft)
+        return results
+
+    def import_directory(self, directory: str) -> Dict[str, int]:
+        """Import ``.txt`` drafts written by the old file-per-draft ``save_email``"""
+        counts = {"imported": 0, "skipped": 0, "failed": 0}
+        if not os.path.isdir(directory):
+            return counts
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for name in sorted(os.listdir(directory)):
+                path = os.path.join(directory, name)
+                if not name.endswith(".txt") or not os.path.isfile(path):
+                    continue
+                try:
+                    with open(path, "r", encoding="utf-8") as f:
+                        text = f.read()
+                except (OSError, UnicodeDecodeError) as e:
+                    log.warning("draft_import_failed", file=name, error=str(e))
+                    counts["failed"] += 1
+                    continue
+                subject, body = parse_draft_file(text)
+                match = FILENAME_TIME_RE.match(name)
+                if match:
+                    created = datetime.strptime(match.group(1), "%Y%m%d_%H%M%S")
+                else:
+                    created = datetime.fromtimestamp(os.path.getmtime(path))
+                draft_id = self.save(subject, body, created_at=created.isoformat(timespec="seconds"), source=name)
+                counts["imported" if draft_id is not None else "skipped"] += 1
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        log.info("drafts_imported", directory=directory, **counts)
+        return counts
+
+
+def parse_draft_file(text: str) -> Tuple[str, str]:
+    """(subject, body) from the "Subject: ...\\n\\n<body>" file format"""
+    first, _, rest = text.partition("\n")
+    if first.startswith("Subject:"):
+        return first[len("Subject:"):].strip() or "No Subject", rest.lstrip("\n")
+    return "No Subject", text
+
+
+def main():
+    import argparse
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    sub = parser.add_subparsers(dest="command", required=True)
+    migrate = sub.add_parser("migrate", help="import the .txt drafts of an email_drafts directory")
+    migrate.add_argument("--dir", default="email_drafts")
+    migrate.add_argument("--db", default=DEFAULT_DB)
+    args = parser.parse_args()
+
+    store = DraftStore(args.db)
+    counts = store.import_directory(args.dir)
+    print(f"imported {counts['imported']}, already present {counts['skipped']}, "
+          f"failed {counts['failed']}; {store.count()} drafts in {args.db}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,8 +1,16 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from routers import open_app, search, reminders, email_draft, fun, weather_time, intent
 
-app = FastAPI(title="VoiceAgent Backend")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Background prefetch tasks and pooled clients are closed on shutdown
+    await fun.close()
+    await email_draft.close()
+
+app = FastAPI(title="VoiceAgent Backend", lifespan=lifespan)
 
 # CORS middleware for frontend-backend communication
 app.add_middleware(
@@ -0,0 +1,125 @@
+"""
+Background-filled buffer of items from a slow remote source.
+
+Requests take an item from the buffer without waiting (``get`` returns None
+when it is empty, and the caller falls back to local content). A background
+task refills the buffer to ``target_depth`` whenever it runs low:
+
+- calls to the source are spaced at least ``min_interval`` seconds apart;
+- failures, and fetches that only return items already seen, back off
+  exponentially with full jitter up to ``max_backoff`` seconds;
+- items are deduplicated by key against the buffer and recently served
+  items.
+
+``stats()`` reports depth, hit rate and refill latency.
+"""
+import asyncio
+import random
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional
+
+from structured_logging import get_logger
+
+log = get_logger("prefetch")
+
+
+class PrefetchBuffer:
+    """Items from ``fetch`` kept ready for immediate use"""
+
+    def __init__(self, name: str, fetch: Callable[[], Awaitable[List[Any]]], key: Callable[[Any], str],
+                 target_depth: int = 10, min_interval: float = 1.0, base_backoff: float = 1.0,
+                 max_backoff: float = 300.0, remember: int = 1000):
+        self.name = name
+        self.fetch = fetch
+        self.key = key
+        self.target_depth = target_depth
+        self.min_interval = min_interval
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.remember = remember
+        self.items: Deque[Any] = deque()
+        self._seen: "OrderedDict[str, None]" = OrderedDict()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._last_fetch = 0.0
+        self._failures = 0
+        self._refill_ms: Deque[float] = deque(maxlen=100)
+        self.counts = {"hits": 0, "misses": 0, "fetches": 0, "fetch_errors": 0, "duplicates": 0}
+        self.backoff_until = 0.0
+
+    def get(self) -> Optional[Any]:
+        """Next buffered item, or None (never waits); wakes the refill task when low"""
+        self._ensure_worker()
+        item = self.items.popleft() if self.items else None
+        self.counts["hits" if item is not None else "misses"] += 1
+        if len(self.items) < self.target_depth:
+            self._wakeup.set()
+        return item
+
+    def _ensure_worker(self):
+        if self._task is None or self._task.done():
+            self._wakeup = asyncio.Event()
+            self._wakeup.set()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+
+    def _add(self, items: List[Any]) -> int:
+        added = 0
+        for item in items:
+            key = self.key(item)
+            if not key or key in self._seen:
+                self.counts["duplicates"] += 1
+                continue
+            self._seen[key] = None
+            while len(self._seen) > self.remember:
+                self._seen.popitem(last=False)
+            # A batch may overshoot the target; keep it rather than waste a fetch
+            if len(self.items) < 2 * self.target_depth:
+                self.items.append(item)
+                added += 1
+        return added
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while len(self.items) < self.target_depth:
+                # Rate limit and back off before touching the source again
+                delay = max(self._last_fetch + self.min_interval, self.backoff_until) - time.monotonic()
+                if delay > 0:
+                    await asyncio.sleep(delay)
+                self._last_fetch = time.monotonic()
+                start = time.perf_counter()
+                try:
+                    added = self._add(await self.fetch())
+                    self.counts["fetches"] += 1
+                    self._refill_ms.append((time.perf_counter() - start) * 1000)
+                except Exception as e:
+                    self.counts["fetch_errors"] += 1
+                    log.warning("prefetch_failed", buffer=self.name, error=str(e), failures=self._failures + 1)
+                    added = 0
+                if added:
+                    self._failures = 0
+                    self.backoff_until = 0.0
+                else:
+                    # Full jitter: anywhere up to the exponential bound
+                    self._failures += 1
+                    bound = min(self.max_backoff, self.base_backoff * 2 ** self._failures)
+                    self.backoff_until = time.monotonic() + random.uniform(0, bound)
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.counts["hits"] + self.counts["misses"]
+        samples = sorted(self._refill_ms)
+        return {
+            "depth": len(self.items),
+            "target_depth": self.target_depth,
+            **self.counts,
+            "hit_rate": round(self.counts["hits"] / lookups, 3) if lookups else 0.0,
+            "refill_p50_ms": round(samples[len(samples) // 2], 1) if samples else None,
+            "refill_max_ms": round(samples[-1], 1) if samples else None,
+            "backoff_remaining_s": round(max(self.backoff_until - time.monotonic(), 0.0), 1),
+        }
@@ -1,25 +1,138 @@
-from fastapi import APIRouter, Request
+from fastapi import APIRouter, HTTPException, Request
+import asyncio
 import os
+import time
 import httpx
 import re
 import urllib.parse
+from collections import OrderedDict, deque
 from datetime import datetime
+from typing import Optional
 from dotenv import load_dotenv
 
+from draft_store import DraftStore, safe_filename
+from structured_logging import get_logger
+
 load_dotenv()
 
 router = APIRouter()
+log = get_logger("email_draft")
 EMAIL_DIR = "email_drafts"
-os.makedirs(EMAIL_DIR, exist_ok=True)
 
-async def generate_email_with_gemini(text):
-    """Generate email using Gemini API with specified prompt format"""
+# Saved drafts go to an indexed SQLite store; EMAIL_DRAFT_FILES=1 also keeps
+# the old readable .txt copy per draft
+_drafts = None
+WRITE_FILES = os.getenv("EMAIL_DRAFT_FILES", "0") == "1"
+
+def draft_store():
+    # Opened on first use, so importing the router creates no files
+    global _drafts
+    if _drafts is None:
+        _drafts = DraftStore()
+    return _drafts
+
+# Drafting tiers, cheapest first: a local template when the request is nothing
+# but a template phrase, an LRU cache of earlier LLM drafts (keyed by normalized text), then
+# Gemini under a hard deadline with the template draft as the fallback
+GEMINI_URL = "https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent"
+LLM_DEADLINE = float(os.getenv("EMAIL_LLM_DEADLINE", "4"))
+CACHE_SIZE = int(os.getenv("EMAIL_CACHE_SIZE", "256"))
+CACHE_TTL = float(os.getenv("EMAIL_CACHE_TTL", "86400"))
+TIERS = ("template", "cache", "llm", "fallback")
+
+_client = None
+_cache = OrderedDict()  # normalized text -> (expires_at, draft)
+_inflight = {}          # normalized text -> running Gemini task
+_tier_latency = {tier: deque(maxlen=500) for tier in TIERS}
+_tier_counts = {tier: 0 for tier in TIERS}
+
+def _http():
+    # One pooled client for every Gemini call instead of a new one per email
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(timeout=httpx.Timeout(LLM_DEADLINE + 1, connect=2.0))
+    return _client
+
+async def close():
+    """Cancel unfinished Gemini calls and close the pooled client (on app shutdown)"""
+    global _client
+    for task in list(_inflight.values()):
+        task.cancel()
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+def normalize_request(text):
+    """Cache key: lowercase words, with emails kept intact"""
+    return " ".join(re.findall(r"[a-z0-9._%+-]+@[a-z0-9.-]+|[a-z0-9']+", text.lower()))
+
+def _record(tier, start):
+    _tier_counts[tier] += 1
+    _tier_latency[tier].append((time.perf_counter() - start) * 1000)
+
+def _cache_get(key):
+    entry = _cache.get(key)
+    if entry is None:
+        return None
+    if entry[0] < time.monotonic():
+        del _cache[key]
+        return None
+    _cache.move_to_end(key)
+    return entry[1]
+
+def _cache_put(key, draft):
+    _cache[key] = (time.monotonic() + CACHE_TTL, draft)
+    _cache.move_to_end(key)
+    while len(_cache) > CACHE_SIZE:
+        _cache.popitem(last=False)
+
+async def draft_email(text):
+    """Return (draft, tier) for an email command"""
+    start = time.perf_counter()
+    if is_bare_template(text):
+        _record("template", start)
+        return parse_email_manually(text), "template"
+
     gemini_api_key = os.getenv("GEMINI_API_KEY")
-    
     if not gemini_api_key or gemini_api_key == "YOUR_GEMINI_API_KEY_HERE":
         # Fallback to simple parsing if no API key
-        return parse_email_manually(text)
-    
+        _record("fallback", start)
+        return parse_email_manually(text), "fallback"
+
+    key = normalize_request(text)
+    cached = _cache_get(key)
+    if cached is not None:
+        _record("cache", start)
+        return cached, "cache"
+
+    # Identical requests share one call; a call that misses the deadline keeps
+    # running in the background and fills the cache for the next time
+    task = _inflight.get(key)
+    if task is None:
+        task = asyncio.ensure_future(generate_email_with_gemini(text, gemini_api_key))
+        _inflight[key] = task
+
+        def _done(t, key=key):
+            _inflight.pop(key, None)
+            if not t.cancelled() and t.exception() is None and t.result() is not None:
+                _cache_put(key, t.result())
+        task.add_done_callback(_done)
+    try:
+        draft = await asyncio.wait_for(asyncio.shield(task), timeout=LLM_DEADLINE)
+    except asyncio.TimeoutError:
+        log.warning("gemini_deadline_exceeded", deadline_s=LLM_DEADLINE)
+        draft = None
+    except Exception as e:
+        log.error("gemini_request_failed", error=str(e))
+        draft = None
+    if draft is None:
+        _record("fallback", start)
+        return parse_email_manually(text), "fallback"
+    _record("llm", start)
+    return draft, "llm"
+
+async def generate_email_with_gemini(text, gemini_api_key):
+    """Ask Gemini for a Gmail compose URL; None if the answer is unusable"""
     # Create the exact prompt format you specified
     prompt = f"""You are an assistant that generates a single Gmail compose URL.
 
@@ -36,48 +149,73 @@ Instructions:
 
 User query: {text}"""
     
-    try:
-        url = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-1.5-flash:generateContent?key={gemini_api_key}"
-        headers = {"Content-Type": "application/json"}
-        payload = {
-            "contents": [{
-                "parts": [{
-                    "text": prompt
-                }]
+    # The key goes in a header so it never ends up in URL logs
+    headers = {"Content-Type": "application/json", "x-goog-api-key": gemini_api_key}
+    payload = {
+        "contents": [{
+            "parts": [{
+                "text": prompt
             }]
-        }
-        
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json=payload, headers=headers)
-            
-            if response.status_code == 200:
-                data = response.json()
-                generated_url = data['candidates'][0]['content']['parts'][0]['text'].strip()
-                
-                # Extract URL if there's extra text
-                url_match = re.search(r'https://mail\.google\.com[^\s\n]+', generated_url)
-                if url_match:
-                    gmail_url = url_match.group(0)
-                    
-                    # Parse the URL to extract components for preview
-                    parsed_url = urllib.parse.urlparse(gmail_url)
-                    query_params = urllib.parse.parse_qs(parsed_url.query)
-                    
-                    return {
-                        "gmail_url": gmail_url,
-                        "to": urllib.parse.unquote(query_params.get('to', [''])[0]),
-                        "subject": urllib.parse.unquote(query_params.get('su', [''])[0]),
-                        "body": urllib.parse.unquote(query_params.get('body', [''])[0])
-                    }
-                else:
-                    # If no URL found, fallback
-                    return parse_email_manually(text)
-            else:
-                return parse_email_manually(text)
-                
-    except Exception as e:
-        print(f"Gemini API error: {e}")
-        return parse_email_manually(text)
+        }]
+    }
+    
+    response = await _http().post(GEMINI_URL, json=payload, headers=headers)
+    if response.status_code != 200:
+        log.warning("gemini_bad_status", status=response.status_code)
+        return None
+    data = response.json()
+    generated_url = data['candidates'][0]['content']['parts'][0]['text'].strip()
+    
+    # Extract URL if there's extra text
+    url_match = re.search(r'https://mail\.google\.com[^\s\n]+', generated_url)
+    if not url_match:
+        return None
+    gmail_url = url_match.group(0)
+    
+    # Parse the URL to extract components for preview
+    parsed_url = urllib.parse.urlparse(gmail_url)
+    query_params = urllib.parse.parse_qs(parsed_url.query)
+    
+    return {
+        "gmail_url": gmail_url,
+        "to": urllib.parse.unquote(query_params.get('to', [''])[0]),
+        "subject": urllib.parse.unquote(query_params.get('su', [''])[0]),
+        "body": urllib.parse.unquote(query_params.get('body', [''])[0])
+    }
+
+# Words that carry no content of their own in an email command
+TEMPLATE_FILLER = frozenset(
+    "please kindly can could would you a an the to for about with regarding saying say tell that "
+    "send write draft compose email mail message quick short him her them he she they has have is "
+    "been was just".split()
+)
+# Everything else the command says must be exactly one of these for the
+# canned template to be used; any other detail needs a real draft
+BARE_TEMPLATES = frozenset(map(frozenset, (
+    ("meeting",), ("meeting", "request"), ("schedule", "meeting"), ("request", "meeting"),
+    ("follow", "up"), ("followup",), ("follow", "up", "previous", "conversation"),
+    ("interview", "invitation"), ("selected", "interview"), ("shortlisted", "interview"),
+    ("selected",), ("shortlisted",), ("selection", "notification"),
+)))
+
+def is_bare_template(text):
+    """True when the request is only a recipient plus a template phrase ("write a follow up email to x@y.com")"""
+    words = [w for w in normalize_request(text).split() if "@" not in w and w not in TEMPLATE_FILLER]
+    return bool(words) and frozenset(words) in BARE_TEMPLATES and match_template(text) is not None
+
+def match_template(text):
+    """(subject, body) of the canned template the request matches, or None"""
+    text_lower = text.lower()
+    
+    if "interview" in text_lower and "selected" in text_lower:
+        return "Interview Invitation", "Congratulations! You have been shortlisted for an interview. Please confirm your availability."
+    elif "meeting" in text_lower:
+        return "Meeting Request", "I would like to schedule a meeting with you. Please let me know your availability."
+    elif "follow" in text_lower and "up" in text_lower:
+        return "Follow-up", "I hope this email finds you well. I wanted to follow up on our previous conversation."
+    elif "selected" in text_lower or "shortlisted" in text_lower:
+        return "Selection Notification", "Congratulations! You have been selected. We will be in touch with next steps shortly."
+    return None
 
 def parse_email_manually(text):
     """Fallback manual email parsing"""
@@ -86,23 +224,7 @@ def parse_email_manually(text):
     recipient = email_match.group(1) if email_match else "recipient@example.com"
     
     # Generate subject and body based on content
-    text_lower = text.lower()
-    
-    if "interview" in text_lower and "selected" in text_lower:
-        subject = "Interview Invitation"
-        body = "Congratulations! You have been shortlisted for an interview. Please confirm your availability."
-    elif "meeting" in text_lower:
-        subject = "Meeting Request"
-        body = "I would like to schedule a meeting with you. Please let me know your availability."
-    elif "follow" in text_lower and "up" in text_lower:
-        subject = "Follow-up"
-        body = "I hope this email finds you well. I wanted to follow up on our previous conversation."
-    elif "selected" in text_lower or "shortlisted" in text_lower:
-        subject = "Selection Notification"
-        body = "Congratulations! You have been selected. We will be in touch with next steps shortly."
-    else:
-        subject = "Important Message"
-        body = "I hope this email finds you well. Thank you for your time."
+    subject, body = match_template(text) or ("Important Message", "I hope this email finds you well. Thank you for your time.")
     
     # Create Gmail URL manually
     to = urllib.parse.quote(recipient)
@@ -121,24 +243,67 @@ def parse_email_manually(text):
 @router.post("")
 async def save_email(request: Request):
     data = await request.json()
-    subject = data.get("subject", "No Subject")
+    subject = data.get("subject") or "No Subject"
     body = data.get("body", "")
-    filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{subject.replace(' ', '_')}.txt"
-    path = os.path.join(EMAIL_DIR, filename)
-    with open(path, "w", encoding="utf-8") as f:
-        f.write(f"Subject: {subject}\n\n{body}")
-    return {"status": "saved", "filename": filename}
+    drafts = draft_store()
+    draft_id = drafts.save(subject, body, to=data.get("to", ""))
+    result = {"status": "saved", "id": draft_id}
+    if WRITE_FILES:
+        filename = f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{draft_id}_{safe_filename(subject)}.txt"
+        drafts.set_source(draft_id, filename)
+        os.makedirs(EMAIL_DIR, exist_ok=True)
+        with open(os.path.join(EMAIL_DIR, filename), "w", encoding="utf-8") as f:
+            f.write(f"Subject: {subject}\n\n{body}")
+        result["filename"] = filename
+    return result
+
+@router.get("/drafts")
+async def list_drafts(limit: int = 20, cursor: Optional[int] = None):
+    """Saved drafts, newest first; pass next_cursor back for the following page"""
+    drafts = draft_store()
+    return {**drafts.page(limit=max(1, min(limit, 100)), before=cursor), "total": drafts.count()}
+
+@router.get("/drafts/search")
+async def search_drafts(q: str, limit: int = 20, offset: int = 0):
+    """Full-text search over saved subjects and bodies"""
+    return {"query": q, "results": draft_store().search(q, limit=max(1, min(limit, 100)), offset=max(0, offset))}
+
+@router.get("/drafts/{draft_id}")
+async def get_draft(draft_id: int):
+    draft = draft_store().get(draft_id)
+    if draft is None:
+        raise HTTPException(status_code=404, detail="Draft not found")
+    return draft
 
 @router.post("/generate")
 async def generate_email_draft(request: Request):
-    """Generate email draft using Gemini API"""
+    """Generate email draft (template, cached or Gemini)"""
     data = await request.json()
     text = data.get("text", "")
     
-    # Generate email using Gemini API
-    result = await generate_email_with_gemini(text)
+    result, tier = await draft_email(text)
     
     return {
         "gmail_url": result["gmail_url"],
-        "preview": f"To: {result['to']}\nSubject: {result['subject']}"
+        "preview": f"To: {result['to']}\nSubject: {result['subject']}",
+        "tier": tier
+    }
+
+@router.get("/stats")
+async def drafting_stats():
+    """Requests and latency per drafting tier"""
+    tiers = {}
+    for tier in TIERS:
+        samples = sorted(_tier_latency[tier])
+        tiers[tier] = {
+            "count": _tier_counts[tier],
+            "p50_ms": round(samples[len(samples) // 2], 2) if samples else None,
+            "p95_ms": round(samples[int(len(samples) * 0.95)], 2) if samples else None,
+        }
+    total = sum(_tier_counts.values())
+    return {
+        "tiers": tiers,
+        "share": {tier: round(_tier_counts[tier] / total, 3) if total else 0.0 for tier in TIERS},
+        "cache_entries": len(_cache),
+        "llm_deadline_s": LLM_DEADLINE,
     }
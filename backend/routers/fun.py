@@ -1,27 +1,136 @@
 from fastapi import APIRouter
+from typing import Dict, List, Optional
+import os
+import random
 import httpx
 
+from content_packs import load_packs, normalize
+from prefetch_buffer import PrefetchBuffer
+
 router = APIRouter()
 
+# Jokes, quotes and facts are served from bundled content packs loaded at
+# startup. With FUN_REMOTE_PREFETCH=1 the public APIs below feed per-category
+# prefetch buffers that background tasks keep filled, so requests take a
+# remote item without waiting and fall back to the packs when a buffer is empty
+packs = load_packs()
+
+REMOTE_PREFETCH = os.getenv("FUN_REMOTE_PREFETCH", "0") == "1"
+PREFETCH_DEPTH = int(os.getenv("FUN_PREFETCH_DEPTH", "10"))
+REMOTE_MIN_INTERVAL = float(os.getenv("FUN_REMOTE_MIN_INTERVAL", "2"))
+REMOTE_TIMEOUT = float(os.getenv("FUN_REMOTE_TIMEOUT", "5"))
+JOKES_URL = "https://official-joke-api.appspot.com/jokes"
+JOKE_CATEGORIES = ("general", "programming", "knock-knock")
+QUOTES_URL = "https://type.fit/api/quotes"
+FACT_URL = "https://uselessfacts.jsph.pl/random.json?language=en"
+
+_client: Optional[httpx.AsyncClient] = None
+buffers: Dict[str, PrefetchBuffer] = {}
+
+
+def _http() -> httpx.AsyncClient:
+    # One pooled client for all background fetches
+    global _client
+    if _client is None:
+        _client = httpx.AsyncClient(timeout=REMOTE_TIMEOUT)
+    return _client
+
+
+def joke_fetcher(category: Optional[str]):
+    url = f"{JOKES_URL}/{category}/ten" if category else f"{JOKES_URL}/ten"
+
+    async def fetch() -> List[tuple]:
+        r = await _http().get(url)
+        r.raise_for_status()
+        return [(j.get("type") or "general", j.get("setup", ""), j.get("punchline", "")) for j in r.json()]
+    return fetch
+
+
+async def fetch_quotes() -> List[tuple]:
+    # The source only serves its whole list; keep a random handful per fetch
+    r = await _http().get(QUOTES_URL)
+    r.raise_for_status()
+    quotes = random.sample(r.json(), min(PREFETCH_DEPTH, len(r.json())))
+    return [("remote", q.get("text") or "", (q.get("author") or "Unknown").split(",")[0]) for q in quotes]
+
+
+async def fetch_fact() -> List[tuple]:
+    r = await _http().get(FACT_URL)
+    r.raise_for_status()
+    return [("remote", r.json().get("text", ""))]
+
+
+def buffer_for(name: str, category: Optional[str]) -> Optional[PrefetchBuffer]:
+    """The prefetch buffer serving a pack/category, created on first use"""
+    if name == "jokes":
+        category = category.lower() if category else None
+        if category and category not in JOKE_CATEGORIES:
+            return None
+        fetch = joke_fetcher(category)
+    elif category:
+        return None  # the quote and fact sources have no categories
+    else:
+        fetch = fetch_quotes if name == "quotes" else fetch_fact
+    buffer_name = f"{name}:{category}" if category else name
+    if buffer_name not in buffers:
+        pack = packs[name]
+        buffers[buffer_name] = PrefetchBuffer(
+            buffer_name, fetch,
+            key=lambda row, pack=pack: normalize(" ".join(row[pack.fields.index(f)] for f in pack.text_fields)),
+            target_depth=PREFETCH_DEPTH,
+            min_interval=REMOTE_MIN_INTERVAL
+        )
+    return buffers[buffer_name]
+
+
+def pick(name: str, user_id: Optional[str], category: Optional[str], q: Optional[str]) -> dict:
+    """Remote item from the prefetch buffer if one is ready, else from the local pack"""
+    pack = packs[name]
+    if REMOTE_PREFETCH and not q:
+        buffer = buffer_for(name, category)
+        row = buffer.get() if buffer is not None else None
+        if row is not None:
+            # Not added to the pack: a growing pool would restart every user's rotation
+            return {**dict(zip(pack.fields, row)), "source": "remote", "matched": True}
+    item = pack.pick(user_id=user_id, category=category, keyword=q)
+    matched = item is not None
+    if item is None:
+        item = pack.pick(user_id=user_id)
+    return {**item, "source": "local", "matched": matched}
+
+
+async def close():
+    """Stop the prefetch tasks and close the pooled client (on app shutdown)"""
+    global _client
+    for buffer in buffers.values():
+        buffer.stop()
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+
+
 @router.get("/joke")
-async def get_joke():
-    url = "https://official-joke-api.appspot.com/random_joke"
-    async with httpx.AsyncClient() as client:
-        r = await client.get(url)
-        return r.json()
+async def get_joke(user_id: Optional[str] = None, category: Optional[str] = None, q: Optional[str] = None):
+    joke = pick("jokes", user_id, category, q)
+    # "type" is what the official joke API called the category
+    return {**joke, "type": joke["category"]}
 
 @router.get("/quote")
-async def get_quote():
-    url = "https://type.fit/api/quotes"
-    async with httpx.AsyncClient() as client:
-        r = await client.get(url)
-        quotes = r.json()
-        import random
-        return random.choice(quotes)
+async def get_quote(user_id: Optional[str] = None, category: Optional[str] = None, q: Optional[str] = None):
+    return pick("quotes", user_id, category, q)
 
 @router.get("/fact")
-async def get_fact():
-    url = "https://uselessfacts.jsph.pl/random.json?language=en"
-    async with httpx.AsyncClient() as client:
-        r = await client.get(url)
-        return r.json()
+async def get_fact(user_id: Optional[str] = None, category: Optional[str] = None, q: Optional[str] = None):
+    return pick("facts", user_id, category, q)
+
+@router.get("/categories")
+async def get_categories():
+    return {name: pack.categories() for name, pack in packs.items()}
+
+@router.get("/stats")
+async def get_stats():
+    return {
+        "items": {name: len(pack) for name, pack in packs.items()},
+        "remote_prefetch": REMOTE_PREFETCH,
+        "buffers": {name: buffer.stats() for name, buffer in buffers.items()},
+    }
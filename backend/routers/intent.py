@@ -6,9 +6,12 @@ import urllib.parse
 from datetime import datetime, timedelta
 from dotenv import load_dotenv
 
+from structured_logging import get_logger
+
 load_dotenv()
 
 router = APIRouter()
+log = get_logger("intent")
 
 # List of possible intents and their labels
 INTENT_LABELS = [
@@ -112,6 +115,57 @@ def create_gmail_link(email_content):
     body = urllib.parse.quote(email_content["body"])
     return f"https://mail.google.com/mail/?view=cm&fs=1&su={subject}&body={body}"
 
+FUN_FILLER = re.compile(r"(?:\s+(?:please|now|today|again|for me|for us|thanks|thank you|or something))+$")
+
+def fun_params(text, user_id=None):
+    """Query params for the fun router: a topic ("a joke about cats") and the user for no-repeat rotation"""
+    params = {}
+    topic = re.search(r"\babout\s+([a-z' ]+)", text.lower())
+    if topic:
+        q = FUN_FILLER.sub("", topic.group(1).strip())
+        if q:
+            params["q"] = q
+    if user_id:
+        params["user_id"] = user_id
+    return params
+
+# Lookahead so candidates overlap: "for tomorrow in berlin" also yields "berlin"
+WEATHER_LOCATION_RE = re.compile(r"\b(?:in|at|for|of)\s+(?=([^\W\d_](?:[^\W\d_]|[ .'-])*))")
+WEATHER_FILLER = re.compile(
+    r"(?:\s+|^)(?:right now|now|today|tonight|tomorrow|currently|please|like|outside|"
+    r"this (?:morning|afternoon|evening|week|weekend)|the (?:morning|afternoon|evening|week|weekend|moment))$"
+)
+WEATHER_TIME_START = re.compile(
+    r"^(?:right now|now|today|tonight|tomorrow|currently|later|this|next|a few|the few|"
+    r"the (?:next|coming|following|rest|end|morning|afternoon|evening|night|week|weekend|moment|day|hour|month)|"
+    r"(?:mon|tues|wednes|thurs|fri|satur|sun)day)\b"
+)
+NOT_PLACES = {"here", "home", "work", "outside", "my area", "my city", "my place", "my location", "me", "us",
+              "the area", "the city", "the town", "the house", "the office", "the day", "a bit", "a while"}
+# Kept upper-case instead of title-cased ("the uk" -> "UK")
+PLACE_ACRONYMS = {"uk", "us", "usa", "uae", "nyc", "dc"}
+
+def weather_location(text):
+    """Place named in a weather question ("weather in new york today" -> "New York"), or None"""
+    for match in WEATHER_LOCATION_RE.finditer(text.lower()):
+        # Stop at the next clause ("... and what time is it") and drop trailing time words
+        place = re.split(r"\s+(?:and|or|but|with|for|at|on|in)\s+", match.group(1).strip(" .'-"))[0]
+        if WEATHER_TIME_START.match(place):
+            continue  # "for tomorrow in berlin": the place comes later
+        previous = None
+        while place != previous:
+            previous = place
+            place = WEATHER_FILLER.sub("", place).strip(" .'-")
+        if not place or place in NOT_PLACES or WEATHER_FILLER.fullmatch(" " + place):
+            continue
+        place = re.sub(r"^(?:the|a|an)\s+", "", place)
+        return " ".join(word.upper() if word in PLACE_ACRONYMS else word.title() for word in place.split())
+    return None
+
+def weather_params(text):
+    location = weather_location(text)
+    return {"location": location} if location else {}
+
 # Fallback intent detection for when HF API fails
 def fallback_intent_detection(text):
     text_lower = text.lower()
@@ -140,6 +194,7 @@ def fallback_intent_detection(text):
 async def intent_handler(request: Request):
     data = await request.json()
     text = data.get("text", "")
+    user_id = data.get("user_id")
 
     # Get HF token from environment
     hf_token = os.getenv("HF_TOKEN")
@@ -167,6 +222,7 @@ async def intent_handler(request: Request):
     else:
         # Use fallback if no token provided
         intent = fallback_intent_detection(text)
+    log.debug("intent_routed", intent=intent)
 
     # Route to the correct MCP based on detected intent
     async with httpx.AsyncClient() as client:
@@ -181,32 +237,32 @@ async def intent_handler(request: Request):
             
             # Check if user is asking specifically for weather
             elif any(word in text_lower for word in ["weather", "temperature", "rain", "forecast"]) and not any(word in text_lower for word in ["time", "clock"]):
-                r = await client.get(f"{BASE_URL}/weather_time/weather")
+                r = await client.get(f"{BASE_URL}/weather_time/weather", params=weather_params(text))
                 d = r.json()
                 return {"answer": f"Current weather: {d.get('weather')}"}
             
             # Both or general request
             else:
-                r = await client.get(f"{BASE_URL}/weather_time")
+                r = await client.get(f"{BASE_URL}/weather_time", params=weather_params(text))
                 d = r.json()
                 return {"answer": f"Weather: {d.get('weather')}\nTime: {d.get('time')}"}
         if intent == "fun_joke":
-            r = await client.get(f"{BASE_URL}/fun/joke")
+            r = await client.get(f"{BASE_URL}/fun/joke", params=fun_params(text, user_id))
             d = r.json()
             return {"answer": f"{d.get('setup', '')} {d.get('punchline', '')}"}
         if intent == "fun_quote":
-            r = await client.get(f"{BASE_URL}/fun/quote")
+            r = await client.get(f"{BASE_URL}/fun/quote", params=fun_params(text, user_id))
             d = r.json()
             return {"answer": f"{d.get('text', '')} — {d.get('author', 'Unknown')}"}
         if intent == "fun_fact":
-            r = await client.get(f"{BASE_URL}/fun/fact")
+            r = await client.get(f"{BASE_URL}/fun/fact", params=fun_params(text, user_id))
             d = r.json()
             return {"answer": d.get('text') or d.get('fact') or str(d)}
         if intent == "open_app":
             # Only open if not a negative command
             if any(neg in text.lower() for neg in ["don't open", "do not open", "dont open", "no open", "never open"]):
                 return {"answer": "Not opening as per your request."}
-            r = await client.post(f"{BASE_URL}/open_app", json={"command": text})
+            r = await client.post(f"{BASE_URL}/open_app", json={"command": text, "user_id": user_id})
             d = r.json()
             if d.get("redirect_url"):
                 return {"answer": f"Opening: {d['redirect_url']}", "redirect_url": d["redirect_url"]}
@@ -233,7 +289,7 @@ async def intent_handler(request: Request):
         # Default: search
         r = await client.post(f"{BASE_URL}/search", json={"question": text})
         d = r.json()
-        return {"answer": d.get('answer') or d[0].get('answer') if isinstance(d, list) and d else str(d)}
+        return {"answer": d.get("answer") or "I couldn't find an answer to that."}
 
 @router.post("/intent")
 async def handle_intent(request: Request):
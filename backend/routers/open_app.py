@@ -3,6 +3,8 @@ from fastapi.responses import JSONResponse
 import os
 from dotenv import load_dotenv
 
+from app_registry import REGISTRY_FILE, AppRegistry
+
 load_dotenv()
 
 router = APIRouter()
@@ -10,20 +12,19 @@ router = APIRouter()
 # Configuration
 CLIENT_BASE_URL = os.getenv('CLIENT_BASE_URL', 'http://localhost:3000')
 
+# Apps come from apps.json (APP_REGISTRY_FILE), re-read when the file changes
+registry = AppRegistry(REGISTRY_FILE, client_base_url=CLIENT_BASE_URL,
+                       reload_interval=float(os.getenv("APP_REGISTRY_RELOAD_INTERVAL", "1")))
+
 @router.post("")
 async def open_app(request: Request):
     data = await request.json()
     command = data.get("command", "")
-    # Simple mapping for demo
-    app_urls = {
-        "youtube": "https://www.youtube.com",
-        "gmail": "https://mail.google.com",
-        "google": "https://www.google.com",
-        "todo": f"{CLIENT_BASE_URL}/todo",
-        "to do": f"{CLIENT_BASE_URL}/todo",
-        "calendar": f"{CLIENT_BASE_URL}/calendar"
-    }
-    for app, url in app_urls.items():
-        if app in command.lower():
-            return {"message": f"Opening {app}", "redirect_url": url, "speak": f"Opening {app}"}
+    app = registry.lookup(command, user_id=data.get("user_id"))
+    if app is not None:
+        return {"message": f"Opening {app['name']}", "redirect_url": app["url"], "speak": f"Opening {app['name']}"}
     return JSONResponse({"error": "App not found"}, status_code=404)
+
+@router.get("/apps")
+async def registry_stats():
+    return registry.stats()
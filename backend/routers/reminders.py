@@ -1,5 +1,6 @@
 from fastapi import APIRouter, Request
 from fastapi.responses import JSONResponse
+import hashlib
 import json
 import os
 from datetime import datetime
@@ -8,7 +9,10 @@ import threading
 import tempfile
 import webbrowser
 
+from structured_logging import get_logger
+
 router = APIRouter()
+log = get_logger("reminders")
 REMINDERS_FILE = "reminders.json"
 BASE_URL = os.getenv('BASE_URL', 'http://localhost:8000/mcp')
 
@@ -38,9 +42,9 @@ async def list_reminders():
                 datetime.strptime(reminder["datetime"], "%Y-%m-%d %H:%M:%S")
                 valid_reminders.append(reminder)
             except ValueError:
-                print(f"Invalid datetime format in reminder: {reminder}")
+                log.warning("reminder_invalid_datetime", datetime=reminder["datetime"])
         else:
-            print(f"Skipping reminder without datetime: {reminder}")
+            log.warning("reminder_missing_datetime", fields=sorted(reminder))
     
     # Save only valid reminders back to file
     if len(valid_reminders) != len(reminders):
@@ -51,7 +55,8 @@ async def list_reminders():
 @router.post("")
 async def add_reminder(request: Request):
     data = await request.json()
-    print("Received data:", data)  # Debugging log
+    # Field names and timing only: the reminder text is the user's own words
+    log.debug("reminder_received", fields=sorted(data), date=data.get("date"), time=data.get("time"))
 
     # Combine date and time if separate fields are provided
     if "date" in data and "time" in data:
@@ -66,13 +71,13 @@ async def add_reminder(request: Request):
         if reminder_time < datetime.now():
             return JSONResponse(content={"error": "Cannot set a reminder for a past time."}, status_code=400)
     except (KeyError, ValueError):
-        print("Invalid datetime format or missing field")  # Debugging log
+        log.info("reminder_rejected", reason="invalid or missing datetime")
         return JSONResponse(content={"error": "Invalid or missing 'datetime' field. Use format 'YYYY-MM-DD HH:MM:SS'."}, status_code=400)
 
     reminders = load_reminders()
     reminders.append({"text": data["text"], "datetime": data["datetime"]})
     save_reminders(reminders)
-    print("Reminder added:", {"text": data["text"], "datetime": data["datetime"]})  # Debugging log
+    log.debug("reminder_added", datetime=data["datetime"], total=len(reminders))
     return {"status": "added", "reminder": {"text": data["text"], "datetime": data["datetime"]}}
 
 @router.delete("")
@@ -301,31 +306,31 @@ async def get_alarm_popup(reminder_text: str):
     
     return HTMLResponse(content=html_content)
 
+def text_ref(text):
+    """Length and short hash of a reminder, to tell log lines apart without logging its words"""
+    return {"chars": len(text), "ref": hashlib.sha256(text.encode("utf-8")).hexdigest()[:8]}
+
 # Function to create alarm popup
 def create_alarm_popup(reminder_text):
-    print(f"Creating alarm popup for: {reminder_text}")
-    
     try:
         import urllib.parse
         encoded_text = urllib.parse.quote(reminder_text)
         alarm_url = f"{BASE_URL}/reminders/alarm/{encoded_text}"
         
-        print(f"Alarm URL: {alarm_url}")
-        print("🚨 ALARM TRIGGERED! 🚨")
-        print(f"Open this URL in your browser: {alarm_url}")
-        print("=" * 50)
+        # The alarm URL carries the reminder text, so it is never logged
+        log.warning("alarm_triggered", **text_ref(reminder_text))
         
         # Try to open in default browser as backup
         try:
             webbrowser.open(alarm_url)
-            print("✅ Opened alarm in browser")
+            log.info("alarm_opened_in_browser", **text_ref(reminder_text))
         except Exception as e:
-            print(f"❌ Could not open browser: {e}")
+            log.error("alarm_browser_failed", **text_ref(reminder_text), error=str(e))
         
         return alarm_url
         
     except Exception as e:
-        print(f"Error creating alarm popup: {e}")
+        log.error("alarm_popup_failed", **text_ref(reminder_text), error=str(e))
         raise
 
 # Function to monitor reminders and play alarm
@@ -341,24 +346,22 @@ async def monitor_reminders():
                 
             try:
                 reminder_time = datetime.strptime(reminder["datetime"], "%Y-%m-%d %H:%M:%S")
-                print(f"Parsed reminder time: {reminder_time}, Current time: {current_time}")
+                log.debug("reminder_checked", reminder_time=str(reminder_time), now=str(current_time))
                 if reminder_time <= current_time:
-                    print(f"Alarm for reminder: {reminder['text']}")
                     # Create and show alarm popup
                     try:
                         create_alarm_popup(reminder['text'])
-                        print("Alarm popup created successfully")
-                    except Exception as e:
-                        print(f"Error creating alarm popup: {e}")
+                    except Exception:
+                        pass  # already logged by create_alarm_popup
                     # Don't add to updated list (removes the reminder)
                 else:
                     updated_reminders.append(reminder)
             except ValueError as e:
-                print(f"Invalid datetime format in reminder: {reminder}, Error: {e}")
+                log.warning("reminder_invalid_datetime", datetime=reminder["datetime"], error=str(e))
                 # Still add invalid reminders to keep them (don't remove them)
                 updated_reminders.append(reminder)
             except Exception as e:
-                print(f"Unexpected error processing reminder: {reminder}, Error: {e}")
+                log.error("reminder_check_failed", datetime=reminder.get("datetime"), error=str(e))
                 updated_reminders.append(reminder)
         
         # Save updated reminders (without triggered ones)
@@ -1,17 +1,42 @@
 from fastapi import APIRouter, Request
-import httpx
+import os
+import time
+
+from search_index import CORPUS_DIR, SearchIndex
 
 router = APIRouter()
 
+# Questions are answered from a local BM25 index over the markdown/text files
+# in SEARCH_CORPUS_DIR (default: backend/knowledge). Changed files are picked
+# up at most every SEARCH_REFRESH_INTERVAL seconds, or at once via /reindex
+index = SearchIndex(CORPUS_DIR)
+REFRESH_INTERVAL = float(os.getenv("SEARCH_REFRESH_INTERVAL", "10"))
+RESULTS = int(os.getenv("SEARCH_RESULTS", "3"))
+_last_refresh = 0.0
+
+def _maybe_refresh():
+    global _last_refresh
+    now = time.monotonic()
+    if not _last_refresh or now - _last_refresh >= REFRESH_INTERVAL:
+        _last_refresh = now
+        index.refresh()
+
 @router.post("")
 async def search(request: Request):
     data = await request.json()
     question = data.get("question", "")
-    # Use Hugging Face Inference API (no key, free model)
-    url = "https://api-inference.huggingface.co/models/distilbert-base-uncased"
-    payload = {"inputs": question}
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, json=payload)
-        if response.status_code == 200:
-            return response.json()
-        return {"error": "Model API error"}
+    _maybe_refresh()
+    results = index.search(question, limit=RESULTS)
+    if not results:
+        return {"answer": "I couldn't find anything about that in your documents.", "results": []}
+    return {"answer": results[0]["snippet"], "results": results}
+
+@router.post("/reindex")
+async def reindex(full: bool = False):
+    global _last_refresh
+    _last_refresh = time.monotonic()
+    return index.rebuild() if full else index.refresh()
+
+@router.get("/stats")
+async def search_stats():
+    return index.stats()
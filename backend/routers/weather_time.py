@@ -1,12 +1,44 @@
 from fastapi import APIRouter
 from datetime import datetime
+from typing import Optional
+import os
+
+from structured_logging import get_logger
+from weather_providers import WeatherCache, make_provider
 
 router = APIRouter()
+log = get_logger("weather")
+
+# Weather comes from the provider chosen by WEATHER_PROVIDER (stub by default)
+# through a per-location cache: readings are reused for WEATHER_TTL seconds and
+# served stale, while one background fetch refreshes them, up to WEATHER_STALE_TTL
+weather = WeatherCache(
+    make_provider(),
+    ttl=float(os.getenv("WEATHER_TTL", "600")),
+    stale_ttl=float(os.getenv("WEATHER_STALE_TTL", "3600")),
+    max_entries=int(os.getenv("WEATHER_CACHE_SIZE", "1000"))
+)
+DEFAULT_LOCATION = os.getenv("WEATHER_DEFAULT_LOCATION", "")
+if weather.provider.needs_location and not DEFAULT_LOCATION:
+    log.warning("weather_no_default_location", provider=weather.provider.name,
+                hint="set WEATHER_DEFAULT_LOCATION for questions that name no place")
+
+async def current_weather(location: Optional[str]) -> dict:
+    location = (location or DEFAULT_LOCATION).strip()
+    if not location and weather.provider.needs_location:
+        return {"weather": "Which city? Try asking for the weather in London.", "location": ""}
+    try:
+        reading, cache = await weather.get(location)
+    except LookupError:
+        return {"weather": "I'm not sure where that is. Try asking for a city, like the weather in London.", "location": location}
+    except Exception:
+        return {"weather": "Weather is unavailable right now.", "location": location}
+    return {**reading.to_dict(), "cache": cache}
 
 @router.get("")
-async def weather_time():
+async def weather_time(location: Optional[str] = None):
     now = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-    return {"weather": "22°C Sunny", "time": now}
+    return {**await current_weather(location), "time": now}
 
 @router.get("/time")
 async def get_time():
@@ -21,5 +53,9 @@ async def get_time():
     }
 
 @router.get("/weather")
-async def get_weather():
-    return {"weather": "22°C Sunny"}
+async def get_weather(location: Optional[str] = None):
+    return await current_weather(location)
+
+@router.get("/weather/stats")
+async def weather_stats():
+    return weather.stats()
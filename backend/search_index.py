@@ -0,0 +1,307 @@
+"""
+Local full-text search over a directory of markdown and text files.
+
+Files under the corpus directory are split into passages (a heading plus
+the paragraphs below it, up to ``PASSAGE_WORDS`` words) and indexed in
+memory:
+
+- the inverted index maps each term to a compressed posting list: passage
+  ids delta-encoded and written as varints together with the term
+  frequency, so a list is a few bytes per passage and new passages are
+  appended without re-encoding;
+- ranking is BM25 over passages;
+- ``refresh`` re-stats the corpus and only re-reads files whose size or
+  mtime changed. Passages of changed or deleted files are tombstoned and
+  their terms' document frequencies decremented; the index is rebuilt
+  once tombstones make up more than a quarter of it.
+
+Answers come with a snippet meant to be read aloud: the sentences around
+the best match, with markdown syntax removed.
+"""
+import heapq
+import math
+import os
+import re
+import threading
+import time
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+from structured_logging import get_logger
+
+log = get_logger("search_index")
+
+CORPUS_DIR = os.getenv("SEARCH_CORPUS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "knowledge"))
+EXTENSIONS = (".md", ".markdown", ".txt")
+PASSAGE_WORDS = 120
+SNIPPET_WORDS = 40
+
+WORD_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+STOPWORDS = frozenset(
+    "a an and are as at be by can do does for from how i in is it me my of on or so that the "
+    "this to was what when where which who why will with you your".split()
+)
+HEADING_RE = re.compile(r"^#{1,6}\s+(.*)$")
+SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+MARKDOWN_RES = (
+    (re.compile(r"!?\[([^\]]*)\]\([^)]*\)"), r"\1"),   # links and images -> their text
+    (re.compile(r"`+([^`]*)`+"), r"\1"),               # inline code
+    (re.compile(r"^\s*(?:[-*+]|\d+[.)])\s+", re.M), ""),  # list markers
+    (re.compile(r"^\s*>\s?", re.M), ""),               # block quotes
+    (re.compile(r"[*~#|]+|(?<!\w)_+|_+(?!\w)"), ""),   # emphasis, headings, tables
+)
+
+
+def stem(word: str) -> str:
+    """Very light suffix stripping so "reminders" finds "reminder" """
+    for suffix in ("ing", "ies", "es", "ed", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)] + ("y" if suffix == "ies" else "")
+    return word
+
+
+def terms(text: str) -> List[str]:
+    return [stem(w) for w in WORD_RE.findall(text.lower()) if w not in STOPWORDS]
+
+
+def plain(text: str) -> str:
+    """Markdown reduced to text that reads naturally aloud"""
+    for pattern, replacement in MARKDOWN_RES:
+        text = pattern.sub(replacement, text)
+    return " ".join(text.split())
+
+
+def encode_varint(value: int, out: bytearray):
+    while value >= 0x80:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def decode_postings(data: bytes) -> Iterator[Tuple[int, int]]:
+    """(passage id, term frequency) pairs of a posting list"""
+    doc, value, shift, expect_tf = 0, 0, 0, False
+    for byte in data:
+        value |= (byte & 0x7F) << shift
+        if byte & 0x80:
+            shift += 7
+            continue
+        if expect_tf:
+            yield doc, value
+        else:
+            doc += value
+        expect_tf = not expect_tf
+        value, shift = 0, 0
+
+
+class PostingList:
+    __slots__ = ("data", "last", "df")
+
+    def __init__(self):
+        self.data = bytearray()
+        self.last = 0
+        self.df = 0
+
+    def append(self, passage_id: int, tf: int):
+        encode_varint(passage_id - self.last, self.data)
+        encode_varint(tf, self.data)
+        self.last = passage_id
+        self.df += 1
+
+
+def split_passages(text: str) -> List[Tuple[str, str]]:
+    """(heading, body) passages of a markdown/text file"""
+    passages: List[Tuple[str, str]] = []
+    heading, paragraphs, size = "", [], 0
+
+    def flush():
+        nonlocal paragraphs, size
+        if paragraphs:
+            passages.append((heading, "\n\n".join(paragraphs)))
+        paragraphs, size = [], 0
+
+    for block in re.split(r"\n\s*\n", text):
+        block = block.strip()
+        if not block:
+            continue
+        match = HEADING_RE.match(block.split("\n", 1)[0])
+        if match:
+            flush()
+            heading = plain(match.group(1))
+            block = block.split("\n", 1)[1].strip() if "\n" in block else ""
+            if not block:
+                continue
+        words = len(block.split())
+        if paragraphs and size + words > PASSAGE_WORDS:
+            flush()
+        paragraphs.append(block)
+        size += words
+    flush()
+    return passages
+
+
+class SearchIndex:
+    """BM25 over passages of the files in ``directory``"""
+
+    def __init__(self, directory: str = CORPUS_DIR, k1: float = 1.2, b: float = 0.75):
+        self.directory = directory
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, PostingList] = {}
+        self.passages: List[Optional[Tuple[str, str, str, int]]] = []  # (path, heading, body, length)
+        self.files: Dict[str, Tuple[float, int, List[int]]] = {}       # path -> (mtime, size, passage ids)
+        self.live = 0
+        self.total_length = 0
+        self.built_at = 0.0
+        self._lock = threading.Lock()
+
+    # --- indexing ------------------------------------------------------------
+
+    def _scan(self) -> Dict[str, Tuple[float, int]]:
+        found = {}
+        if not os.path.isdir(self.directory):
+            return found
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if name.lower().endswith(EXTENSIONS) and not name.startswith("."):
+                    path = os.path.join(root, name)
+                    try:
+                        info = os.stat(path)
+                    except OSError:
+                        continue
+                    found[os.path.relpath(path, self.directory)] = (info.st_mtime, info.st_size)
+        return found
+
+    def _add_file(self, path: str, mtime: float, size: int):
+        try:
+            with open(os.path.join(self.directory, path), "r", encoding="utf-8", errors="replace") as f:
+                text = f.read()
+        except OSError as e:
+            log.warning("search_file_unreadable", path=path, error=str(e))
+            return
+        ids = []
+        title = os.path.splitext(os.path.basename(path))[0].replace("-", " ").replace("_", " ")
+        for heading, body in split_passages(text):
+            heading = heading or title
+            passage_terms = terms(f"{heading} {body}")
+            if not passage_terms:
+                continue
+            passage_id = len(self.passages)
+            self.passages.append((path, heading, body, len(passage_terms)))
+            counts: Dict[str, int] = {}
+            for term in passage_terms:
+                counts[term] = counts.get(term, 0) + 1
+            for term, tf in counts.items():
+                postings = self.postings.get(term)
+                if postings is None:
+                    postings = self.postings[term] = PostingList()
+                postings.append(passage_id, tf)
+            self.live += 1
+            self.total_length += len(passage_terms)
+            ids.append(passage_id)
+        self.files[path] = (mtime, size, ids)
+
+    def _remove_file(self, path: str):
+        for passage_id in self.files.pop(path)[2]:
+            _, heading, body, length = self.passages[passage_id]
+            for term in set(terms(f"{heading} {body}")):
+                self.postings[term].df -= 1
+            self.passages[passage_id] = None
+            self.live -= 1
+            self.total_length -= length
+
+    def rebuild(self) -> Dict[str, int]:
+        with self._lock:
+            self.postings, self.passages, self.files = {}, [], {}
+            self.live = self.total_length = 0
+            return self._refresh_locked(full=True)
+
+    def refresh(self) -> Dict[str, int]:
+        """Re-index files added, changed or deleted since the last refresh"""
+        with self._lock:
+            return self._refresh_locked(full=False)
+
+    def _refresh_locked(self, full: bool) -> Dict[str, int]:
+        start = time.perf_counter()
+        found = self._scan()
+        changed = [path for path, (mtime, size) in found.items()
+                   if path not in self.files or self.files[path][:2] != (mtime, size)]
+        removed = [path for path in self.files if path not in found]
+        for path in removed + [path for path in changed if path in self.files]:
+            self._remove_file(path)
+        for path in sorted(changed):
+            self._add_file(path, *found[path])
+        dead = len(self.passages) - self.live
+        if not full and dead > 0 and dead > len(self.passages) // 4:
+            # Too many tombstones: start over with compact ids and posting lists
+            self.postings, self.passages, self.files = {}, [], {}
+            self.live = self.total_length = 0
+            return self._refresh_locked(full=True)
+        self.built_at = time.time()
+        report = {"changed": len(changed), "removed": len(removed), "files": len(self.files),
+                  "passages": self.live, "ms": round((time.perf_counter() - start) * 1000, 2)}
+        if changed or removed:
+            log.info("search_reindexed", full=full, **report)
+        return report
+
+    # --- querying ------------------------------------------------------------
+
+    def search(self, query: str, limit: int = 3) -> List[Dict[str, object]]:
+        query_terms = list(dict.fromkeys(terms(query)))
+        with self._lock:
+            if not query_terms or not self.live:
+                return []
+            avg_length = self.total_length / self.live
+            scores: Dict[int, float] = {}
+            matched: Dict[int, Set[str]] = {}
+            for term in query_terms:
+                postings = self.postings.get(term)
+                if postings is None or postings.df <= 0:
+                    continue
+                idf = math.log(1 + (self.live - postings.df + 0.5) / (postings.df + 0.5))
+                for passage_id, tf in decode_postings(postings.data):
+                    passage = self.passages[passage_id]
+                    if passage is None:
+                        continue
+                    norm = self.k1 * (1 - self.b + self.b * passage[3] / avg_length)
+                    scores[passage_id] = scores.get(passage_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+                    matched.setdefault(passage_id, set()).add(term)
+            best = heapq.nlargest(limit, scores.items(), key=lambda item: item[1])
+            results = []
+            for passage_id, score in best:
+                path, heading, body, _ = self.passages[passage_id]
+                results.append({
+                    "title": heading,
+                    "path": path,
+                    "snippet": speakable_snippet(body, matched[passage_id]),
+                    "score": round(score, 3),
+                })
+            return results
+
+    def stats(self) -> Dict[str, object]:
+        with self._lock:
+            return {
+                "directory": self.directory,
+                "files": len(self.files),
+                "passages": self.live,
+                "tombstones": len(self.passages) - self.live,
+                "terms": len(self.postings),
+                "postings_bytes": sum(len(p.data) for p in self.postings.values()),
+                "built_at": self.built_at,
+            }
+
+
+def speakable_snippet(body: str, query_terms: Set[str], max_words: int = SNIPPET_WORDS) -> str:
+    """The sentence that best matches the query, plus what follows it, as plain text"""
+    sentences = [s for s in SENTENCE_RE.split(plain(body)) if s]
+    if not sentences:
+        return ""
+    best = max(range(len(sentences)), key=lambda i: (len(query_terms.intersection(terms(sentences[i]))), -i))
+    words: List[str] = []
+    for sentence in sentences[best:]:
+        if words and len(words) + len(sentence.split()) > max_words:
+            break
+        words.extend(sentence.split())
+    if len(words) > max_words:
+        words = words[:max_words]
+        words[-1] = words[-1].rstrip(",;:") + "..."
+    return " ".join(words)
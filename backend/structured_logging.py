@@ -0,0 +1,181 @@
+"""
+Structured, sampled, non-blocking logging.
+
+    log = get_logger("reminders")
+    log.debug("reminder_received", fields=sorted(data))
+    log.info("reminder_added", datetime=when, sample=0.1)
+
+Each call names an event and passes fields as keyword arguments. Calls
+below the configured level return before anything is formatted, and a
+sampled call only survives with probability ``sample``, so per-document or
+per-turn detail costs next to nothing when it is disabled. Records go
+through a bounded in-memory queue to a background thread that does the
+formatting and the actual write, so request handlers never block on
+stdout; when the queue is full records are dropped and counted.
+
+Environment:
+    LOG_LEVEL    DEBUG | INFO | WARNING | ERROR (default INFO)
+    LOG_FORMAT   text | json (default text)
+    LOG_SAMPLE   per-event sampling, e.g. "reminder_added=0.1,intent_routed=0.01"
+    LOG_QUEUE    queue capacity in records (default 10000)
+
+The backend and Buddy server are deployed separately and import their
+modules flat, so each keeps its own copy of this file: keep it in step
+with ``server_buddy/structured_logging.py`` (only the examples above differ).
+"""
+import atexit
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import time
+from typing import Any, Dict, Optional
+
+ROOT_LOGGER = "voiceagent"
+
+
+def parse_sampling(spec: str) -> Dict[str, float]:
+    """Parse "event=rate,event=rate" into a dict"""
+    rates = {}
+    for part in spec.split(","):
+        event, _, rate = part.partition("=")
+        if event.strip() and rate.strip():
+            rates[event.strip()] = min(1.0, max(0.0, float(rate)))
+    return rates
+
+
+class StructuredFormatter(logging.Formatter):
+    """Render a record as ``level logger event key=value ...`` or as one JSON object"""
+
+    def __init__(self, as_json: bool = False):
+        super().__init__()
+        self.as_json = as_json
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields: Dict[str, Any] = getattr(record, "fields", {})
+        sample_rate = getattr(record, "sample_rate", 1.0)
+        if self.as_json:
+            entry = {
+                "ts": round(record.created, 3),
+                "level": record.levelname,
+                "logger": record.name,
+                "event": record.getMessage(),
+                **fields,
+            }
+            if sample_rate < 1.0:
+                entry["sample_rate"] = sample_rate
+            if record.exc_info:
+                entry["exc"] = self.formatException(record.exc_info)
+            return json.dumps(entry, default=str)
+        timestamp = time.strftime("%H:%M:%S", time.localtime(record.created))
+        text = f"{timestamp} {record.levelname:<7} {record.name} {record.getMessage()}"
+        if fields:
+            text += " " + " ".join(f"{key}={value!r}" if isinstance(value, str) else f"{key}={value}"
+                                   for key, value in fields.items())
+        if sample_rate < 1.0:
+            text += f" sample_rate={sample_rate}"
+        if record.exc_info:
+            text += "\n" + self.formatException(record.exc_info)
+        return text
+
+
+class DroppingQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that never blocks the caller: full queue means the record is dropped"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Formatting happens on the listener thread, not in the request
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class StructuredLogger:
+    """Event + fields front end over a standard ``logging.Logger``"""
+
+    def __init__(self, logger: logging.Logger, sampling: Dict[str, float]):
+        self._logger = logger
+        self._sampling = sampling
+
+    def is_enabled(self, level: int) -> bool:
+        return self._logger.isEnabledFor(level)
+
+    def _log(self, level: int, event: str, sample: Optional[float], exc_info: bool, fields: Dict[str, Any]):
+        if not self._logger.isEnabledFor(level):
+            return
+        rate = self._sampling.get(event, 1.0 if sample is None else sample)
+        if rate < 1.0 and random.random() >= rate:
+            return
+        self._logger.log(level, event, exc_info=exc_info, extra={"fields": fields, "sample_rate": rate})
+
+    def debug(self, event: str, sample: Optional[float] = None, **fields):
+        self._log(logging.DEBUG, event, sample, False, fields)
+
+    def info(self, event: str, sample: Optional[float] = None, **fields):
+        self._log(logging.INFO, event, sample, False, fields)
+
+    def warning(self, event: str, sample: Optional[float] = None, **fields):
+        self._log(logging.WARNING, event, sample, False, fields)
+
+    def error(self, event: str, sample: Optional[float] = None, exc_info: bool = False, **fields):
+        self._log(logging.ERROR, event, sample, exc_info, fields)
+
+
+_handler: Optional[DroppingQueueHandler] = None
+_sampling: Dict[str, float] = {}
+
+
+def configure_logging(level: Optional[str] = None, fmt: Optional[str] = None,
+                      sampling: Optional[str] = None, queue_size: Optional[int] = None):
+    """Install the queue handler and its writer thread (idempotent unless arguments are given)"""
+    global _handler, _sampling
+    explicit = any(arg is not None for arg in (level, fmt, sampling, queue_size))
+    if _handler is not None and not explicit:
+        return
+    root = logging.getLogger(ROOT_LOGGER)
+    if _handler is not None:
+        root.removeHandler(_handler)
+        _shutdown()
+
+    log_queue: queue.Queue = queue.Queue(maxsize=queue_size or int(os.getenv("LOG_QUEUE", "10000")))
+    stream = logging.StreamHandler(sys.stdout)
+    stream.setFormatter(StructuredFormatter(as_json=(fmt or os.getenv("LOG_FORMAT", "text")).lower() == "json"))
+    _handler = DroppingQueueHandler(log_queue)
+    _handler.listener = logging.handlers.QueueListener(log_queue, stream)
+    _handler.listener.start()
+
+    root.addHandler(_handler)
+    root.setLevel((level or os.getenv("LOG_LEVEL", "INFO")).upper())
+    root.propagate = False
+    _sampling.clear()
+    _sampling.update(parse_sampling(sampling if sampling is not None else os.getenv("LOG_SAMPLE", "")))
+
+
+def _shutdown():
+    """Flush queued records and stop the writer thread"""
+    listener = getattr(_handler, "listener", None)
+    if listener is not None and listener._thread is not None:
+        listener.stop()
+
+
+atexit.register(_shutdown)
+
+
+def get_logger(name: str) -> StructuredLogger:
+    configure_logging()
+    return StructuredLogger(logging.getLogger(f"{ROOT_LOGGER}.{name}"), _sampling)
+
+
+def dropped_records() -> int:
+    """Records discarded because the log queue was full"""
+    return _handler.dropped if _handler is not None else 0
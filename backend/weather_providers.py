@@ -0,0 +1,222 @@
+"""
+Weather lookups behind a small provider interface and a per-location cache.
+
+Providers implement ``WeatherProvider.fetch(location)`` and return a
+``Reading``. Two ship here, selected with ``WEATHER_PROVIDER``:
+
+- ``stub`` (default): deterministic local readings, no network;
+- ``open-meteo``: the free Open-Meteo geocoding and forecast APIs (no key).
+
+``WeatherCache`` sits in front of the provider so a popular city asked about
+many times a minute costs one upstream call per TTL:
+
+- readings are cached per normalized location for ``ttl`` seconds;
+- concurrent misses for the same location share one fetch;
+- after ``ttl`` and up to ``stale_ttl`` a reading is still served at once
+  while a single background fetch refreshes it;
+- if the provider fails, the last reading is served, however old.
+"""
+import asyncio
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from dataclasses import asdict, dataclass
+from typing import Dict, Optional, Tuple
+
+import httpx
+
+from structured_logging import get_logger
+
+log = get_logger("weather")
+
+
+@dataclass
+class Reading:
+    location: str
+    temperature_c: float
+    condition: str
+    observed_at: float
+
+    def describe(self) -> str:
+        place = f" in {self.location}" if self.location else ""
+        return f"{round(self.temperature_c)}°C {self.condition}{place}"
+
+    def to_dict(self) -> Dict[str, object]:
+        return {**asdict(self), "weather": self.describe()}
+
+
+class WeatherProvider:
+    """Interface for weather sources"""
+
+    name = "base"
+    needs_location = False  # True if fetch("") cannot work
+
+    async def fetch(self, location: str) -> Reading:
+        """Current weather for ``location`` ("" means the provider's default)"""
+        raise NotImplementedError
+
+
+class StubWeatherProvider(WeatherProvider):
+    """Stable made-up readings per location, for offline use and benchmarks"""
+
+    name = "stub"
+    CONDITIONS = ("Sunny", "Partly Cloudy", "Cloudy", "Light Rain", "Windy", "Clear")
+
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    async def fetch(self, location: str) -> Reading:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if not location:
+            return Reading("", 22.0, "Sunny", time.time())
+        digest = hashlib.sha256(location.lower().encode("utf-8")).digest()
+        return Reading(location, 5.0 + digest[0] % 26, self.CONDITIONS[digest[1] % len(self.CONDITIONS)], time.time())
+
+
+class OpenMeteoProvider(WeatherProvider):
+    """Open-Meteo: geocode the place name, then read its current weather"""
+
+    name = "open-meteo"
+    needs_location = True
+    GEOCODE_URL = "https://geocoding-api.open-meteo.com/v1/search"
+    FORECAST_URL = "https://api.open-meteo.com/v1/forecast"
+    # WMO weather interpretation codes, grouped
+    CODES = ((0, "Clear"), (3, "Partly Cloudy"), (48, "Foggy"), (57, "Drizzle"), (67, "Rain"),
+             (77, "Snow"), (82, "Rain Showers"), (86, "Snow Showers"), (99, "Thunderstorms"))
+
+    def __init__(self, timeout: float = 5.0, max_places: int = 1000):
+        self.timeout = timeout
+        self.max_places = max_places
+        self._client: Optional[httpx.AsyncClient] = None
+        self._places: "OrderedDict[str, Tuple[str, float, float]]" = OrderedDict()
+
+    def _http(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        return self._client
+
+    async def _geocode(self, location: str) -> Tuple[str, float, float]:
+        # Place coordinates never change, so they are kept for good
+        key = location.lower()
+        if key not in self._places:
+            r = await self._http().get(self.GEOCODE_URL, params={"name": location, "count": 1})
+            r.raise_for_status()
+            results = r.json().get("results") or []
+            if not results:
+                raise LookupError(f"unknown location: {location}")
+            place = results[0]
+            self._places[key] = (place.get("name", location), place["latitude"], place["longitude"])
+            while len(self._places) > self.max_places:
+                self._places.popitem(last=False)
+        return self._places[key]
+
+    async def fetch(self, location: str) -> Reading:
+        # Open-Meteo has no notion of "here": questions that name no place
+        # need WEATHER_DEFAULT_LOCATION
+        if not location:
+            raise LookupError("no location given")
+        name, latitude, longitude = await self._geocode(location)
+        r = await self._http().get(self.FORECAST_URL, params={
+            "latitude": latitude, "longitude": longitude, "current_weather": "true"
+        })
+        r.raise_for_status()
+        current = r.json()["current_weather"]
+        code = int(current.get("weathercode", 0))
+        condition = next((label for limit, label in self.CODES if code <= limit), "Unknown")
+        return Reading(name, float(current["temperature"]), condition, time.time())
+
+
+PROVIDERS = {
+    StubWeatherProvider.name: StubWeatherProvider,
+    OpenMeteoProvider.name: OpenMeteoProvider,
+}
+
+
+def make_provider(name: Optional[str] = None) -> WeatherProvider:
+    name = (name or os.getenv("WEATHER_PROVIDER", "stub")).lower()
+    if name not in PROVIDERS:
+        raise ValueError(f"unknown WEATHER_PROVIDER {name!r} (choose from {', '.join(PROVIDERS)})")
+    if name == "stub":
+        return StubWeatherProvider(latency=float(os.getenv("WEATHER_STUB_LATENCY", "0")))
+    return PROVIDERS[name]()
+
+
+def location_key(location: str) -> str:
+    return " ".join(location.lower().replace(",", " ").split())
+
+
+class WeatherCache:
+    """Per-location TTL cache with coalesced misses and stale-while-revalidate"""
+
+    def __init__(self, provider: WeatherProvider, ttl: float = 600.0, stale_ttl: float = 3600.0,
+                 max_entries: int = 1000):
+        self.provider = provider
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, Tuple[float, Reading]]" = OrderedDict()  # key -> (fetched_at, reading)
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.counts = {"hits": 0, "stale_hits": 0, "misses": 0, "coalesced": 0,
+                       "upstream_calls": 0, "upstream_errors": 0}
+
+    async def get(self, location: str) -> Tuple[Reading, str]:
+        """(reading, "fresh" | "stale" | "fetched") for ``location``"""
+        key = location_key(location)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            age = time.monotonic() - entry[0]
+            if age < self.ttl:
+                self.counts["hits"] += 1
+                return entry[1], "fresh"
+            if age < self.stale_ttl:
+                # Answer now, refresh in the background (once per location)
+                self.counts["stale_hits"] += 1
+                self._refresh(key, location)
+                return entry[1], "stale"
+        self.counts["misses"] += 1
+        if key in self._inflight:
+            self.counts["coalesced"] += 1
+        try:
+            return await asyncio.shield(self._refresh(key, location)), "fetched"
+        except Exception:
+            if entry is not None:
+                return entry[1], "stale"
+            raise
+
+    def _refresh(self, key: str, location: str) -> asyncio.Task:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.get_running_loop().create_task(self._fetch(key, location))
+            self._inflight[key] = task
+            # Nobody may await a background refresh; keep its error from going unretrieved
+            task.add_done_callback(lambda t: t.cancelled() or t.exception())
+        return task
+
+    async def _fetch(self, key: str, location: str) -> Reading:
+        try:
+            self.counts["upstream_calls"] += 1
+            reading = await self.provider.fetch(location)
+        except Exception as e:
+            self.counts["upstream_errors"] += 1
+            log.warning("weather_fetch_failed", provider=self.provider.name, location=location, error=str(e))
+            raise
+        finally:
+            self._inflight.pop(key, None)
+        self._entries[key] = (time.monotonic(), reading)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return reading
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "provider": self.provider.name,
+            **self.counts,
+            "entries": len(self._entries),
+            "inflight": len(self._inflight),
+            "ttl_s": self.ttl,
+            "stale_ttl_s": self.stale_ttl,
+        }
@@ -0,0 +1,96 @@
+"""
+Admission control for LLM calls.
+
+A concurrency limiter with a bounded wait queue sits in front of the LLM.
+When the queue is full (or a request waits too long) the call is rejected
+straight away with ``Overloaded`` so the endpoint can answer 503 with a
+``Retry-After`` hint instead of letting requests pile up until they time out.
+"""
+import asyncio
+import math
+import time
+from contextlib import asynccontextmanager
+from typing import Any, Dict
+
+from metrics import metrics, observe_phase
+
+
+class Overloaded(Exception):
+    """Raised when the LLM admission queue is full"""
+
+    def __init__(self, retry_after: int, reason: str = "queue_full"):
+        super().__init__(f"LLM capacity exhausted ({reason}), retry after {retry_after}s")
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class AdmissionController:
+    """Bounded-queue concurrency limiter"""
+
+    def __init__(self, max_concurrency: int = 8, max_queue: int = 32, queue_timeout: float = 15.0):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.in_flight = 0
+        self.waiting = 0
+        self.rejected = 0
+        self._avg_service_ms = 1000.0  # EWMA of time a slot is held
+
+    def retry_after(self) -> int:
+        """Estimate (in whole seconds) how long until a queued request would be served"""
+        backlog = (self.waiting + 1) / max(1, self.max_concurrency)
+        return max(1, math.ceil(backlog * self._avg_service_ms / 1000))
+
+    def _publish(self):
+        metrics.set_gauge("llm_in_flight", self.in_flight)
+        metrics.set_gauge("llm_queue_depth", self.waiting)
+
+    def _reject(self, reason: str):
+        self.rejected += 1
+        metrics.incr(f"llm_rejected_{reason}")
+        raise Overloaded(self.retry_after(), reason)
+
+    @asynccontextmanager
+    async def slot(self):
+        """Hold one LLM concurrency slot for the duration of the block"""
+        if self._semaphore.locked() and self.waiting >= self.max_queue:
+            self._reject("queue_full")
+
+        self.waiting += 1
+        self._publish()
+        wait_start = time.perf_counter()
+        try:
+            await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._reject("queue_timeout")
+        finally:
+            self.waiting -= 1
+            observe_phase("queue", (time.perf_counter() - wait_start) * 1000, metric="llm_queue_wait")
+
+        self.in_flight += 1
+        self._publish()
+        service_start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            self._semaphore.release()
+            service_ms = (time.perf_counter() - service_start) * 1000
+            self._avg_service_ms = 0.8 * self._avg_service_ms + 0.2 * service_ms
+            self._publish()
+
+    def is_idle(self) -> bool:
+        """True when nothing is queued and there is spare capacity"""
+        return self.waiting == 0 and self.in_flight < self.max_concurrency
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "queue_timeout_s": self.queue_timeout,
+            "in_flight": self.in_flight,
+            "queue_depth": self.waiting,
+            "rejected": self.rejected,
+            "avg_service_ms": round(self._avg_service_ms, 2),
+        }
@@ -0,0 +1,718 @@
+"""
+Buddy's RAG pipeline: LLM routing, ChromaDB conversation store and per-user memory.
+
+This module pulls in LangChain, Gemini and Chroma, so ``main`` imports it
+lazily (in the lifespan hook or on first use) to keep server startup fast.
+"""
+import os
+import asyncio
+import logging
+import time
+import weakref
+from typing import List, Dict, Any, AsyncIterator, Optional, Tuple
+from datetime import datetime
+
+from langchain_google_genai import ChatGoogleGenerativeAI
+from langchain_chroma import Chroma
+from langchain_community.embeddings import FakeEmbeddings
+from langchain_core.documents import Document
+from langchain_core.messages import HumanMessage
+
+from metrics import metrics, observe_phase
+from structured_logging import get_logger
+from idempotency import IdempotencyCache
+from context_ranker import ContextRanker
+from embedding_cache import CachedEmbeddings
+from keyword_index import KeywordIndex, reciprocal_rank_fusion
+from admission import AdmissionController, Overloaded
+from model_router import ModelRouter
+from prompt_builder import PromptBuilder, truncate_to_tokens
+from retention import RetentionJob
+from session_store import SQLiteSessionStore, create_session_store
+from summary_memory import SummaryMemory
+from user_stats import SQLiteUserStatsStore, UserStatsStore
+
+# Disable ChromaDB telemetry to avoid warnings
+os.environ["ANONYMIZED_TELEMETRY"] = "False"
+
+log = get_logger("buddy.rag")
+
+class BuddyRAG:
+    def __init__(self):
+        # "fake" swaps Gemini for a local deterministic model (load tests, offline dev)
+        self.llm_backend = os.getenv("BUDDY_LLM_BACKEND", "gemini").lower()
+        self.google_api_key = os.getenv("GOOGLE_API_KEY")
+        if self.llm_backend == "fake":
+            from fake_llm import FakeLLM
+            log.info("fake_llm_backend")
+            models = {"fake": FakeLLM.from_env()}
+        else:
+            models = self._create_gemini_models()
+        
+        # Route calls across all models: circuit breakers take failing models
+        # out of rotation and the fastest healthy model is preferred
+        self.llm = ModelRouter(
+            models,
+            failure_threshold=int(os.getenv("BUDDY_MODEL_FAILURE_THRESHOLD", "3")),
+            cooldown_seconds=float(os.getenv("BUDDY_MODEL_COOLDOWN", "30"))
+        )
+        
+        # Initialize ChromaDB (a shared Chroma server when CHROMA_SERVER_HOST is set)
+        self.chroma_path = os.getenv("CHROMA_DB_PATH", "./chroma_db")
+        
+        # Initialize embeddings (using lightweight fake embeddings for compatibility)
+        # behind a content-addressed cache: off | memory | disk
+        self.embeddings = FakeEmbeddings(size=384)
+        embedding_cache = os.getenv("BUDDY_EMBEDDING_CACHE", "disk").lower()
+        if embedding_cache in ("memory", "disk"):
+            self.embeddings = CachedEmbeddings(
+                self.embeddings,
+                memory_items=int(os.getenv("BUDDY_EMBEDDING_CACHE_ITEMS", "10000")),
+                directory=os.getenv("BUDDY_EMBEDDING_CACHE_DIR", os.path.join(self.chroma_path, "embedding_cache"))
+                if embedding_cache == "disk" else None
+            )
+        self.chroma_host = os.getenv("CHROMA_SERVER_HOST")
+        self.vector_store = self._create_vector_store()
+        
+        # Hybrid retrieval: BM25 over each user's stored turns fused with vector
+        # search (reciprocal rank fusion) within a latency budget
+        self.retrieval_mode = os.getenv("BUDDY_RETRIEVAL_MODE", "hybrid").lower()
+        self.retrieval_budget_ms = float(os.getenv("BUDDY_RETRIEVAL_BUDGET_MS", "250"))
+        self.rrf_k = int(os.getenv("BUDDY_RRF_K", "60"))
+        self._keyword_loads: Dict[str, asyncio.Future] = {}
+        # Bumped when a user is deleted; index updates started before then are dropped
+        self._user_generation: Dict[str, int] = {}
+        # Serializes deleting a user with background rewrites of their documents
+        self._user_locks: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+        
+        # Re-rank the fused candidates by relevance + recency, skipping near-duplicates
+        self.retrieval_candidates = int(os.getenv("BUDDY_RETRIEVAL_CANDIDATES", "50"))
+        self.context_ranker = ContextRanker(
+            recency_weight=float(os.getenv("BUDDY_RECENCY_WEIGHT", "0.3")),
+            half_life_days=float(os.getenv("BUDDY_RECENCY_HALF_LIFE_DAYS", "30")),
+            duplicate_threshold=float(os.getenv("BUDDY_DEDUP_THRESHOLD", "0.8")),
+            diversity=float(os.getenv("BUDDY_CONTEXT_DIVERSITY", "0.3"))
+        )
+        
+        # Recent turns and summaries per user; the SQLite backend is shared by all workers
+        self.sessions = create_session_store()
+        
+        # Keyword indexes live in each worker; with shared sessions (several
+        # workers) they are rebuilt periodically to see other workers' turns
+        shared = isinstance(self.sessions, SQLiteSessionStore)
+        self.keyword_index = KeywordIndex(
+            max_users=int(os.getenv("BUDDY_KEYWORD_INDEX_USERS", "1000")),
+            max_age_seconds=float(os.getenv("BUDDY_KEYWORD_INDEX_MAX_AGE", "60" if shared else "0"))
+        )
+        
+        # Per-user turn counts / first-last seen / bytes, kept with the sessions
+        # when they are shared, else persisted next to ChromaDB
+        if isinstance(self.sessions, SQLiteSessionStore):
+            self.user_stats = SQLiteUserStatsStore(self.sessions)
+        else:
+            self.user_stats = UserStatsStore(self.chroma_path)
+        self._user_stats_rebuilt = False
+        self._check_shared_state()
+        
+        # Prompt assembly within a fixed token budget
+        self.prompt_builder = PromptBuilder(
+            max_tokens=int(os.getenv("BUDDY_PROMPT_TOKEN_BUDGET", "2000")),
+            max_history_messages=int(os.getenv("BUDDY_PROMPT_HISTORY_MESSAGES", "6")),
+            max_context_items=int(os.getenv("BUDDY_PROMPT_CONTEXT_ITEMS", "3"))
+        )
+        
+        # Session memory is rebuilt lazily from ChromaDB on a user's first request
+        self.warm_start_turns = int(os.getenv("BUDDY_WARM_START_TURNS", "3"))
+        self._session_loads: Dict[str, asyncio.Future] = {}
+        
+        # Optional rolling summary memory ("buffer" keeps the plain recent-turn window)
+        self.memory_mode = os.getenv("BUDDY_MEMORY_MODE", "buffer").lower()
+        self.summary_max_tokens = int(os.getenv("BUDDY_SUMMARY_MAX_TOKENS", "250"))
+        self.summary_memory = SummaryMemory(
+            summarize=self.summarize_turns,
+            sessions=self.sessions,
+            is_idle=lambda: self.admission.is_idle(),
+            keep_recent_messages=self.prompt_builder.max_history_messages,
+            batch_messages=int(os.getenv("BUDDY_SUMMARY_BATCH_MESSAGES", "6")),
+            min_interval_seconds=float(os.getenv("BUDDY_SUMMARY_MIN_INTERVAL", "5"))
+        )
+        
+        # Bounded concurrency + wait queue in front of the LLM
+        self.admission = AdmissionController(
+            max_concurrency=int(os.getenv("BUDDY_LLM_MAX_CONCURRENCY", "8")),
+            max_queue=int(os.getenv("BUDDY_LLM_MAX_QUEUE", "32")),
+            queue_timeout=float(os.getenv("BUDDY_LLM_QUEUE_TIMEOUT", "15"))
+        )
+        
+        # Collapse retried/duplicate chat requests onto one LLM call
+        self.idempotency = IdempotencyCache(
+            ttl_seconds=float(os.getenv("BUDDY_IDEMPOTENCY_TTL", "120")),
+            window_seconds=float(os.getenv("BUDDY_IDEMPOTENCY_WINDOW", "10"))
+        )
+        
+        # Per-user caps / age limits: old turns are folded into summary documents
+        self.retention = RetentionJob(self)
+        
+        # System prompt
+        self.system_prompt = """You are Buddy, a friendly AI chatbot who talks like a good friend. 
+
+Key characteristics:
+- Be warm, conversational, and personable
+- Use casual, friendly language like you're talking to a close friend
+- ONLY reference past conversations if they are explicitly provided in the context below
+- Show genuine interest in the user's life and experiences
+- Be supportive and encouraging
+- Use humor appropriately
+- Ask follow-up questions to keep conversations engaging
+
+IMPORTANT: Only mention or reference specific past events, topics, or conversations if they are clearly mentioned in the conversation history provided. Do not make up or hallucinate past interactions."""
+
+    def _create_gemini_models(self) -> Dict[str, ChatGoogleGenerativeAI]:
+        if not self.google_api_key:
+            raise ValueError("GOOGLE_API_KEY environment variable is required")
+        
+        # Initialize LLM
+        # Try different Gemini models in order of preference
+        # Based on current API limitations and availability
+        model_options = [
+            "gemini-2.0-flash-exp",      # Latest experimental model
+            "gemini-1.5-flash",          # Most stable option
+            "gemini-1.5-pro",            # If available in project
+            "gemini-pro",                # Legacy fallback
+            "models/gemini-1.5-flash",   # Alternative naming
+        ]
+        
+        models = {}
+        for model_name in model_options:
+            try:
+                models[model_name] = ChatGoogleGenerativeAI(
+                    model=model_name,
+                    google_api_key=self.google_api_key,
+                    temperature=0.7,
+                    max_retries=1,  # Reduce retries for faster failover
+                    request_timeout=10  # 10 second timeout
+                )
+                log.info("model_registered", model=model_name)
+            except Exception as e:
+                log.error("model_init_failed", model=model_name, error=str(e)[:100])
+        
+        if not models:
+            log.warning("model_fallback_config", model="gemini-1.5-flash")
+            models["gemini-1.5-flash"] = ChatGoogleGenerativeAI(
+                model="gemini-1.5-flash",
+                google_api_key=self.google_api_key,
+                temperature=0.7,
+                max_retries=1
+            )
+        return models
+
+    @property
+    def current_model(self) -> str:
+        """Model that served the most recent successful call"""
+        return self.llm.current_model
+
+    def user_lock(self, user_id: str) -> asyncio.Lock:
+        """Lock held while a user's documents are deleted or rewritten"""
+        lock = self._user_locks.get(user_id)
+        if lock is None:
+            lock = asyncio.Lock()
+            self._user_locks[user_id] = lock
+        return lock
+
+    def document_count(self) -> int:
+        """Documents in the collection (blocking; the LangChain wrapper has no public count)"""
+        return self.vector_store._collection.count()
+
+    def _create_vector_store(self) -> Chroma:
+        if self.chroma_host:
+            import chromadb
+            client = chromadb.HttpClient(host=self.chroma_host, port=int(os.getenv("CHROMA_SERVER_PORT", "8000")))
+            return Chroma(client=client, embedding_function=self.embeddings, collection_name="buddy_conversations")
+        return Chroma(
+            persist_directory=self.chroma_path,
+            embedding_function=self.embeddings,
+            collection_name="buddy_conversations"
+        )
+
+    def _check_shared_state(self):
+        """Refuse to run several workers on process-local state"""
+        workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+        if workers <= 1:
+            return
+        if not self.chroma_host:
+            # Concurrent writers on one embedded Chroma directory can corrupt it
+            raise RuntimeError(f"WEB_CONCURRENCY={workers} requires CHROMA_SERVER_HOST; "
+                               f"the local store at {self.chroma_path} is single-process only")
+        if not isinstance(self.sessions, SQLiteSessionStore):
+            log.warning("sessions_not_shared", workers=workers, backend="memory")
+
+    def reset_store(self):
+        """Wipe ChromaDB and every in-process buffer derived from it"""
+        # Drop the collection through the client rather than deleting the
+        # directory under it: the client may hold SQLite connections on other
+        # threads (BuddyRAG is built in a worker thread)
+        self.vector_store.delete_collection()
+        
+        # Clear all user sessions
+        self.sessions.clear_all()
+        self.user_stats.clear()
+        self.keyword_index.clear()
+        self.idempotency.clear()
+        self.summary_memory.clear()
+        
+        # Reinitialize ChromaDB
+        self.vector_store = self._create_vector_store()
+
+    async def ping_llm(self, text: str = "Hi") -> str:
+        """Send a tiny prompt through the model router (used by /debug/model)"""
+        response = await self.llm.ainvoke([HumanMessage(content=text)])
+        return response.content
+
+    async def ensure_user_session(self, user_id: str) -> bool:
+        """Lazily rebuild a returning user's session memory from the persistent store.
+
+        On the first access after a restart, the user's last few turns are
+        restored with one metadata-filtered query. It reads the metadata of
+        all of that user's turns, which holds the full user and assistant
+        messages, and keeps the newest ``BUDDY_WARM_START_TURNS``. Chroma
+        cannot order or limit by timestamp, so the read grows with the
+        user's history, but it never touches embeddings or other users'
+        data. Concurrent first requests share a single load. Returns True if
+        stored turns were restored.
+        """
+        if self.sessions.has_session(user_id):
+            return False
+        load = self._session_loads.get(user_id)
+        if load is None:
+            load = asyncio.ensure_future(self._load_user_session(user_id))
+            self._session_loads[user_id] = load
+            load.add_done_callback(lambda _: self._session_loads.pop(user_id, None))
+        return await asyncio.shield(load) > 0
+
+    async def _load_user_session(self, user_id: str) -> int:
+        start = time.perf_counter()
+        try:
+            stored = await asyncio.get_event_loop().run_in_executor(
+                None,
+                lambda: self.vector_store.get(where={"user_id": user_id}, include=["metadatas"])
+            )
+            # Retention summaries are retrievable context, not turns to replay
+            turns = sorted(
+                (m for m in stored.get("metadatas") or [] if m.get("type") != "summary"),
+                key=lambda m: m.get("timestamp", "")
+            )
+            turns = turns[-self.warm_start_turns:] if self.warm_start_turns > 0 else []
+        except Exception as e:
+            log.error("warm_start_failed", user_id=user_id, error=str(e))
+            turns = []
+        
+        # A concurrent turn (possibly in another worker) may have created the
+        # session meanwhile; keep it
+        seed = []
+        for meta in turns:
+            seed.append(("User", meta.get("user_message", "")))
+            seed.append(("Buddy", meta.get("assistant_message", "")))
+        if not self.sessions.start_session(user_id, seed):
+            return 0
+        
+        metrics.observe("session_warm_start", (time.perf_counter() - start) * 1000)
+        if turns:
+            metrics.incr("session_warm_starts")
+            log.info("session_warm_started", user_id=user_id, turns=len(turns))
+        return len(turns)
+
+    def get_user_turns(self, user_id: str, limit: Optional[int] = None) -> List[tuple[str, str]]:
+        """Return the user's session turns as (speaker, text) pairs, oldest first"""
+        return self.sessions.get_turns(user_id, limit=limit)
+
+    async def summarize_turns(self, previous_summary: str, turns: List[tuple[str, str]]) -> str:
+        """Fold older turns into the user's running summary (runs in the background)"""
+        transcript = "\n".join(f"{speaker}: {text}" for speaker, text in turns)
+        prompt = f"""Update the running summary of a friendly chat between a user and Buddy.
+Keep names, places, plans, preferences and feelings the user shared. Write in the third person about "the user".
+Keep it under {int(self.summary_max_tokens * 0.7)} words.
+
+Current summary:
+{previous_summary or "(none yet)"}
+
+New conversation to fold in:
+{transcript}
+
+Updated summary:"""
+        async with self.admission.slot():
+            response = await self.llm.ainvoke([HumanMessage(content=prompt)])
+        return truncate_to_tokens(response.content.strip(), self.summary_max_tokens)
+
+    async def store_conversation(self, user_message: str, assistant_message: str, user_id: str):
+        """Store the conversation in ChromaDB for future retrieval with user_id"""
+        try:
+            # Create document with conversation
+            conversation_text = f"User: {user_message}\nBuddy: {assistant_message}"
+            
+            # Create metadata with user_id for session management
+            metadata = {
+                "timestamp": datetime.now().isoformat(),
+                "user_message": user_message,
+                "assistant_message": assistant_message,
+                "user_id": user_id,  # Add user_id to metadata
+                "conversation_id": f"conv_{user_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+            }
+            
+            # Create document
+            doc = Document(
+                page_content=conversation_text,
+                metadata=metadata
+            )
+            
+            # Add to vector store
+            generation = self._user_generation.get(user_id, 0)
+            ids = await asyncio.get_event_loop().run_in_executor(
+                None, 
+                lambda: self.vector_store.add_documents([doc])
+            )
+            if self._user_generation.get(user_id, 0) != generation:
+                # The user was deleted while this turn was being written
+                await asyncio.get_event_loop().run_in_executor(None, lambda: self.vector_store.delete(ids=ids))
+                return
+            self.keyword_index.add(user_id, ids[0], conversation_text, metadata)
+            load = self._keyword_loads.get(user_id)
+            if load is not None:
+                # The index being built may have been read before this turn was stored
+                def add_when_loaded(_):
+                    if self._user_generation.get(user_id, 0) == generation:
+                        self.keyword_index.add(user_id, ids[0], conversation_text, metadata)
+                load.add_done_callback(add_when_loaded)
+            
+            # Keep the per-user aggregate in step with the store
+            self.user_stats.record_turn(user_id, metadata["timestamp"], len(conversation_text.encode("utf-8")))
+            
+        except Exception as e:
+            log.error("store_failed", user_id=user_id, error=str(e))
+
+    async def ensure_user_stats(self, batch_size: int = 1000):
+        """Build the per-user stats once from ChromaDB if no persisted aggregate exists yet"""
+        if self.user_stats.loaded_from_disk or self._user_stats_rebuilt:
+            return
+        self._user_stats_rebuilt = True
+        loop = asyncio.get_event_loop()
+        rows = []
+        offset = 0
+        while True:
+            batch = await loop.run_in_executor(
+                None,
+                lambda: self.vector_store.get(limit=batch_size, offset=offset, include=["metadatas", "documents"])
+            )
+            metadatas = batch.get("metadatas") or []
+            if not metadatas:
+                break
+            rows.extend((meta or {}, len((doc or "").encode("utf-8"))) for meta, doc in zip(metadatas, batch["documents"]))
+            offset += len(metadatas)
+        await loop.run_in_executor(None, lambda: self.user_stats.rebuild(rows))
+        log.info("user_stats_rebuilt", conversations=len(rows))
+
+    async def delete_user_conversations(self, user_id: str, batch_size: int = 500) -> int:
+        """Delete every stored conversation for one user using a metadata-filtered delete.
+
+        Works in batches of ``batch_size`` ids, each in its own executor call, so
+        the cost is proportional to this user's data and other users' reads and
+        writes keep running between batches.
+        """
+        loop = asyncio.get_event_loop()
+        deleted = 0
+        # Invalidate index loads and stores already in flight for this user
+        self._user_generation[user_id] = self._user_generation.get(user_id, 0) + 1
+        self._keyword_loads.pop(user_id, None)
+        async with self.user_lock(user_id):
+            while True:
+                batch = await loop.run_in_executor(
+                    None,
+                    lambda: self.vector_store.get(where={"user_id": user_id}, limit=batch_size, include=[])
+                )
+                ids = batch.get("ids") or []
+                if not ids:
+                    break
+                await loop.run_in_executor(None, lambda: self.vector_store.delete(ids=ids))
+                deleted += len(ids)
+            
+            # Drop the session and any replayable answers as well
+            self.sessions.clear_user(user_id)
+            self.user_stats.remove_user(user_id)
+            self.keyword_index.remove_user(user_id)
+            self.idempotency.forget_user(user_id)
+            self.summary_memory.forget(user_id)
+        return deleted
+
+    async def retrieve_relevant_context(self, query: str, user_id: str, k: int = 3) -> List[str]:
+        """Retrieve relevant past conversations for specific user"""
+        try:
+            start = time.perf_counter()
+            candidates = await self.retrieve_candidates(query, user_id, self.retrieval_candidates)
+            rerank_start = time.perf_counter()
+            selected = self.context_ranker.select(
+                [(doc.page_content, doc.metadata, score) for doc, score in candidates], k
+            )
+            metrics.observe("context_rerank", (time.perf_counter() - rerank_start) * 1000)
+            context = [candidate.text for candidate in selected]
+            
+            elapsed_ms = (time.perf_counter() - start) * 1000
+            observe_phase("retrieval", elapsed_ms)
+            log.debug("context_retrieved", user_id=user_id, candidates=len(candidates),
+                      matched=len(context), ms=round(elapsed_ms, 2))
+            return context
+            
+        except Exception as e:
+            log.error("retrieval_failed", user_id=user_id, error=str(e))
+            return []
+
+    async def retrieve_candidates(self, query: str, user_id: str, n: int) -> List[Tuple[Document, float]]:
+        """Up to ``n`` of the user's stored turns with relevance scores, best first.
+
+        Vector search (filtered to the user) and, in hybrid mode, the user's
+        BM25 index are queried concurrently and fused with reciprocal rank
+        fusion. Whatever has not answered within the retrieval budget is left
+        out of this request rather than delaying the response.
+        """
+        deadline = time.perf_counter() + self.retrieval_budget_ms / 1000
+        vector_search = asyncio.ensure_future(self._vector_search(query, user_id, n))
+        
+        keyword_docs: List[Document] = []
+        if self.retrieval_mode == "hybrid":
+            if await self._await_within(self.ensure_keyword_index(user_id), deadline):
+                keyword_start = time.perf_counter()
+                keyword_docs = [
+                    Document(page_content=text, metadata=metadata)
+                    for _, _, text, metadata in self.keyword_index.search(user_id, query, n)
+                ]
+                metrics.observe("keyword_search", (time.perf_counter() - keyword_start) * 1000)
+        
+        vector_docs = await self._await_within(vector_search, deadline) or []
+        
+        # Fuse on the turn text (shared by both result lists); a single list
+        # gets the same rank-based scores
+        by_text = {doc.page_content: doc for doc in keyword_docs + vector_docs}
+        fused = reciprocal_rank_fusion(
+            [[doc.page_content for doc in docs] for docs in (vector_docs, keyword_docs) if docs],
+            k=self.rrf_k
+        )
+        return [(by_text[text], score) for text, score in fused[:n]]
+
+    async def _await_within(self, awaitable, deadline: float):
+        """Result of ``awaitable`` if it finishes before ``deadline``, else None (it keeps running)"""
+        try:
+            return await asyncio.wait_for(asyncio.shield(awaitable), timeout=max(deadline - time.perf_counter(), 0))
+        except asyncio.TimeoutError:
+            metrics.incr("retrieval_budget_exceeded")
+            return None
+
+    async def _vector_search(self, query: str, user_id: str, n: int) -> List[Document]:
+        try:
+            return await asyncio.get_event_loop().run_in_executor(
+                None,
+                lambda: self.vector_store.similarity_search(query, k=n, filter={"user_id": user_id})
+            )
+        except Exception as e:
+            log.error("vector_search_failed", user_id=user_id, error=str(e))
+            return []
+
+    async def ensure_keyword_index(self, user_id: str) -> bool:
+        """Build the user's BM25 index from the vector store once (concurrent callers share the load)"""
+        if self.keyword_index.has_user(user_id):
+            return True
+        load = self._keyword_loads.get(user_id)
+        if load is None:
+            load = asyncio.ensure_future(self._load_keyword_index(user_id))
+            self._keyword_loads[user_id] = load
+            # Only clear our own entry (a delete may have dropped it and a new load started)
+            load.add_done_callback(lambda done: self._keyword_loads.pop(user_id, None)
+                                   if self._keyword_loads.get(user_id) is done else None)
+        return await asyncio.shield(load)
+
+    async def _load_keyword_index(self, user_id: str) -> bool:
+        start = time.perf_counter()
+        generation = self._user_generation.get(user_id, 0)
+        try:
+            stored = await asyncio.get_event_loop().run_in_executor(
+                None,
+                lambda: self.vector_store.get(where={"user_id": user_id}, include=["documents", "metadatas"])
+            )
+        except Exception as e:
+            log.error("keyword_index_load_failed", user_id=user_id, error=str(e))
+            return False
+        if self._user_generation.get(user_id, 0) != generation:
+            # Deleted while loading: what was read must not be indexed
+            return False
+        self.keyword_index.load_user(user_id, zip(stored["ids"], stored["documents"], stored["metadatas"]))
+        metrics.observe("keyword_index_load", (time.perf_counter() - start) * 1000)
+        return True
+
+    def build_prompt(self, user_message: str, user_id: str, relevant_context: List[str]) -> str:
+        """Assemble the full prompt within the token budget and record its size"""
+        # Get the recent conversation history from the user's session
+        history = self.get_user_turns(user_id, limit=self.prompt_builder.max_history_messages)
+        summary = self.sessions.get_summary(user_id) if self.memory_mode == "summary" else ""
+        
+        plan = self.prompt_builder.build(self.system_prompt, user_message, history, relevant_context, summary=summary)
+        metrics.observe_value("prompt_tokens", plan.tokens)
+        if plan.truncated or plan.dropped:
+            metrics.incr("prompt_parts_trimmed", plan.truncated + plan.dropped)
+        log.debug("prompt_built", user_id=user_id, tokens=plan.tokens, history_messages=plan.history_messages,
+                  context_items=plan.context_items, truncated=plan.truncated, dropped=plan.dropped)
+        return plan.text
+
+    def classify_llm_error(self, api_error: Exception) -> tuple[str, str]:
+        """Map a Gemini API error to (kind, friendly message); kind is 'retry' for transient errors"""
+        error_str = str(api_error).lower()
+        
+        # Handle specific Gemini API errors
+        if "quota" in error_str or "429" in error_str:
+            return "fatal", "Hey! I've hit my daily chat limit, but I'll be back tomorrow! Thanks for being patient with me! 😊"
+        elif "404" in error_str or "not found" in error_str:
+            return "fatal", f"Oops! The AI model '{self.current_model}' isn't available right now. My developer needs to update my configuration! 🔧"
+        elif "500" in error_str or "internal" in error_str:
+            return "retry", "Sorry, I'm having some technical difficulties right now. The AI service seems to be having issues. Please try again in a few minutes! 🛠️"
+        elif "access" in error_str or "permission" in error_str:
+            return "fatal", "It looks like there's an issue with my API access. My developer needs to check my credentials! 🔑"
+        # Unknown error - try once more, then give friendly message
+        return "retry", "I'm having a bit of trouble thinking right now. Please try asking me again! 🤔"
+
+    async def commit_turn(self, user_message: str, assistant_message: str, user_id: str):
+        """Record a completed exchange in the user's memory and the vector store"""
+        start = time.perf_counter()
+        # Update the user's session
+        self.sessions.append_turn(user_id, user_message, assistant_message)
+        if log.is_enabled(logging.DEBUG):
+            log.debug("memory_updated", user_id=user_id, messages=self.sessions.message_count(user_id))
+        
+        # Store conversation for future retrieval with user_id
+        await self.store_conversation(user_message, assistant_message, user_id)
+        observe_phase("store", (time.perf_counter() - start) * 1000)
+        
+        # Older turns get folded into the summary after the response is sent
+        if self.memory_mode == "summary":
+            self.summary_memory.schedule(user_id)
+
+    async def generate_response(self, user_message: str, user_id: str, idempotency_key: Optional[str] = None) -> tuple[str, List[str]]:
+        """Generate response using RAG pipeline with user session.
+
+        Identical requests (same explicit idempotency key, or same user and
+        text within the dedup window) share one LLM call, and a recently
+        completed answer is replayed without storing the turn again.
+        """
+        key = self.idempotency.make_key(user_id, user_message, idempotency_key)
+        (answer, context), status = await self.idempotency.run(
+            key,
+            lambda: self._generate_turn(user_message, user_id)
+        )
+        if status != "fresh":
+            metrics.incr(f"idempotency_{status}")
+            log.info("chat_deduplicated", user_id=user_id, status=status)
+        return answer, context
+
+    async def _generate_turn(self, user_message: str, user_id: str) -> tuple[tuple[str, List[str]], bool]:
+        """Run one RAG turn; returns ((answer, context), committed)"""
+        try:
+            turn_start = time.perf_counter()
+            # Retrieve relevant context for this specific user while (on a
+            # returning user's first request) their session is warm-started
+            relevant_context, warm_started = await asyncio.gather(
+                self.retrieve_relevant_context(user_message, user_id),
+                self.ensure_user_session(user_id)
+            )
+            full_prompt = self.build_prompt(user_message, user_id, relevant_context)
+
+            # Generate response with comprehensive error handling
+            max_attempts = 3
+            for attempt in range(max_attempts):
+                try:
+                    async with self.admission.slot():
+                        llm_start = time.perf_counter()
+                        response = await self.llm.ainvoke([HumanMessage(content=full_prompt)])
+                        observe_phase("llm", (time.perf_counter() - llm_start) * 1000)
+                    break  # Success!
+                    
+                except Overloaded:
+                    raise
+                except Exception as api_error:
+                    metrics.incr("llm_errors")
+                    kind, friendly_message = self.classify_llm_error(api_error)
+                    if kind == "retry" and attempt < max_attempts - 1:
+                        log.warning("llm_retry", attempt=attempt + 1, error=str(api_error)[:100])
+                        await asyncio.sleep(2 ** attempt)  # Exponential backoff
+                        continue
+                    return (friendly_message, relevant_context), False
+            
+            assistant_message = response.content
+            await self.commit_turn(user_message, assistant_message, user_id)
+            if warm_started:
+                metrics.observe("chat_first_request", (time.perf_counter() - turn_start) * 1000)
+            
+            return (assistant_message, relevant_context), True
+            
+        except Overloaded:
+            raise
+        except Exception as e:
+            log.error("generate_failed", user_id=user_id, error=str(e), exc_info=True)
+            return ("Hey! I'm having a little trouble right now, but I'm still here for you. Can you try asking me again?", []), False
+
+    async def generate_response_stream(self, user_message: str, user_id: str) -> AsyncIterator[Dict[str, Any]]:
+        """Stream the response token by token.
+
+        Yields ``{"type": "token", "text": ...}`` events while the LLM is
+        generating and a final ``{"type": "done", ...}`` event carrying the full
+        answer and the context used. Memory and ChromaDB are only updated once
+        the stream has completed successfully. If the LLM queue is full the
+        only event is ``{"type": "overloaded", "retry_after": ...}``.
+        """
+        request_start = time.perf_counter()
+        relevant_context: List[str] = []
+        try:
+            relevant_context, _ = await asyncio.gather(
+                self.retrieve_relevant_context(user_message, user_id),
+                self.ensure_user_session(user_id)
+            )
+            full_prompt = self.build_prompt(user_message, user_id, relevant_context)
+
+            chunks: List[str] = []
+            max_attempts = 3
+            for attempt in range(max_attempts):
+                try:
+                    async with self.admission.slot():
+                        llm_start = time.perf_counter()
+                        async for chunk in self.llm.astream([HumanMessage(content=full_prompt)]):
+                            if not chunk.content:
+                                continue
+                            if not chunks:
+                                metrics.observe("llm_ttft", (time.perf_counter() - llm_start) * 1000)
+                                metrics.observe("chat_stream_ttft", (time.perf_counter() - request_start) * 1000)
+                            chunks.append(chunk.content)
+                            yield {"type": "token", "text": chunk.content}
+                        observe_phase("llm", (time.perf_counter() - llm_start) * 1000)
+                    break  # Success!
+
+                except Overloaded as overloaded:
+                    # Only possible before the first token was sent
+                    yield {"type": "overloaded", "retry_after": overloaded.retry_after}
+                    return
+                except Exception as api_error:
+                    metrics.incr("llm_errors")
+                    kind, friendly_message = self.classify_llm_error(api_error)
+                    # Once tokens have been sent we can't transparently retry
+                    if kind == "retry" and not chunks and attempt < max_attempts - 1:
+                        log.warning("llm_retry", attempt=attempt + 1, error=str(api_error)[:100])
+                        await asyncio.sleep(2 ** attempt)  # Exponential backoff
+                        continue
+                    yield {"type": "error", "text": friendly_message}
+                    yield {"type": "done", "answer": "".join(chunks) or friendly_message, "context_used": relevant_context, "complete": False}
+                    return
+
+            assistant_message = "".join(chunks)
+            await self.commit_turn(user_message, assistant_message, user_id)
+            metrics.observe("chat_stream_total", (time.perf_counter() - request_start) * 1000)
+
+            yield {"type": "done", "answer": assistant_message, "context_used": relevant_context, "complete": True}
+
+        except Exception as e:
+            log.error("stream_failed", user_id=user_id, error=str(e), exc_info=True)
+            friendly_message = "Hey! I'm having a little trouble right now, but I'm still here for you. Can you try asking me again?"
+            yield {"type": "error", "text": friendly_message}
+            yield {"type": "done", "answer": friendly_message, "context_used": relevant_context, "complete": False}
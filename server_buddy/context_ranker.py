@@ -0,0 +1,105 @@
+"""
+Re-ranking of retrieved turns before they go into the prompt.
+
+Candidates arrive with a relevance score (from fusion) and the stored
+``timestamp`` metadata. The final score blends relevance with an
+exponential time decay, so a months-old turn needs to be clearly more
+relevant to beat last week's. Selection is greedy (maximal marginal
+relevance): each pick is penalised by its word overlap with what has
+already been picked, and near-duplicates above ``duplicate_threshold``
+are skipped outright, so repeated turns don't fill the context.
+
+Since the overlap penalty can only lower a candidate's score, the scan for
+each pick stops at the first candidate whose blended score is below the best
+value found so far; token sets and overlaps are computed lazily for the
+candidates actually examined. A few hundred candidates take a few
+milliseconds at most, typically well under one.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, FrozenSet, List, Optional, Sequence, Tuple
+
+from keyword_index import tokenize
+
+
+@dataclass
+class RankedCandidate:
+    text: str
+    metadata: Dict[str, Any]
+    relevance: float
+    recency: float = 0.0
+    score: float = 0.0
+    tokens: Optional[FrozenSet[str]] = None
+    overlap: float = 0.0
+    compared: int = 0
+
+
+def jaccard(a: FrozenSet[str], b: FrozenSet[str]) -> float:
+    if not a or not b:
+        return 1.0 if a == b else 0.0
+    return len(a & b) / len(a | b)
+
+
+def recency_weight(timestamp: str, now: datetime, half_life_days: float) -> float:
+    """1.0 for a turn stored now, 0.5 after one half-life; 0 if the age is unknown"""
+    try:
+        age_days = (now - datetime.fromisoformat(timestamp)).total_seconds() / 86400
+    except (TypeError, ValueError):
+        return 0.0
+    return 0.5 ** (max(age_days, 0.0) / half_life_days) if half_life_days > 0 else 1.0
+
+
+class ContextRanker:
+    """Recency-weighted, deduplicated, diverse top-k selection"""
+
+    def __init__(self, recency_weight: float = 0.3, half_life_days: float = 30.0,
+                 duplicate_threshold: float = 0.8, diversity: float = 0.3):
+        self.recency_weight = recency_weight
+        self.half_life_days = half_life_days
+        self.duplicate_threshold = duplicate_threshold
+        self.diversity = diversity
+
+    def score(self, candidates: Sequence[Tuple[str, Dict[str, Any], float]],
+              now: Optional[datetime] = None) -> List[RankedCandidate]:
+        """Blend normalised relevance with recency for (text, metadata, relevance) triples"""
+        now = now or datetime.now()
+        top = max((relevance for _, _, relevance in candidates), default=0.0) or 1.0
+        ranked = []
+        for text, metadata, relevance in candidates:
+            candidate = RankedCandidate(text=text, metadata=metadata, relevance=relevance / top)
+            candidate.recency = recency_weight(metadata.get("timestamp", ""), now, self.half_life_days)
+            candidate.score = candidate.relevance * (1 - self.recency_weight + self.recency_weight * candidate.recency)
+            ranked.append(candidate)
+        ranked.sort(key=lambda c: c.score, reverse=True)
+        return ranked
+
+    def select(self, candidates: Sequence[Tuple[str, Dict[str, Any], float]], k: int,
+               now: Optional[datetime] = None) -> List[RankedCandidate]:
+        """Pick ``k`` candidates: best blended score, minus overlap with those already picked"""
+        pool = self.score(candidates, now)
+        selected: List[RankedCandidate] = []
+        while pool and len(selected) < k:
+            best_index, best_value = -1, float("-inf")
+            duplicates = []
+            for index, candidate in enumerate(pool):
+                if candidate.score <= best_value:
+                    break  # sorted by score, and the penalty only subtracts
+                if candidate.tokens is None:
+                    candidate.tokens = frozenset(tokenize(candidate.text))
+                # Only compare against picks made since this candidate was last looked at
+                for chosen in selected[candidate.compared:]:
+                    candidate.overlap = max(candidate.overlap, jaccard(candidate.tokens, chosen.tokens))
+                candidate.compared = len(selected)
+                if candidate.overlap >= self.duplicate_threshold:
+                    duplicates.append(index)
+                    continue
+                value = candidate.score - self.diversity * candidate.overlap
+                if value > best_value:
+                    best_index, best_value = index, value
+            if best_index < 0:
+                break
+            selected.append(pool[best_index])
+            dropped = set(duplicates)
+            dropped.add(best_index)
+            pool = [c for i, c in enumerate(pool) if i not in dropped]
+        return selected
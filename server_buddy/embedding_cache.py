@@ -0,0 +1,217 @@
+"""
+Content-addressed cache in front of an embedding provider.
+
+Greetings, retries and re-indexing embed the same text again and again.
+``CachedEmbeddings`` wraps any LangChain ``Embeddings`` and keys each vector
+by a hash of (model id, query/document, text):
+
+- an in-memory LRU of recently used vectors, and
+- optionally an on-disk tier: a flat float32 file read through a memory
+  map plus an append-only index of 16-byte keys, where the n-th key owns
+  the n-th row. Vectors are written before their key, so a killed process
+  can only leave an unindexed row behind, never a key pointing at garbage. Appends
+  take a file lock, and other processes' appends are picked up on a miss,
+  so several workers can share one cache directory.
+
+Hit counts per tier are available from ``stats()``.
+"""
+import hashlib
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process use only
+    fcntl = None
+
+KEY_BYTES = 16
+INDEX_FILE_RE = re.compile(r"index-(\d+)\.bin$")
+
+
+def model_id_for(embeddings: Embeddings) -> str:
+    """Best-effort identifier of the model behind an embeddings object"""
+    for attr in ("model", "model_name", "model_id"):
+        value = getattr(embeddings, attr, None)
+        if isinstance(value, str) and value:
+            return f"{type(embeddings).__name__}:{value}"
+    size = getattr(embeddings, "size", None)
+    return f"{type(embeddings).__name__}:{size}" if size else type(embeddings).__name__
+
+
+class DiskVectorStore:
+    """Append-only float32 rows addressed by 16-byte keys"""
+
+    def __init__(self, directory: str, dim: int):
+        os.makedirs(directory, exist_ok=True)
+        self.dim = dim
+        self.row_bytes = dim * 4
+        self.vectors_path = os.path.join(directory, f"vectors-{dim}.f32")
+        self.index_path = os.path.join(directory, f"index-{dim}.bin")
+        self.lock_path = os.path.join(directory, f"append-{dim}.lock")
+        self.slots: Dict[bytes, int] = {}
+        self._indexed_bytes = 0
+        self._map: Optional[np.memmap] = None
+        for path in (self.vectors_path, self.index_path):
+            open(path, "ab").close()
+        self.refresh()
+
+    def __len__(self) -> int:
+        return len(self.slots)
+
+    def refresh(self):
+        """Pick up keys appended since the last read (possibly by another process)"""
+        size = os.path.getsize(self.index_path)
+        if size - size % KEY_BYTES <= self._indexed_bytes:
+            return
+        # Only rows whose vector made it to disk count
+        rows_on_disk = os.path.getsize(self.vectors_path) // self.row_bytes
+        with open(self.index_path, "rb") as f:
+            f.seek(self._indexed_bytes)
+            data = f.read(size - size % KEY_BYTES - self._indexed_bytes)
+        slot = self._indexed_bytes // KEY_BYTES
+        for start in range(0, len(data), KEY_BYTES):
+            if slot >= rows_on_disk:
+                break
+            self.slots.setdefault(data[start:start + KEY_BYTES], slot)
+            slot += 1
+            self._indexed_bytes += KEY_BYTES
+
+    def get(self, key: bytes) -> Optional[List[float]]:
+        slot = self.slots.get(key)
+        if slot is None:
+            return None
+        if self._map is None or slot >= self._map.shape[0]:
+            self._map = np.memmap(self.vectors_path, dtype=np.float32, mode="r",
+                                  shape=(self._indexed_bytes // KEY_BYTES, self.dim))
+        return self._map[slot].tolist()
+
+    def append(self, items: Dict[bytes, List[float]]):
+        with open(self.lock_path, "ab") as lock:
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                self.refresh()
+                keys = [key for key in items if key not in self.slots]
+                if not keys:
+                    return
+                first = self._indexed_bytes // KEY_BYTES
+                rows = np.asarray([items[key] for key in keys], dtype=np.float32)
+                with open(self.vectors_path, "r+b") as f:
+                    f.seek(first * self.row_bytes)
+                    f.write(rows.tobytes())
+                with open(self.index_path, "r+b") as f:
+                    f.seek(first * KEY_BYTES)
+                    f.write(b"".join(keys))
+                for offset, key in enumerate(keys):
+                    self.slots[key] = first + offset
+                self._indexed_bytes += len(keys) * KEY_BYTES
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock, fcntl.LOCK_UN)
+
+
+class CachedEmbeddings(Embeddings):
+    """LRU + optional memory-mapped disk cache around another ``Embeddings``"""
+
+    def __init__(self, inner: Embeddings, model_id: Optional[str] = None,
+                 memory_items: int = 10000, directory: Optional[str] = None):
+        self.inner = inner
+        self.model_id = model_id or model_id_for(inner)
+        self.memory_items = memory_items
+        self.directory = directory
+        self._memory: "OrderedDict[bytes, List[float]]" = OrderedDict()
+        self._disk: Optional[DiskVectorStore] = None
+        self._lock = threading.Lock()
+        self._counts = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        # Reopen an existing disk tier; a new one is created on the first miss
+        # once the vector size is known
+        if directory is not None and os.path.isdir(directory):
+            existing = [(os.path.getmtime(os.path.join(directory, name)), int(match.group(1)))
+                        for name in os.listdir(directory) if (match := INDEX_FILE_RE.match(name))]
+            if existing:
+                self._disk = DiskVectorStore(directory, max(existing)[1])
+
+    def key(self, kind: str, text: str) -> bytes:
+        return hashlib.sha256(f"{self.model_id}\0{kind}\0{text}".encode("utf-8")).digest()[:KEY_BYTES]
+
+    def _lookup(self, key: bytes) -> Optional[List[float]]:
+        vector = self._memory.get(key)
+        if vector is not None:
+            self._memory.move_to_end(key)
+            self._counts["memory_hits"] += 1
+            return vector
+        if self._disk is not None:
+            vector = self._disk.get(key)
+            if vector is None:
+                self._disk.refresh()
+                vector = self._disk.get(key)
+            if vector is not None:
+                self._counts["disk_hits"] += 1
+                self._remember(key, vector)
+                return vector
+        return None
+
+    def _remember(self, key: bytes, vector: List[float]):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    def _embed(self, kind: str, texts: List[str]) -> List[List[float]]:
+        keys = [self.key(kind, text) for text in texts]
+        vectors: List[Optional[List[float]]] = []
+        missing: Dict[bytes, str] = {}
+        with self._lock:
+            for key, text in zip(keys, texts):
+                vector = self._lookup(key)
+                if vector is None and key not in missing:
+                    self._counts["misses"] += 1
+                    missing[key] = text
+                vectors.append(vector)
+
+        if missing:
+            # Provider call outside the lock; duplicates in the batch are embedded once
+            texts_to_embed = list(missing.values())
+            if kind == "query":
+                computed = [self.inner.embed_query(text) for text in texts_to_embed]
+            else:
+                computed = self.inner.embed_documents(texts_to_embed)
+            # Rounded to float32 here so both tiers return identical vectors
+            fresh = dict(zip(missing, np.asarray(computed, dtype=np.float32).tolist()))
+            with self._lock:
+                for key, vector in fresh.items():
+                    self._remember(key, vector)
+                if self.directory is not None:
+                    dim = len(next(iter(fresh.values())))
+                    if self._disk is None or self._disk.dim != dim:
+                        self._disk = DiskVectorStore(self.directory, dim)
+                    self._disk.append(fresh)
+            vectors = [vector if vector is not None else fresh[key] for key, vector in zip(keys, vectors)]
+        return vectors
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed("document", texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed("query", [text])[0]
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = sum(self._counts.values())
+            hits = self._counts["memory_hits"] + self._counts["disk_hits"]
+            return {
+                **self._counts,
+                "hit_rate": round(hits / lookups, 4) if lookups else 0.0,
+                "memory_entries": len(self._memory),
+                "disk_entries": len(self._disk) if self._disk is not None else 0,
+            }
+
+    def clear_memory(self):
+        with self._lock:
+            self._memory.clear()
@@ -0,0 +1,96 @@
+"""
+Offline stand-in for Gemini, for load tests and local development.
+
+Select with ``BUDDY_LLM_BACKEND=fake``; no API key or network is needed.
+Replies are deterministic (derived from the prompt), while latency and
+failures are drawn per call from a configurable distribution:
+
+    BUDDY_FAKE_LLM_LATENCY_MS     median response latency (default 300)
+    BUDDY_FAKE_LLM_LATENCY_SIGMA  lognormal spread of the latency (default 0.5, 0 = fixed)
+    BUDDY_FAKE_LLM_TTFT_RATIO     share of the latency spent before the first token (default 0.3)
+    BUDDY_FAKE_LLM_ERROR_RATE     fraction of calls that fail with a 500 (default 0)
+    BUDDY_FAKE_LLM_SEED           seed for latencies and failures (default 0)
+
+The same prompt always gets the same reply. Latency and failure come from
+the seed and a call counter, so a retried or failed-over call gets a fresh
+draw (an injected failure is transient, like a real 500), and a run with the
+same seed and call order is reproducible.
+"""
+import asyncio
+import hashlib
+import os
+import random
+from typing import AsyncIterator, List
+
+from langchain_core.messages import AIMessage, AIMessageChunk, BaseMessage
+
+REPLIES = [
+    "That sounds really interesting! Tell me more about it.",
+    "Oh nice, I love hearing about that. How did it make you feel?",
+    "Haha, that's great! What happened next?",
+    "I totally get that. Anything I can do to help?",
+    "Wow, sounds like quite a day! What was the best part?",
+    "That makes sense. Have you thought about what you'll do next?",
+]
+
+
+class FakeLLMError(Exception):
+    """Injected failure; worded like a Gemini 500 so it is treated as transient"""
+
+
+class FakeLLM:
+    """Deterministic chat model exposing the ``ainvoke``/``astream`` calls Buddy uses"""
+
+    def __init__(self, latency_ms: float = 300.0, latency_sigma: float = 0.5, ttft_ratio: float = 0.3,
+                 error_rate: float = 0.0, seed: int = 0):
+        self.latency_ms = latency_ms
+        self.latency_sigma = latency_sigma
+        self.ttft_ratio = ttft_ratio
+        self.error_rate = error_rate
+        self.seed = seed
+        self.calls = 0
+
+    @classmethod
+    def from_env(cls) -> "FakeLLM":
+        return cls(
+            latency_ms=float(os.getenv("BUDDY_FAKE_LLM_LATENCY_MS", "300")),
+            latency_sigma=float(os.getenv("BUDDY_FAKE_LLM_LATENCY_SIGMA", "0.5")),
+            ttft_ratio=float(os.getenv("BUDDY_FAKE_LLM_TTFT_RATIO", "0.3")),
+            error_rate=float(os.getenv("BUDDY_FAKE_LLM_ERROR_RATE", "0")),
+            seed=int(os.getenv("BUDDY_FAKE_LLM_SEED", "0")),
+        )
+
+    def _plan(self, messages: List[BaseMessage]):
+        """(reply, latency seconds, fails) for this call"""
+        self.calls += 1
+        prompt = "\n".join(str(message.content) for message in messages)
+        digest = hashlib.sha256(f"{self.seed}:{prompt}".encode("utf-8")).digest()
+        rng = random.Random(f"{self.seed}:{self.calls}")
+        latency = self.latency_ms * rng.lognormvariate(0, self.latency_sigma) if self.latency_sigma > 0 else self.latency_ms
+        fails = rng.random() < self.error_rate
+        # The user's message is the last "Current user message:" line of Buddy's prompt
+        marker = "Current user message:"
+        topic = prompt.rsplit(marker, 1)[1].strip().split("\n", 1)[0][:60] if marker in prompt else ""
+        reply = REPLIES[digest[0] % len(REPLIES)]
+        if topic:
+            reply = f"You said \"{topic}\". {reply}"
+        return reply, latency / 1000, fails
+
+    async def ainvoke(self, messages: List[BaseMessage], **kwargs) -> AIMessage:
+        reply, latency, fails = self._plan(messages)
+        await asyncio.sleep(latency)
+        if fails:
+            raise FakeLLMError("500 Internal error (injected by fake LLM)")
+        return AIMessage(content=reply)
+
+    async def astream(self, messages: List[BaseMessage], **kwargs) -> AsyncIterator[AIMessageChunk]:
+        reply, latency, fails = self._plan(messages)
+        await asyncio.sleep(latency * self.ttft_ratio)
+        if fails:
+            raise FakeLLMError("500 Internal error (injected by fake LLM)")
+        words = reply.split(" ")
+        delay = latency * (1 - self.ttft_ratio) / max(len(words) - 1, 1)
+        for i, word in enumerate(words):
+            if i:
+                await asyncio.sleep(delay)
+            yield AIMessageChunk(content=word if i == 0 else f" {word}")
@@ -0,0 +1,108 @@
+"""
+Single-flight deduplication and short-TTL replay cache for Buddy chat turns.
+
+Voice clients on flaky networks retry requests. Requests sharing an
+idempotency key collapse onto one in-flight call, and a recently completed
+answer is replayed instead of generating (and storing) the turn again.
+"""
+import asyncio
+import hashlib
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+
+def normalize_text(text: str) -> str:
+    """Normalize an utterance so trivial transcription differences map to one key"""
+    text = re.sub(r"\s+", " ", text.strip().lower())
+    return text.rstrip(".!?,; ")
+
+
+class IdempotencyCache:
+    """Collapse concurrent identical requests and replay recent results"""
+
+    def __init__(self, ttl_seconds: float = 120.0, window_seconds: float = 10.0, max_entries: int = 5000):
+        self.ttl_seconds = ttl_seconds
+        self.window_seconds = window_seconds
+        self.max_entries = max_entries
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self._completed: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def make_key(self, user_id: str, text: str, idempotency_key: Optional[str] = None) -> Optional[str]:
+        """Return the cache key for a request.
+
+        An explicit client key always wins. Otherwise one is derived from the
+        user, the normalized text and the current time window; a window of 0
+        disables derivation.
+        """
+        if idempotency_key:
+            return f"{user_id}:key:{idempotency_key}"
+        if self.window_seconds <= 0:
+            return None
+        bucket = int(time.time() // self.window_seconds)
+        digest = hashlib.sha256(f"{user_id}\x00{normalize_text(text)}\x00{bucket}".encode("utf-8")).hexdigest()
+        return f"{user_id}:auto:{digest[:32]}"
+
+    def _get_completed(self, key: str) -> Tuple[bool, Any]:
+        entry = self._completed.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self._completed[key]
+            return False, None
+        return True, value
+
+    def _store_completed(self, key: str, value: Any):
+        self._completed[key] = (time.monotonic() + self.ttl_seconds, value)
+        self._completed.move_to_end(key)
+        while len(self._completed) > self.max_entries:
+            self._completed.popitem(last=False)
+
+    async def run(self, key: Optional[str], factory: Callable[[], Awaitable[Tuple[Any, bool]]]) -> Tuple[Any, str]:
+        """Run ``factory`` at most once per key.
+
+        ``factory`` returns ``(value, cacheable)``; only cacheable values are
+        kept for replay. Returns ``(value, status)`` where status is one of
+        ``"fresh"``, ``"joined"`` (shared an in-flight call) or ``"replayed"``.
+        """
+        if key is None:
+            value, _ = await factory()
+            return value, "fresh"
+
+        found, value = self._get_completed(key)
+        if found:
+            return value, "replayed"
+
+        task = self._inflight.get(key)
+        if task is not None:
+            value, _ = await asyncio.shield(task)
+            return value, "joined"
+
+        # Run in a separate task so a disconnecting client doesn't cancel the
+        # call for everyone waiting on it
+        task = asyncio.ensure_future(factory())
+        self._inflight[key] = task
+
+        def on_done(finished: asyncio.Task):
+            self._inflight.pop(key, None)
+            if finished.cancelled() or finished.exception() is not None:
+                return
+            result, cacheable = finished.result()
+            if cacheable:
+                self._store_completed(key, result)
+
+        task.add_done_callback(on_done)
+        value, _ = await asyncio.shield(task)
+        return value, "fresh"
+
+    def forget_user(self, user_id: str):
+        """Drop cached results for a user (e.g. after their history is cleared)"""
+        prefix = f"{user_id}:"
+        for key in [k for k in self._completed if k.startswith(prefix)]:
+            del self._completed[key]
+
+    def clear(self):
+        """Drop every cached result"""
+        self._completed.clear()
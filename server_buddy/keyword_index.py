@@ -0,0 +1,167 @@
+"""
+Per-user BM25 keyword index over stored conversations.
+
+Vector search with Buddy's embeddings does not reliably bring back a turn
+just because it shares an exact word with the query (a pet's name, a
+place). This index scores stored turns with BM25 over their words, per
+user, so statistics (document frequency, average length) only come from
+that user's own conversations.
+
+Postings are updated incrementally as turns are stored or deleted. Each
+user's index is built lazily from the vector store on first use and the
+least recently used users are evicted beyond ``max_users``, so memory is
+bounded by active users rather than the whole collection. With several
+workers, ``max_age_seconds`` makes a worker rebuild a user's index
+periodically to pick up turns stored by the others.
+"""
+import math
+import re
+import time
+from collections import Counter, OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+TOKEN_RE = re.compile(r"[a-z0-9]+(?:'[a-z]+)?")
+
+STOPWORDS = frozenset("""
+a about an and are as at be but by can did do does for from had has have he her him his how i i'm if in
+is it it's its just me my of on or our she so that the their them then there they this to too up us
+was we were what when where which who why will with would you your buddy user
+""".split())
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase words without stopwords, with a light plural strip"""
+    tokens = []
+    for token in TOKEN_RE.findall(text.lower()):
+        if token in STOPWORDS:
+            continue
+        if len(token) > 3 and token.endswith("s") and not token.endswith("ss"):
+            token = token[:-1]
+        tokens.append(token)
+    return tokens
+
+
+class UserKeywordIndex:
+    """Inverted index for one user's turns"""
+
+    def __init__(self):
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.lengths: Dict[str, int] = {}
+        self.documents: Dict[str, Tuple[str, Dict[str, Any]]] = {}
+        self.total_length = 0
+
+    def add(self, doc_id: str, text: str, metadata: Optional[Dict[str, Any]] = None):
+        if doc_id in self.documents:
+            self.remove(doc_id)
+        tokens = tokenize(text)
+        for term, tf in Counter(tokens).items():
+            self.postings.setdefault(term, {})[doc_id] = tf
+        self.lengths[doc_id] = len(tokens)
+        self.total_length += len(tokens)
+        self.documents[doc_id] = (text, metadata or {})
+
+    def remove(self, doc_id: str):
+        entry = self.documents.pop(doc_id, None)
+        if entry is None:
+            return
+        for term in set(tokenize(entry[0])):
+            docs = self.postings.get(term)
+            if docs is not None:
+                docs.pop(doc_id, None)
+                if not docs:
+                    del self.postings[term]
+        self.total_length -= self.lengths.pop(doc_id, 0)
+
+    def search(self, query: str, k: int, k1: float = 1.5, b: float = 0.75) -> List[Tuple[str, float]]:
+        """Top ``k`` (doc_id, score) pairs for the query"""
+        n = len(self.documents)
+        if not n:
+            return []
+        avg_length = self.total_length / n or 1.0
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            idf = math.log(1 + (n - len(docs) + 0.5) / (len(docs) + 0.5))
+            for doc_id, tf in docs.items():
+                norm = tf + k1 * (1 - b + b * self.lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (k1 + 1) / norm
+        return sorted(scores.items(), key=lambda item: item[1], reverse=True)[:k]
+
+
+class KeywordIndex:
+    """BM25 indexes for many users with LRU eviction"""
+
+    def __init__(self, max_users: int = 1000, max_age_seconds: float = 0, k1: float = 1.5, b: float = 0.75):
+        self.max_users = max_users
+        self.max_age_seconds = max_age_seconds
+        self.k1 = k1
+        self.b = b
+        self.users: "OrderedDict[str, UserKeywordIndex]" = OrderedDict()
+        self._loaded_at: Dict[str, float] = {}
+
+    def has_user(self, user_id: str) -> bool:
+        """True if the user's index is loaded (and not older than ``max_age_seconds``)"""
+        if user_id not in self.users:
+            return False
+        return not self.max_age_seconds or time.monotonic() - self._loaded_at[user_id] < self.max_age_seconds
+
+    def load_user(self, user_id: str, documents: Iterable[Tuple[str, str, Dict[str, Any]]]):
+        """(Re)build one user's index from (doc_id, text, metadata) triples"""
+        index = UserKeywordIndex()
+        for doc_id, text, metadata in documents:
+            index.add(doc_id, text, metadata)
+        self.users[user_id] = index
+        self.users.move_to_end(user_id)
+        self._loaded_at[user_id] = time.monotonic()
+        while len(self.users) > self.max_users:
+            evicted, _ = self.users.popitem(last=False)
+            self._loaded_at.pop(evicted, None)
+
+    def add(self, user_id: str, doc_id: str, text: str, metadata: Optional[Dict[str, Any]] = None):
+        # Users that aren't loaded get the document when their index is built
+        index = self.users.get(user_id)
+        if index is not None:
+            index.add(doc_id, text, metadata)
+
+    def remove(self, user_id: str, doc_ids: Iterable[str]):
+        index = self.users.get(user_id)
+        if index is not None:
+            for doc_id in doc_ids:
+                index.remove(doc_id)
+
+    def remove_user(self, user_id: str):
+        self.users.pop(user_id, None)
+        self._loaded_at.pop(user_id, None)
+
+    def clear(self):
+        self.users.clear()
+        self._loaded_at.clear()
+
+    def search(self, user_id: str, query: str, k: int) -> List[Tuple[str, float, str, Dict[str, Any]]]:
+        """Top ``k`` (doc_id, score, text, metadata) for one user"""
+        index = self.users.get(user_id)
+        if index is None:
+            return []
+        self.users.move_to_end(user_id)
+        return [
+            (doc_id, score, *index.documents[doc_id])
+            for doc_id, score in index.search(query, k, self.k1, self.b)
+        ]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "users": len(self.users),
+            "documents": sum(len(index.documents) for index in self.users.values()),
+            "terms": sum(len(index.postings) for index in self.users.values()),
+        }
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], k: int = 60) -> List[Tuple[str, float]]:
+    """Fuse ranked key lists: score(key) = sum over lists of 1 / (k + rank)"""
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, key in enumerate(ranking, 1):
+            scores[key] = scores.get(key, 0.0) + 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+Load generator for Buddy's /chat endpoint.
+
+Simulates many concurrent users, each sending a sequence of chat messages,
+and reports throughput, client-side p50/p95/p99 latency and the server's
+retrieval / LLM / store breakdown (from the ``Server-Timing`` header).
+
+By default the app runs in-process with the offline fake LLM and a
+throwaway ChromaDB directory, so a run needs no network or API quota and is
+reproducible on a laptop:
+
+    python loadgen.py --users 50 --turns 10
+    BUDDY_FAKE_LLM_LATENCY_MS=800 BUDDY_FAKE_LLM_ERROR_RATE=0.05 python loadgen.py --users 200
+
+Point it at a running server instead with ``--url http://localhost:8001``.
+"""
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from typing import Dict, List
+
+import httpx
+
+from metrics import LatencyWindow
+
+MESSAGES = [
+    "Hey Buddy, how's it going?",
+    "I went hiking this weekend and saw a deer.",
+    "Work has been pretty stressful lately.",
+    "Do you remember what I told you about my dog?",
+    "I'm thinking about learning to play the guitar.",
+    "What should I cook for dinner tonight?",
+    "My sister is visiting next week!",
+    "I finally finished that book I was reading.",
+]
+
+
+def parse_server_timing(header: str) -> Dict[str, float]:
+    timings = {}
+    for part in header.split(","):
+        name, _, duration = part.strip().partition(";dur=")
+        if name and duration:
+            timings[name] = float(duration)
+    return timings
+
+
+def summarize(samples: List[float]) -> Dict[str, float]:
+    window = LatencyWindow(size=max(len(samples), 1))
+    for sample in samples:
+        window.add(sample)
+    return window.snapshot()
+
+
+async def simulate_user(client: httpx.AsyncClient, user_index: int, args, results: Dict):
+    rng = random.Random(f"{args.seed}:{user_index}")
+    user_id = f"load-{args.seed}-{user_index}"
+    # Spread user start times so the first turns don't arrive as one burst
+    await asyncio.sleep(rng.uniform(0, args.ramp_up))
+    for turn in range(args.turns):
+        text = f"{rng.choice(MESSAGES)} ({turn})"
+        start = time.perf_counter()
+        try:
+            response = await client.post("/chat", json={"text": text, "user_id": user_id})
+            status = response.status_code
+        except httpx.HTTPError as e:
+            results["status"][type(e).__name__] += 1
+            continue
+        results["latency"].append((time.perf_counter() - start) * 1000)
+        results["status"][status] += 1
+        for phase, ms in parse_server_timing(response.headers.get("server-timing", "")).items():
+            results["phases"][phase].append(ms)
+        if args.think_ms:
+            await asyncio.sleep(rng.expovariate(1000 / args.think_ms))
+
+
+async def run(args) -> Dict:
+    if args.url:
+        transport = None
+        base_url = args.url
+    else:
+        import main
+        transport = httpx.ASGITransport(app=main.app)
+        base_url = "http://buddy"
+
+    results = {"latency": [], "status": Counter(), "phases": defaultdict(list)}
+    limits = httpx.Limits(max_connections=args.users, max_keepalive_connections=args.users)
+    async with httpx.AsyncClient(transport=transport, base_url=base_url, timeout=args.timeout, limits=limits) as client:
+        if not args.url:
+            await main.get_buddy()
+        start = time.perf_counter()
+        await asyncio.gather(*(simulate_user(client, i, args, results) for i in range(args.users)))
+        elapsed = time.perf_counter() - start
+        server_metrics = (await client.get("/metrics")).json()
+
+    return {
+        "target": args.url or "in-process",
+        "llm_backend": os.getenv("BUDDY_LLM_BACKEND", "gemini") if not args.url else "remote",
+        "users": args.users,
+        "turns_per_user": args.turns,
+        "requests": sum(results["status"].values()),
+        "elapsed_s": round(elapsed, 2),
+        "throughput_rps": round(len(results["latency"]) / elapsed, 2) if elapsed else 0.0,
+        "status": {str(k): v for k, v in results["status"].items()},
+        "latency": summarize(results["latency"]),
+        "breakdown": {phase: summarize(samples) for phase, samples in results["phases"].items()},
+        "server_counters": server_metrics.get("counters", {}),
+    }
+
+
+def print_report(report: Dict):
+    print(f"\n{report['requests']} requests from {report['users']} users against {report['target']} "
+          f"({report['llm_backend']} LLM) in {report['elapsed_s']}s")
+    print(f"throughput: {report['throughput_rps']} req/s   status: {report['status']}")
+    print(f"\n{'':12}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    rows = [("client", report["latency"])] + sorted(report["breakdown"].items())
+    for name, stats in rows:
+        print(f"{name:12}{stats['count']:>8}{stats['p50_ms']:>10.1f}{stats['p95_ms']:>10.1f}"
+              f"{stats['p99_ms']:>10.1f}{stats['max_ms']:>10.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--url", help="base URL of a running server (default: run the app in-process)")
+    parser.add_argument("--users", type=int, default=20, help="concurrent simulated users")
+    parser.add_argument("--turns", type=int, default=5, help="messages per user")
+    parser.add_argument("--think-ms", type=float, default=0, help="mean pause between a user's messages")
+    parser.add_argument("--ramp-up", type=float, default=1.0, help="seconds over which users start")
+    parser.add_argument("--timeout", type=float, default=60.0)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    parser.add_argument("--verbose", action="store_true", help="keep the in-process server's logs")
+    args = parser.parse_args()
+
+    if not args.url:
+        # Offline by default: fake LLM and a fresh vector store per run
+        os.environ.setdefault("BUDDY_LLM_BACKEND", "fake")
+        os.environ.setdefault("CHROMA_DB_PATH", tempfile.mkdtemp(prefix="buddy-load-"))
+
+    quiet = not args.url and not args.verbose
+    if quiet:
+        os.environ.setdefault("LOG_LEVEL", "WARNING")
+        logging.getLogger("chromadb").setLevel(logging.ERROR)
+    with contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext():
+        report = asyncio.run(run(args))
+
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
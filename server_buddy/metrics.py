@@ -0,0 +1,110 @@
+"""
+Lightweight in-process metrics for Buddy Server.
+
+Keeps a rolling window of latency samples per metric name plus simple
+counters, so endpoints can report p50/p95/p99 without any external
+monitoring stack.
+"""
+import threading
+from collections import deque
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+
+class LatencyWindow:
+    """Rolling window of samples (milliseconds unless another unit is given)"""
+
+    def __init__(self, size: int = 1000, unit: str = "ms"):
+        self.unit = unit
+        self.samples = deque(maxlen=size)
+        self.count = 0
+        self.total = 0.0
+
+    def add(self, value: float):
+        self.samples.append(value)
+        self.count += 1
+        self.total += value
+
+    def snapshot(self) -> Dict[str, float]:
+        ordered = sorted(self.samples)
+
+        def pct(p: float) -> float:
+            if not ordered:
+                return 0.0
+            index = min(len(ordered) - 1, int(round(p * (len(ordered) - 1))))
+            return round(ordered[index], 2)
+
+        suffix = f"_{self.unit}" if self.unit else ""
+        return {
+            "count": self.count,
+            f"avg{suffix}": round(self.total / self.count, 2) if self.count else 0.0,
+            f"p50{suffix}": pct(0.50),
+            f"p95{suffix}": pct(0.95),
+            f"p99{suffix}": pct(0.99),
+            f"max{suffix}": round(ordered[-1], 2) if ordered else 0.0,
+        }
+
+
+class Metrics:
+    """Registry of latency windows, counters and gauges"""
+
+    def __init__(self, window_size: int = 1000):
+        self.window_size = window_size
+        self._lock = threading.Lock()
+        self._latencies: Dict[str, LatencyWindow] = {}
+        self._values: Dict[str, LatencyWindow] = {}
+        self._counters: Dict[str, int] = {}
+        self._gauges: Dict[str, float] = {}
+
+    def observe(self, name: str, value_ms: float):
+        with self._lock:
+            window = self._latencies.get(name)
+            if window is None:
+                window = self._latencies[name] = LatencyWindow(self.window_size)
+            window.add(value_ms)
+
+    def observe_value(self, name: str, value: float):
+        """Record a non-latency distribution sample (e.g. prompt tokens)"""
+        with self._lock:
+            window = self._values.get(name)
+            if window is None:
+                window = self._values[name] = LatencyWindow(self.window_size, unit="")
+            window.add(value)
+
+    def incr(self, name: str, amount: int = 1):
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def set_gauge(self, name: str, value: float):
+        with self._lock:
+            self._gauges[name] = value
+
+    def snapshot(self) -> Dict[str, Dict]:
+        with self._lock:
+            return {
+                "latency": {name: w.snapshot() for name, w in self._latencies.items()},
+                "values": {name: w.snapshot() for name, w in self._values.items()},
+                "counters": dict(self._counters),
+                "gauges": dict(self._gauges),
+            }
+
+
+# Shared registry used across the server
+metrics = Metrics()
+
+# Phase durations of the request being handled (the /chat handler sets a dict
+# here and reports it in a Server-Timing header)
+request_timings: ContextVar[Optional[Dict[str, float]]] = ContextVar("request_timings", default=None)
+
+
+def observe_phase(phase: str, value_ms: float, metric: Optional[str] = None):
+    """Record a request phase (retrieval, llm, store, ...) globally and for the current request"""
+    metrics.observe(metric or f"{phase}_latency", value_ms)
+    timings = request_timings.get()
+    if timings is not None:
+        timings[phase] = timings.get(phase, 0.0) + value_ms
+
+
+def server_timing(timings: Dict[str, float]) -> str:
+    """Render phase durations as a Server-Timing header value"""
+    return ", ".join(f"{phase};dur={ms:.1f}" for phase, ms in timings.items())
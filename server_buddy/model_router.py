@@ -0,0 +1,250 @@
+"""
+Health-tracked router across several chat models.
+
+Keeps rolling latency and error stats per model, opens a circuit breaker on
+a model that keeps failing, fails over to the next healthy model in the
+middle of a request and prefers the fastest healthy one. When every breaker
+is open (or its single half-open probe is taken) calls fail fast with
+``Overloaded``, which the API answers with 503 and ``Retry-After``, instead
+of reaching a provider that is known to be down. Any object with
+LangChain's ``ainvoke``/``astream`` interface can be routed, so the logic
+can be exercised with a local fake LLM::
+
+    from langchain_core.language_models.fake_chat_models import FakeListChatModel
+    router = ModelRouter({"fake": FakeListChatModel(responses=["hi"])})
+    await router.ainvoke([HumanMessage(content="hello")])
+"""
+import math
+import time
+from collections import deque
+from typing import Any, AsyncIterator, Callable, Dict, Iterator, List, Optional
+
+from admission import Overloaded
+from metrics import metrics
+from structured_logging import get_logger
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+log = get_logger("buddy.model_router")
+
+
+def is_request_error(error: Exception) -> bool:
+    """Errors that would fail on every model (bad credentials), so failover is pointless"""
+    error_str = str(error).lower()
+    return "api key" in error_str or "permission" in error_str or "access" in error_str
+
+
+class CircuitBreaker:
+    """Classic closed -> open -> half-open breaker; half-open lets one probe through at a time"""
+
+    def __init__(self, failure_threshold: int = 3, cooldown_seconds: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.clock = clock
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.probe_started_at: Optional[float] = None
+
+    def _probing(self) -> bool:
+        # A probe that never reported back (cancelled) stops blocking after a cooldown
+        return self.probe_started_at is not None and self.clock() - self.probe_started_at < self.cooldown_seconds
+
+    def available(self) -> bool:
+        """Whether a call could go through now, without taking the half-open probe"""
+        if self.state == OPEN and self.clock() - self.opened_at >= self.cooldown_seconds:
+            self.state = HALF_OPEN
+            self.probe_started_at = None
+        if self.state == HALF_OPEN:
+            return not self._probing()
+        return self.state == CLOSED
+
+    def allow(self) -> bool:
+        """Take a call slot: always when closed, the single trial request when half-open"""
+        if not self.available():
+            return False
+        if self.state == HALF_OPEN:
+            self.probe_started_at = self.clock()
+        return True
+
+    def record_success(self):
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.probe_started_at = None
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self.trip()
+
+    def trip(self):
+        self.state = OPEN
+        self.opened_at = self.clock()
+        self.probe_started_at = None
+
+    def reopens_in(self) -> float:
+        if self.state != OPEN:
+            return 0.0
+        return max(0.0, self.cooldown_seconds - (self.clock() - self.opened_at))
+
+
+class ModelHealth:
+    """Rolling latency/error stats and breaker for one model
+
+    Full-response latency (``ainvoke``) and time to first chunk (``astream``)
+    are tracked separately, so each path ranks models on its own measure.
+    """
+
+    def __init__(self, name: str, llm: Any, breaker: CircuitBreaker, window: int = 20):
+        self.name = name
+        self.llm = llm
+        self.breaker = breaker
+        self.outcomes = deque(maxlen=window)  # True for success
+        self.latency_ms: Optional[float] = None  # EWMA of full responses
+        self.ttft_ms: Optional[float] = None     # EWMA of time to first streamed chunk
+        self.calls = 0
+        self.failures = 0
+        self.last_error: Optional[str] = None
+
+    @property
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return 1 - sum(self.outcomes) / len(self.outcomes)
+
+    def record_success(self, elapsed_ms: float, first_chunk: bool = False):
+        self.calls += 1
+        self.outcomes.append(True)
+        if first_chunk:
+            self.ttft_ms = elapsed_ms if self.ttft_ms is None else 0.7 * self.ttft_ms + 0.3 * elapsed_ms
+            metrics.observe(f"model_ttft:{self.name}", elapsed_ms)
+        else:
+            self.latency_ms = elapsed_ms if self.latency_ms is None else 0.7 * self.latency_ms + 0.3 * elapsed_ms
+            metrics.observe(f"model_latency:{self.name}", elapsed_ms)
+        self.breaker.record_success()
+
+    def record_failure(self, error: Exception):
+        self.calls += 1
+        self.failures += 1
+        self.outcomes.append(False)
+        self.last_error = str(error)[:200]
+        self.breaker.record_failure()
+        # A model that fails most of its recent calls is unhealthy even if
+        # the odd success keeps resetting the consecutive-failure count
+        if len(self.outcomes) >= self.outcomes.maxlen // 2 and self.error_rate > 0.5:
+            self.breaker.trip()
+        metrics.incr(f"model_errors:{self.name}")
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "state": self.breaker.state,
+            "latency_ms": round(self.latency_ms, 2) if self.latency_ms is not None else None,
+            "ttft_ms": round(self.ttft_ms, 2) if self.ttft_ms is not None else None,
+            "error_rate": round(self.error_rate, 3),
+            "calls": self.calls,
+            "failures": self.failures,
+            "reopens_in_s": round(self.breaker.reopens_in(), 1),
+            "last_error": self.last_error,
+        }
+
+
+class ModelRouter:
+    """Route chat calls to the fastest healthy model, failing over on errors"""
+
+    def __init__(self, models: Dict[str, Any], failure_threshold: int = 3, cooldown_seconds: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        if not models:
+            raise ValueError("ModelRouter needs at least one model")
+        self.health: Dict[str, ModelHealth] = {
+            name: ModelHealth(name, llm, CircuitBreaker(failure_threshold, cooldown_seconds, clock))
+            for name, llm in models.items()
+        }
+        self.preference = list(models)  # Configuration order breaks ties
+        self.current_model = self.preference[0]
+
+    def candidates(self, streaming: bool = False) -> List[ModelHealth]:
+        """Models whose breakers would let a call through, fastest first (closed before half-open)
+
+        Streaming ranks on time to first chunk, ``ainvoke`` on full latency.
+        """
+        available = [h for h in self.health.values() if h.breaker.available()]
+
+        def sort_key(h: ModelHealth):
+            # Models not yet measured on this path get one probe each (in
+            # configured order); after that, lower error-weighted latency wins
+            latency, other_path = (h.ttft_ms, h.latency_ms) if streaming else (h.latency_ms, h.ttft_ms)
+            if latency is None and (h.calls == 0 or other_path is not None):
+                return (h.breaker.state != CLOSED, 0, self.preference.index(h.name))
+            latency = latency if latency is not None else float("inf")
+            return (h.breaker.state != CLOSED, 1, latency * (1 + 4 * h.error_rate))
+        return sorted(available, key=sort_key)
+
+    def _attempts(self, streaming: bool) -> Iterator[ModelHealth]:
+        """Candidates in order, each taking its breaker's slot just before it is tried"""
+        tried = False
+        for health in self.candidates(streaming):
+            # Skipped if another request took the half-open probe since ranking
+            if health.breaker.allow():
+                tried = True
+                yield health
+        if not tried:
+            # Every breaker is open or busy probing: fail fast until one may recover
+            retry_after = max(1, math.ceil(min(h.breaker.reopens_in() for h in self.health.values())))
+            metrics.incr("llm_rejected_models_unavailable")
+            log.warning("models_unavailable", retry_after=retry_after)
+            raise Overloaded(retry_after, reason="models_unavailable")
+
+    async def ainvoke(self, messages: List[Any], **kwargs) -> Any:
+        last_error: Optional[Exception] = None
+        for health in self._attempts(streaming=False):
+            start = time.perf_counter()
+            try:
+                result = await health.llm.ainvoke(messages, **kwargs)
+            except Exception as e:
+                if is_request_error(e):
+                    raise
+                health.record_failure(e)
+                last_error = e
+                log.warning("model_failover", model=health.name, error=str(e)[:80])
+                continue
+            health.record_success((time.perf_counter() - start) * 1000)
+            self.current_model = health.name
+            return result
+        raise last_error
+
+    async def astream(self, messages: List[Any], **kwargs) -> AsyncIterator[Any]:
+        """Stream from the best model; failover is only possible before the first chunk"""
+        last_error: Optional[Exception] = None
+        for health in self._attempts(streaming=True):
+            start = time.perf_counter()
+            started = False
+            try:
+                async for chunk in health.llm.astream(messages, **kwargs):
+                    if not started:
+                        started = True
+                        # Time to first chunk is what matters for voice
+                        health.record_success((time.perf_counter() - start) * 1000, first_chunk=True)
+                        self.current_model = health.name
+                    yield chunk
+                if not started:
+                    health.record_success((time.perf_counter() - start) * 1000, first_chunk=True)
+                    self.current_model = health.name
+                return
+            except Exception as e:
+                if started or is_request_error(e):
+                    if started:
+                        health.record_failure(e)
+                    raise
+                health.record_failure(e)
+                last_error = e
+                log.warning("model_failover", model=health.name, error=str(e)[:80])
+        raise last_error
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "current_model": self.current_model,
+            "models": {name: h.snapshot() for name, h in self.health.items()},
+        }
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Startup profile report for Buddy Server.
+
+Measures, in fresh subprocesses:
+  - import time of ``main`` and of ``buddy_rag`` (via ``python -X importtime``)
+  - the slowest modules pulled in by each import
+  - wall time until the port answers /health and until /ready returns 200
+
+Usage:
+    python profile_startup.py [--port 8765] [--top 10]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+import urllib.error
+import urllib.request
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def import_profile(module: str, top: int):
+    """Return (total_ms, [(ms, module), ...]) for importing ``module`` in a clean interpreter"""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=HERE, capture_output=True, text=True, env={**os.environ, "GOOGLE_API_KEY": os.getenv("GOOGLE_API_KEY", "profile")}
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        # Format: "import time: <self us> | <cumulative us> | <indent><module>"
+        _, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((int(cumulative_us) / 1000, name[1:].rstrip()))
+    total = next((ms for ms, name in rows if name == module), 0.0)
+    # Direct imports of the module are indented by exactly two spaces
+    direct = sorted(((ms, name.strip()) for ms, name in rows if name.startswith("  ") and not name.startswith("   ")), reverse=True)
+    return total, direct[:top]
+
+
+def wait_for(url: str, timeout: float, want_status: int = 200) -> float:
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        try:
+            with urllib.request.urlopen(url, timeout=1) as response:
+                if response.status == want_status:
+                    return time.perf_counter()
+        except (urllib.error.URLError, ConnectionError, OSError):
+            pass
+        time.sleep(0.05)
+    raise TimeoutError(f"{url} not ready after {timeout}s")
+
+
+def server_profile(port: int):
+    env = {**os.environ, "GOOGLE_API_KEY": os.getenv("GOOGLE_API_KEY", "profile"), "PORT": str(port)}
+    start = time.perf_counter()
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        health = wait_for(f"http://127.0.0.1:{port}/health", 120) - start
+        ready = wait_for(f"http://127.0.0.1:{port}/ready", 120) - start
+    finally:
+        process.terminate()
+        process.wait()
+    return health * 1000, ready * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    for module in ("main", "buddy_rag"):
+        total, top = import_profile(module, args.top)
+        print(f"\nimport {module}: {total:.0f} ms cumulative")
+        for ms, name in top:
+            print(f"  {ms:8.1f} ms  {name}")
+
+    health_ms, ready_ms = server_profile(args.port)
+    print(f"\nuvicorn main:app -> /health answered after {health_ms:.0f} ms, /ready after {ready_ms:.0f} ms")
+
+
+if __name__ == "__main__":
+    main()
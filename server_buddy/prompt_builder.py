@@ -0,0 +1,160 @@
+"""
+Token-budgeted prompt assembly for Buddy.
+
+Parts of the prompt are admitted by priority until a configurable token
+budget is spent:
+
+1. system prompt and response instructions (always kept)
+2. the current user message
+3. the running conversation summary (summary memory mode)
+4. recent conversation turns, newest first
+5. retrieved past conversations, best match first
+
+Lower-priority parts are truncated or dropped when the budget runs out, so
+the prompt size (and with it LLM latency and cost) stays bounded no matter
+how long the stored messages are.
+"""
+import math
+import re
+from dataclasses import dataclass, field
+from typing import Dict, List, Tuple
+
+# Rough characters-per-token ratio for Gemini's SentencePiece tokenizer on
+# English text; a local estimate avoids a count_tokens round trip per request
+CHARS_PER_TOKEN = 4
+
+# Don't bother keeping a truncated fragment shorter than this
+MIN_FRAGMENT_TOKENS = 12
+
+CONTINUING_INSTRUCTIONS = "Please respond as Buddy. Only reference information from the context and history provided above. Do not mention or reference any events, topics, or conversations that are not explicitly shown in the context."
+NEW_CONVERSATION_INSTRUCTIONS = "Please respond as Buddy. This appears to be the start of a new conversation, so respond naturally without referencing any past interactions."
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate: the larger of a character-based and a word-based count"""
+    if not text:
+        return 0
+    return max(math.ceil(len(text) / CHARS_PER_TOKEN), len(text.split()))
+
+
+def truncate_to_tokens(text: str, max_tokens: int) -> str:
+    """Cut text to roughly ``max_tokens`` tokens on a word boundary"""
+    if estimate_tokens(text) <= max_tokens:
+        return text
+    cut = text[:max(0, max_tokens * CHARS_PER_TOKEN - 1)]
+    cut = re.sub(r"\s+\S*$", "", cut) or cut
+    # Word-dense text can still be over budget after the character cut
+    while cut and estimate_tokens(cut + "…") > max_tokens:
+        cut = cut.rsplit(" ", 1)[0] if " " in cut else cut[:-1]
+    return cut + "…"
+
+
+@dataclass
+class PromptPlan:
+    """The assembled prompt plus a per-section token breakdown"""
+    text: str
+    tokens: int
+    sections: Dict[str, int] = field(default_factory=dict)
+    history_messages: int = 0
+    context_items: int = 0
+    truncated: int = 0
+    dropped: int = 0
+
+
+class PromptBuilder:
+    """Fill a token budget by priority and render Buddy's prompt"""
+
+    def __init__(self, max_tokens: int = 2000, max_history_messages: int = 6, max_context_items: int = 3):
+        self.max_tokens = max_tokens
+        self.max_history_messages = max_history_messages
+        self.max_context_items = max_context_items
+
+    def _admit(self, items: List[str], budget: int, plan: PromptPlan) -> Tuple[List[str], int]:
+        """Take items in order while they fit, truncating the first one that doesn't"""
+        admitted = []
+        for index, item in enumerate(items):
+            cost = estimate_tokens(item)
+            if cost <= budget:
+                admitted.append(item)
+                budget -= cost
+                continue
+            if budget >= MIN_FRAGMENT_TOKENS:
+                admitted.append(truncate_to_tokens(item, budget))
+                budget -= estimate_tokens(admitted[-1])
+                plan.truncated += 1
+                index += 1
+            plan.dropped += len(items) - index
+            break
+        return admitted, budget
+
+    def build(self, system_prompt: str, user_message: str,
+              history: List[Tuple[str, str]], context: List[str], summary: str = "") -> PromptPlan:
+        """Assemble the prompt.
+
+        ``history`` is a list of ``(speaker, text)`` pairs, oldest first;
+        ``context`` is retrieved snippets, best first; ``summary`` is the
+        running summary of turns older than ``history``.
+        """
+        plan = PromptPlan(text="", tokens=0)
+        has_memory = bool(history or context or summary)
+        instructions = CONTINUING_INSTRUCTIONS if has_memory else NEW_CONVERSATION_INSTRUCTIONS
+
+        # 1. Fixed parts are always kept
+        budget = self.max_tokens - estimate_tokens(system_prompt) - estimate_tokens(instructions)
+        plan.sections["system"] = estimate_tokens(system_prompt) + estimate_tokens(instructions)
+
+        # 2. Current message, truncated only if it alone blows the budget
+        message = truncate_to_tokens(user_message, max(budget, MIN_FRAGMENT_TOKENS))
+        if message != user_message:
+            plan.truncated += 1
+        budget -= estimate_tokens(message)
+        plan.sections["message"] = estimate_tokens(message)
+
+        # 3. Running summary of older turns
+        summary_admitted, remaining = self._admit([summary] if summary else [], max(budget, 0), plan)
+        plan.sections["summary"] = max(budget, 0) - remaining
+        budget = remaining
+
+        # 4. Recent turns, newest first
+        recent = [f"{speaker}: {text}" for speaker, text in history[-self.max_history_messages:]]
+        recent_admitted, remaining = self._admit(list(reversed(recent)), max(budget, 0), plan)
+        recent_admitted.reverse()
+        plan.sections["history"] = max(budget, 0) - remaining
+        budget = remaining
+
+        # 5. Retrieved context, best match first
+        context_admitted, remaining = self._admit(context[:self.max_context_items], budget, plan)
+        plan.sections["context"] = budget - remaining
+
+        plan.history_messages = len(recent_admitted)
+        plan.context_items = len(context_admitted)
+
+        context_string = ""
+        if context_admitted:
+            context_string = "\n\nHere are some relevant past conversations:\n"
+            for i, snippet in enumerate(context_admitted, 1):
+                context_string += f"{i}. {snippet}\n"
+
+        history_string = ""
+        if summary_admitted:
+            history_string = f"\n\nSummary of your earlier conversation:\n{summary_admitted[0]}\n"
+        if recent_admitted:
+            history_string += "\n\nRecent conversation history:\n" + "".join(f"{line}\n" for line in recent_admitted)
+
+        if context_string or history_string:
+            plan.text = f"""{system_prompt}
+
+{context_string}
+{history_string}
+
+Current user message: {message}
+
+{instructions}"""
+        else:
+            plan.text = f"""{system_prompt}
+
+Current user message: {message}
+
+{instructions}"""
+        plan.tokens = estimate_tokens(plan.text)
+        return plan
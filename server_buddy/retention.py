@@ -0,0 +1,460 @@
+"""
+Retention and compaction for the ``buddy_conversations`` collection.
+
+Every chat turn is stored as its own document, so without cleanup search
+cost and disk usage grow forever. The retention job enforces a per-user
+policy:
+
+- turns older than ``max_age_days`` and the oldest turns beyond
+  ``max_turns_per_user`` are folded, ``fold_batch`` at a time, into summary
+  documents (``type: "summary"`` metadata) and then deleted;
+- when a user has more than ``max_summaries_per_user`` summaries, the
+  oldest ones are merged into one.
+
+Summaries stay searchable (vector and keyword), so old facts survive as a
+compact memory. Each fold writes its summary before deleting the turns
+under an id derived from the folded turn ids, so an interrupted or repeated
+run only overwrites the same summary. The job works one user at a time, only
+while the LLM queue is idle, skips users whose stats show nothing to do, and
+checkpoints its position so a stopped pass resumes where it left off.
+A pass holds an exclusive file lock next to its state file, so when
+several workers run the job only one of them compacts at a time.
+
+Run one pass by hand (``--dry-run`` only reports what would be folded):
+
+    python retention.py [--dry-run] [--max-users 100] [--json]
+"""
+import asyncio
+import hashlib
+import json
+import math
+import os
+import statistics
+import time
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+try:
+    import fcntl
+except ImportError:  # Windows: single-process use only
+    fcntl = None
+
+from metrics import metrics
+from structured_logging import get_logger
+from user_stats import aggregate
+
+STATE_FILENAME = "retention_state.json"
+LOCK_FILENAME = "retention.lock"
+PROBE_QUERY = "how have you been lately"
+
+log = get_logger("buddy.retention")
+
+# (doc_id, text, metadata), as the keyword index stores them
+StoredDoc = Tuple[str, str, Dict[str, Any]]
+
+
+def is_summary(metadata: Dict[str, Any]) -> bool:
+    return (metadata or {}).get("type") == "summary"
+
+
+def extractive_summary(docs: List[StoredDoc], max_chars: int = 600) -> str:
+    """LLM-free fallback: the user's side of each turn, shortened"""
+    parts = []
+    for _, text, metadata in docs:
+        message = metadata.get("user_message") or text
+        parts.append(message if len(message) <= 80 else message[:77] + "...")
+    summary = "; ".join(parts)
+    return summary if len(summary) <= max_chars else summary[:max_chars - 3] + "..."
+
+
+@dataclass
+class RetentionPolicy:
+    max_turns_per_user: int = 1000
+    max_age_days: float = 180
+    fold_batch: int = 20
+    max_summaries_per_user: int = 20
+
+    @classmethod
+    def from_env(cls) -> "RetentionPolicy":
+        return cls(
+            max_turns_per_user=int(os.getenv("BUDDY_RETENTION_MAX_TURNS", "1000")),
+            max_age_days=float(os.getenv("BUDDY_RETENTION_MAX_AGE_DAYS", "180")),
+            fold_batch=int(os.getenv("BUDDY_RETENTION_FOLD_BATCH", "20")),
+            max_summaries_per_user=int(os.getenv("BUDDY_RETENTION_MAX_SUMMARIES", "20"))
+        )
+
+    def needs_compaction(self, stats: Dict[str, Any], now: datetime) -> bool:
+        """Cheap pre-check from the per-user stats aggregate"""
+        if not stats:
+            return False
+        if self.max_turns_per_user > 0 and stats.get("turn_count", 0) > self.max_turns_per_user:
+            return True
+        return self.max_age_days > 0 and stats.get("first_seen", "") < self.cutoff(now)
+
+    def cutoff(self, now: datetime) -> str:
+        return (now - timedelta(days=self.max_age_days)).isoformat()
+
+    def plan(self, docs: List[StoredDoc], now: datetime) -> Tuple[List[List[StoredDoc]], List[StoredDoc]]:
+        """Split one user's documents into (turn batches to fold, summaries to merge)"""
+        turns = sorted((d for d in docs if not is_summary(d[2])), key=lambda d: d[2].get("timestamp", ""))
+        summaries = sorted((d for d in docs if is_summary(d[2])), key=lambda d: d[2].get("timestamp", ""))
+
+        fold = 0
+        if self.max_age_days > 0:
+            cutoff = self.cutoff(now)
+            fold = sum(1 for d in turns if d[2].get("timestamp", "") < cutoff)
+        if self.max_turns_per_user > 0:
+            fold = max(fold, len(turns) - self.max_turns_per_user)
+
+        # Keep within max_summaries_per_user: merge the oldest summaries to
+        # make room for at least one new one, and fold in larger batches when
+        # the remaining slots would otherwise overflow
+        merge: List[StoredDoc] = []
+        batch = max(self.fold_batch, 1)
+        if self.max_summaries_per_user > 0:
+            excess = len(summaries) + (1 if fold else 0) - self.max_summaries_per_user
+            if excess > 0:
+                merge = summaries[:excess + 1]
+            kept = len(summaries) - len(merge) + (1 if merge else 0)
+            slots = max(self.max_summaries_per_user - kept, 1)
+            batch = max(batch, math.ceil(fold / slots))
+        batches = [turns[i:min(i + batch, fold)] for i in range(0, fold, batch)]
+        return batches, merge
+
+
+class RetentionJob:
+    """Incremental, interruptible compaction of the conversation store"""
+
+    def __init__(self, buddy, policy: Optional[RetentionPolicy] = None, summarizer: Optional[str] = None,
+                 pause_seconds: float = 0.05, idle_poll_seconds: float = 1.0):
+        self.buddy = buddy
+        self.policy = policy or RetentionPolicy.from_env()
+        # "llm" summarizes through the model router; "extractive" needs no LLM
+        self.summarizer = (summarizer or os.getenv("BUDDY_RETENTION_SUMMARIZER", "llm")).lower()
+        self.pause_seconds = pause_seconds
+        self.idle_poll_seconds = idle_poll_seconds
+        self.state_path = os.path.join(buddy.chroma_path, STATE_FILENAME)
+        self.lock_path = os.path.join(buddy.chroma_path, LOCK_FILENAME)
+        self.state = self._load_state()
+        self._stop = asyncio.Event()
+        self._running = False
+        self._task: Optional[asyncio.Task] = None
+
+    def _load_state(self) -> Dict[str, Any]:
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"cursor": "", "last_report": None}
+
+    def _save_state(self):
+        try:
+            os.makedirs(os.path.dirname(self.state_path) or ".", exist_ok=True)
+            tmp_path = f"{self.state_path}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(self.state, f)
+            os.replace(tmp_path, self.state_path)
+        except OSError as e:
+            log.error("retention_state_save_failed", path=self.state_path, error=str(e))
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "running": self._running,
+            "policy": asdict(self.policy),
+            "summarizer": self.summarizer,
+            "cursor": self.state.get("cursor", ""),
+            "last_report": self.state.get("last_report"),
+        }
+
+    def start(self, interval_seconds: float):
+        """Run a pass every ``interval_seconds`` in the background"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._loop(interval_seconds))
+
+    def stop(self):
+        """Interrupt the current pass after the fold it is working on (it resumes next time)"""
+        self._stop.set()
+
+    def shutdown(self):
+        """Stop the current pass and the periodic runs"""
+        self.stop()
+        if self._task is not None:
+            self._task.cancel()
+
+    async def _loop(self, interval_seconds: float):
+        while True:
+            await asyncio.sleep(interval_seconds)
+            try:
+                await self.run_once()
+            except Exception as e:
+                log.error("retention_failed", error=str(e), exc_info=True)
+
+    async def run_once(self, max_users: Optional[int] = None, dry_run: bool = False) -> Dict[str, Any]:
+        """One pass over the users after the checkpoint; returns a before/after report"""
+        if self._running:
+            return {"error": "a retention pass is already running"}
+        lock = self._lock_across_processes()
+        if lock is None:
+            return {"error": "a retention pass is running in another process"}
+        self._running = True
+        self._stop.clear()
+        try:
+            # Re-read: another worker may have moved the cursor since
+            self.state = self._load_state()
+            return await self._run(max_users, dry_run)
+        finally:
+            self._running = False
+            lock.close()
+
+    def _lock_across_processes(self):
+        """Open lock file holding an exclusive lock, or None if another process has it"""
+        os.makedirs(os.path.dirname(self.lock_path) or ".", exist_ok=True)
+        lock = open(self.lock_path, "a")
+        if fcntl is not None:
+            try:
+                fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock.close()
+                return None
+        return lock
+
+    async def _run(self, max_users: Optional[int], dry_run: bool) -> Dict[str, Any]:
+        start = time.perf_counter()
+        now = datetime.now()
+        await self.buddy.ensure_user_stats()
+        user_ids = sorted(row["user_id"] for row in self._all_user_stats())
+        cursor = self.state.get("cursor", "")
+        todo = [u for u in user_ids if u > cursor] + [u for u in user_ids if u <= cursor]
+        candidates = [u for u in todo if self.policy.needs_compaction(self.buddy.user_stats.get(u), now)]
+        if max_users is not None:
+            candidates = candidates[:max_users]
+
+        report: Dict[str, Any] = {
+            "started_at": now.isoformat(timespec="seconds"),
+            "dry_run": dry_run,
+            "users_total": len(user_ids),
+            "users_candidates": len(candidates),
+            "before": await self._measure(candidates),
+            "users_compacted": 0,
+            "turns_folded": 0,
+            "summaries_written": 0,
+            "summaries_merged": 0,
+            "errors": 0,
+            "interrupted": False,
+        }
+        for user_id in candidates:
+            if self._stop.is_set():
+                report["interrupted"] = True
+                break
+            await self._wait_for_idle()
+            try:
+                result = await self.compact_user(user_id, now, dry_run=dry_run)
+            except Exception as e:
+                report["errors"] += 1
+                metrics.incr("retention_errors")
+                log.error("retention_user_failed", user_id=user_id, error=str(e))
+                continue
+            if result["turns_folded"] or result["summaries_merged"]:
+                report["users_compacted"] += 1
+            for key in ("turns_folded", "summaries_written", "summaries_merged"):
+                report[key] += result[key]
+            if not dry_run:
+                self.state["cursor"] = user_id
+                self._save_state()
+            await asyncio.sleep(self.pause_seconds)
+        else:
+            if not dry_run:
+                # Full pass done: the next one starts from the beginning
+                self.state["cursor"] = ""
+
+        report["after"] = await self._measure(candidates)
+        report["duration_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        if not dry_run:
+            self.state["last_report"] = report
+            self._save_state()
+            metrics.incr("retention_turns_folded", report["turns_folded"])
+        log.info("retention_pass", users=report["users_compacted"], folded=report["turns_folded"],
+                 docs_before=report["before"]["documents"], docs_after=report["after"]["documents"],
+                 interrupted=report["interrupted"], dry_run=dry_run)
+        return report
+
+    def _all_user_stats(self, page_size: int = 500) -> List[Dict[str, Any]]:
+        rows, offset = [], 0
+        while True:
+            page = self.buddy.user_stats.page(offset=offset, limit=page_size, order_by="user_id")
+            rows.extend(page)
+            if len(page) < page_size:
+                return rows
+            offset += page_size
+
+    async def _wait_for_idle(self):
+        # Yield to live traffic, like the summary worker
+        while not self.buddy.admission.is_idle() and not self._stop.is_set():
+            await asyncio.sleep(self.idle_poll_seconds)
+
+    async def compact_user(self, user_id: str, now: Optional[datetime] = None, dry_run: bool = False) -> Dict[str, int]:
+        """Fold one user's expired / over-cap turns into summaries"""
+        now = now or datetime.now()
+        loop = asyncio.get_event_loop()
+        stored = await loop.run_in_executor(
+            None,
+            lambda: self.buddy.vector_store.get(where={"user_id": user_id}, include=["documents", "metadatas"])
+        )
+        docs: List[StoredDoc] = list(zip(stored["ids"], stored["documents"], stored["metadatas"]))
+        batches, merge = self.policy.plan(docs, now)
+        result = {
+            "turns_folded": sum(len(batch) for batch in batches),
+            "summaries_written": len(batches) + (1 if merge else 0),
+            "summaries_merged": len(merge),
+        }
+        if dry_run:
+            return result
+
+        # Report what was actually done: a pass can be stopped or the user deleted midway
+        result = dict.fromkeys(result, 0)
+        replaced: set = set()
+        for batch in batches:
+            start = time.perf_counter()
+            summary = await self._summarize(batch)
+            if not await self._replace(user_id, docs, batch, summary, replaced, folded_turns=len(batch)):
+                break
+            result["turns_folded"] += len(batch)
+            result["summaries_written"] += 1
+            metrics.observe("retention_fold", (time.perf_counter() - start) * 1000)
+            if self._stop.is_set():
+                break
+        else:
+            if merge:
+                summary = await self._summarize(merge)
+                folded = sum(int(d[2].get("folded_turns", 0)) for d in merge)
+                if await self._replace(user_id, docs, merge, summary, replaced, folded_turns=folded):
+                    result["summaries_written"] += 1
+                    result["summaries_merged"] += len(merge)
+        log.info("retention_user_compacted", user_id=user_id, **result)
+        return result
+
+    async def _summarize(self, docs: List[StoredDoc]) -> str:
+        if self.summarizer == "extractive":
+            return extractive_summary(docs)
+        turns = []
+        for _, text, metadata in docs:
+            if is_summary(metadata):
+                turns.append(("Summary", text))
+            else:
+                turns.append(("User", metadata.get("user_message", "")))
+                turns.append(("Buddy", metadata.get("assistant_message", "")))
+        return await self.buddy.summarize_turns("", turns)
+
+    async def _replace(self, user_id: str, docs: List[StoredDoc], fold: List[StoredDoc], summary: str,
+                       replaced: set, folded_turns: int) -> bool:
+        """Write the summary for ``fold``, then delete it; False if the turns are gone.
+
+        Runs under the user's lock, and only if every folded document still
+        exists: the user may have been deleted while the summary was being
+        written, and their text must not come back as a summary.
+        """
+        if not summary:
+            raise ValueError("empty summary")
+        ids = [d[0] for d in fold]
+        period_start = min(d[2].get("period_start") or d[2].get("timestamp", "") for d in fold)
+        period_end = max(d[2].get("period_end") or d[2].get("timestamp", "") for d in fold)
+        text = f"Summary of earlier conversations ({period_start[:10]} to {period_end[:10]}): {summary}"
+        metadata = {
+            "type": "summary",
+            "user_id": user_id,
+            # Dated at the end of the period so recency ranking treats it like its newest turn
+            "timestamp": period_end,
+            "period_start": period_start,
+            "period_end": period_end,
+            "folded_turns": folded_turns,
+        }
+        summary_id = "summary_" + hashlib.sha256("\n".join(sorted(ids)).encode("utf-8")).hexdigest()[:32]
+
+        loop = asyncio.get_event_loop()
+        async with self.buddy.user_lock(user_id):
+            present = await loop.run_in_executor(None, lambda: self.buddy.vector_store.get(ids=ids, include=[]))
+            if len(present.get("ids") or []) != len(ids):
+                metrics.incr("retention_fold_conflicts")
+                log.info("retention_fold_skipped", user_id=user_id, reason="turns no longer stored")
+                return False
+            await loop.run_in_executor(
+                None,
+                lambda: self.buddy.vector_store.add_documents([Document(page_content=text, metadata=metadata)], ids=[summary_id])
+            )
+            await loop.run_in_executor(None, lambda: self.buddy.vector_store.delete(ids=ids))
+            self.buddy.keyword_index.remove(user_id, ids)
+            self.buddy.keyword_index.add(user_id, summary_id, text, metadata)
+            replaced.update(ids)
+            # Recompute the user's aggregate from what is left
+            remaining = [(d[2], len((d[1] or "").encode("utf-8"))) for d in docs if d[0] not in replaced]
+            self.buddy.user_stats.replace_user(user_id, aggregate(remaining).get(user_id))
+        return True
+
+    async def _measure(self, user_ids: List[str], probes: int = 20) -> Dict[str, Any]:
+        """Collection size and filtered query latency for a sample of users"""
+        loop = asyncio.get_event_loop()
+        documents = await loop.run_in_executor(None, self.buddy.document_count)
+        latencies = []
+        for user_id in user_ids[:probes]:
+            start = time.perf_counter()
+            await loop.run_in_executor(
+                None,
+                lambda: self.buddy.vector_store.similarity_search(PROBE_QUERY, k=10, filter={"user_id": user_id})
+            )
+            latencies.append((time.perf_counter() - start) * 1000)
+        measurement: Dict[str, Any] = {
+            "documents": documents,
+            "query_p50_ms": round(statistics.median(latencies), 2) if latencies else None,
+        }
+        if not self.buddy.chroma_host:
+            measurement["disk_bytes"] = directory_size(self.buddy.chroma_path)
+        return measurement
+
+
+def directory_size(path: str) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+
+def main():
+    import argparse
+    from dotenv import load_dotenv
+
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--dry-run", action="store_true", help="only report what would be folded")
+    parser.add_argument("--max-users", type=int, default=None, help="stop after this many users (resumes next run)")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+    load_dotenv()
+
+    from buddy_rag import BuddyRAG
+
+    async def run():
+        job = RetentionJob(BuddyRAG())
+        return await job.run_once(max_users=args.max_users, dry_run=args.dry_run)
+
+    report = asyncio.run(run())
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    before, after = report["before"], report["after"]
+    print(f"{'dry run: ' if report['dry_run'] else ''}{report['users_compacted']} of "
+          f"{report['users_candidates']} candidate users compacted, {report['turns_folded']} turns folded "
+          f"into {report['summaries_written']} summaries ({report['duration_ms']} ms)")
+    print(f"  documents   {before['documents']:>10} -> {after['documents']}")
+    if "disk_bytes" in before:
+        print(f"  disk bytes  {before['disk_bytes']:>10} -> {after['disk_bytes']}")
+    print(f"  query p50   {before['query_p50_ms']!s:>10} -> {after['query_p50_ms']} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Recall and latency benchmark: vector-only vs hybrid (BM25 + vector) retrieval.
+
+Builds a synthetic conversation store in a temporary ChromaDB: each user has
+a few hundred everyday turns, some of which mention a named entity (a pet,
+a friend, a place). Queries bring an entity up again ("how is Biscuit
+doing?") and the relevant turns are the ones that mentioned it. For each
+retrieval mode it reports recall@k, MRR and per-query latency, plus the
+cost of the recency/dedup re-rank over a few hundred candidates.
+
+Runs with the production embeddings (``fake``) and with a deterministic
+hashed bag-of-words embedding (``hash``) standing in for a weak semantic
+model:
+
+    python retrieval_benchmark.py [--users 10] [--turns 300] [--queries 200] [--json]
+"""
+import argparse
+import asyncio
+import contextlib
+import hashlib
+import io
+import json
+import logging
+import math
+import os
+import random
+import statistics
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from keyword_index import tokenize
+
+ENTITIES = [
+    "Biscuit", "Pepper", "Luna", "Milo", "Ziggy", "Mochi", "Rufus", "Cleo",
+    "Lisbon", "Kyoto", "Nairobi", "Oslo", "Cusco", "Tbilisi", "Hanoi", "Quito",
+    "Priya", "Mateo", "Ingrid", "Kwame", "Sakura", "Dmitri", "Aisha", "Tomas",
+]
+ENTITY_TEMPLATES = [
+    "I took {e} to the vet today and everything was fine",
+    "Thinking about planning a trip to {e} next spring",
+    "Had a long call with {e} about work stuff",
+    "{e} did the funniest thing this morning",
+    "I keep dreaming about going back to {e}",
+]
+FILLER = [
+    "Work was exhausting and I just want to sleep",
+    "I made pasta for dinner and it turned out great",
+    "The weather has been so gloomy lately",
+    "I started reading a new mystery novel",
+    "My neighbor's dog barked all night long",
+    "I'm trying to get back into running every morning",
+    "Watched a documentary about the ocean yesterday",
+    "Feeling a bit anxious about the presentation on Friday",
+    "Finally cleaned my whole apartment",
+    "Coffee is the only thing keeping me going today",
+]
+QUERY_TEMPLATES = [
+    "how is {e} doing these days?",
+    "remember when I told you about {e}?",
+    "any news about {e}",
+]
+REPLIES = ["That sounds great!", "Tell me more about that.", "Oh no, I'm sorry to hear that.", "Haha, love it!"]
+
+
+class HashingEmbeddings(Embeddings):
+    """Deterministic hashed bag-of-words vectors (a crude stand-in for a semantic model)"""
+
+    def __init__(self, size: int = 384):
+        self.size = size
+
+    def _embed(self, text: str) -> List[float]:
+        vector = [0.0] * self.size
+        for token in tokenize(text):
+            digest = hashlib.md5(token.encode("utf-8")).digest()
+            vector[int.from_bytes(digest[:4], "little") % self.size] += 1.0 if digest[4] & 1 else -1.0
+        norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+        return [v / norm for v in vector]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return [self._embed(text) for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed(text)
+
+
+def build_corpus(users: int, turns: int, seed: int):
+    """Return (documents, queries); each query is (user_id, text, set of relevant turn texts)"""
+    rng = random.Random(seed)
+    documents, mentions = [], {}
+    start = datetime(2025, 1, 1)
+    for u in range(users):
+        user_id = f"bench-user-{u}"
+        user_entities = rng.sample(ENTITIES, 6)
+        for t in range(turns):
+            if rng.random() < 0.1:
+                entity = rng.choice(user_entities)
+                message = rng.choice(ENTITY_TEMPLATES).format(e=entity)
+            else:
+                entity = None
+                message = f"{rng.choice(FILLER)} ({t})"
+            text = f"User: {message}\nBuddy: {rng.choice(REPLIES)}"
+            timestamp = (start + timedelta(minutes=t * 37)).isoformat()
+            documents.append(Document(page_content=text, metadata={
+                "user_id": user_id, "timestamp": timestamp, "user_message": message,
+                "assistant_message": text.split("Buddy: ", 1)[1],
+            }))
+            if entity:
+                mentions.setdefault((user_id, entity), set()).add(text)
+    queries = [
+        (user_id, rng.choice(QUERY_TEMPLATES).format(e=entity), relevant)
+        for (user_id, entity), relevant in mentions.items()
+    ]
+    return documents, queries
+
+
+async def evaluate(buddy, queries, k: int, mode: str) -> Dict[str, float]:
+    buddy.retrieval_mode = mode
+    recalls, reciprocal_ranks, latencies = [], [], []
+    for user_id, query, relevant in queries:
+        start = time.perf_counter()
+        results = await buddy.retrieve_candidates(query, user_id, k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        texts = [doc.page_content for doc, _ in results]
+        recalls.append(len(relevant.intersection(texts)) / min(len(relevant), k))
+        rank = next((i for i, text in enumerate(texts, 1) if text in relevant), None)
+        reciprocal_ranks.append(1 / rank if rank else 0.0)
+    latencies.sort()
+    return {
+        f"recall@{k}": round(statistics.fmean(recalls), 3),
+        "mrr": round(statistics.fmean(reciprocal_ranks), 3),
+        "p50_ms": round(latencies[len(latencies) // 2], 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95)], 2),
+    }
+
+
+def rerank_cost(buddy, documents, k: int, candidates: int = 300, repeats: int = 50) -> Dict[str, float]:
+    """Time ContextRanker.select over ``candidates`` fused results"""
+    pool = [(doc.page_content, doc.metadata, 1.0 / (60 + rank))
+            for rank, doc in enumerate(documents[:candidates], 1)]
+    latencies = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        buddy.context_ranker.select(pool, k)
+        latencies.append((time.perf_counter() - start) * 1000)
+    latencies.sort()
+    return {
+        "candidates": len(pool),
+        "p50_ms": round(latencies[len(latencies) // 2], 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95)], 2),
+    }
+
+
+async def run_for_embeddings(name: str, documents, queries, k: int) -> Dict[str, Dict]:
+    os.environ["CHROMA_DB_PATH"] = tempfile.mkdtemp(prefix=f"buddy-retrieval-{name}-")
+    from buddy_rag import BuddyRAG
+    buddy = BuddyRAG()
+    if name == "hash":
+        buddy.embeddings = HashingEmbeddings()
+        buddy.vector_store = buddy._create_vector_store()
+    for i in range(0, len(documents), 500):
+        buddy.vector_store.add_documents(documents[i:i + 500])
+
+    # Build every user's keyword index up front; the load is a one-off per user
+    users = sorted({user_id for user_id, _, _ in queries})
+    start = time.perf_counter()
+    for user_id in users:
+        await buddy.ensure_keyword_index(user_id)
+    load_ms = (time.perf_counter() - start) * 1000 / max(len(users), 1)
+
+    results = {}
+    for mode in ("vector", "hybrid"):
+        await evaluate(buddy, queries[:10], k, mode)  # warm-up
+        results[mode] = await evaluate(buddy, queries, k, mode)
+    results["keyword_index_load_ms_per_user"] = round(load_ms, 2)
+    results["rerank"] = rerank_cost(buddy, documents, k)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--turns", type=int, default=300, help="stored turns per user")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("-k", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    os.environ.setdefault("BUDDY_LLM_BACKEND", "fake")
+    os.environ.setdefault("LOG_LEVEL", "WARNING")
+    # Measure quality, not the budget cut-off
+    os.environ.setdefault("BUDDY_RETRIEVAL_BUDGET_MS", "10000")
+    logging.getLogger("chromadb").setLevel(logging.ERROR)
+
+    documents, queries = build_corpus(args.users, args.turns, args.seed)
+    queries = random.Random(args.seed).sample(queries, min(args.queries, len(queries)))
+
+    report = {"documents": len(documents), "queries": len(queries), "k": args.k, "embeddings": {}}
+    for name in ("fake", "hash"):
+        with contextlib.redirect_stdout(io.StringIO()):
+            report["embeddings"][name] = asyncio.run(run_for_embeddings(name, documents, queries, args.k))
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+        return
+    print(f"\n{report['documents']} stored turns, {report['queries']} entity queries, k={args.k}")
+    for name, results in report["embeddings"].items():
+        print(f"\n{name} embeddings (keyword index load {results['keyword_index_load_ms_per_user']} ms/user)")
+        print(f"  {'mode':8}{'recall@' + str(args.k):>10}{'mrr':>8}{'p50 ms':>9}{'p95 ms':>9}")
+        for mode in ("vector", "hybrid"):
+            r = results[mode]
+            print(f"  {mode:8}{r[f'recall@{args.k}']:>10.3f}{r['mrr']:>8.3f}{r['p50_ms']:>9.2f}{r['p95_ms']:>9.2f}")
+        rerank = results["rerank"]
+        print(f"  re-rank of {rerank['candidates']} candidates: p50 {rerank['p50_ms']} ms, p95 {rerank['p95_ms']} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,296 @@
+"""
+Pluggable session state for Buddy: recent turns and running summaries per user.
+
+``MemorySessionStore`` keeps everything in process memory and is only
+correct with a single worker. ``SQLiteSessionStore`` keeps it in one SQLite
+database in WAL mode, so several uvicorn workers on the same host share
+every user's turns. Select with ``BUDDY_SESSION_BACKEND=memory|sqlite``.
+
+Operations are small indexed reads/writes and are called directly from the
+event loop, like the in-memory dict they replace. So that another worker's
+write can't stall the loop, SQLite waits at most
+``BUDDY_SESSION_BUSY_TIMEOUT_MS`` (default 200) for a lock; a request that
+still finds the database locked degrades instead (no history for that
+turn, or the turn left out of short-term memory; it is still in ChromaDB).
+Deletes are never skipped: they raise.
+"""
+import functools
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+from structured_logging import get_logger
+
+Turn = Tuple[str, str]  # (speaker, text)
+
+log = get_logger("buddy.sessions")
+
+
+def _degrade_when_busy(default):
+    """Return ``default`` instead of raising when the database stays locked"""
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            try:
+                return method(self, *args, **kwargs)
+            except sqlite3.OperationalError as e:
+                if "locked" not in str(e) and "busy" not in str(e):
+                    raise
+                log.warning("session_store_busy", op=method.__name__, error=str(e))
+                return default() if callable(default) else default
+        return wrapper
+    return decorator
+
+
+class SessionStore:
+    """Interface shared by the session backends"""
+
+    def has_session(self, user_id: str) -> bool:
+        raise NotImplementedError
+
+    def start_session(self, user_id: str, turns: List[Turn]) -> bool:
+        """Create the session seeded with ``turns``; False if it already existed"""
+        raise NotImplementedError
+
+    def get_turns(self, user_id: str, limit: Optional[int] = None) -> List[Turn]:
+        """The user's messages oldest first (only the newest ``limit`` if given)"""
+        raise NotImplementedError
+
+    def append_turn(self, user_id: str, user_message: str, assistant_message: str):
+        raise NotImplementedError
+
+    def fold_turns(self, user_id: str, folded: List[Turn], summary: str) -> bool:
+        """Atomically replace the oldest ``folded`` messages with ``summary``.
+
+        Returns False (and changes nothing) if the history no longer starts
+        with exactly those messages, e.g. another worker folded them first.
+        """
+        raise NotImplementedError
+
+    def get_summary(self, user_id: str) -> str:
+        raise NotImplementedError
+
+    def message_count(self, user_id: str) -> int:
+        return len(self.get_turns(user_id))
+
+    def session_count(self) -> int:
+        raise NotImplementedError
+
+    def total_messages(self) -> int:
+        raise NotImplementedError
+
+    def clear_user(self, user_id: str):
+        raise NotImplementedError
+
+    def clear_all(self):
+        raise NotImplementedError
+
+
+class MemorySessionStore(SessionStore):
+    """Process-local sessions (single worker only)"""
+
+    def __init__(self):
+        self.turns: Dict[str, List[Turn]] = {}
+        self.summaries: Dict[str, str] = {}
+
+    def has_session(self, user_id: str) -> bool:
+        return user_id in self.turns
+
+    def start_session(self, user_id: str, turns: List[Turn]) -> bool:
+        if user_id in self.turns:
+            return False
+        self.turns[user_id] = list(turns)
+        return True
+
+    def get_turns(self, user_id: str, limit: Optional[int] = None) -> List[Turn]:
+        turns = self.turns.get(user_id, [])
+        return list(turns[-limit:] if limit else turns)
+
+    def append_turn(self, user_id: str, user_message: str, assistant_message: str):
+        turns = self.turns.setdefault(user_id, [])
+        turns.append(("User", user_message))
+        turns.append(("Buddy", assistant_message))
+
+    def fold_turns(self, user_id: str, folded: List[Turn], summary: str) -> bool:
+        turns = self.turns.get(user_id, [])
+        if turns[:len(folded)] != folded:
+            return False
+        del turns[:len(folded)]
+        self.summaries[user_id] = summary
+        return True
+
+    def get_summary(self, user_id: str) -> str:
+        return self.summaries.get(user_id, "")
+
+    def message_count(self, user_id: str) -> int:
+        return len(self.turns.get(user_id, []))
+
+    def session_count(self) -> int:
+        return len(self.turns)
+
+    def total_messages(self) -> int:
+        return sum(len(turns) for turns in self.turns.values())
+
+    def clear_user(self, user_id: str):
+        self.turns.pop(user_id, None)
+        self.summaries.pop(user_id, None)
+
+    def clear_all(self):
+        self.turns.clear()
+        self.summaries.clear()
+
+
+class SQLiteSessionStore(SessionStore):
+    """Sessions shared by every worker process through one SQLite WAL database"""
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS sessions (
+        user_id TEXT PRIMARY KEY,
+        summary TEXT NOT NULL DEFAULT '',
+        created_at REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS turns (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        user_id TEXT NOT NULL,
+        speaker TEXT NOT NULL,
+        content TEXT NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS turns_user_id ON turns (user_id, id);
+    """
+
+    def __init__(self, path: str, busy_timeout_ms: int = 200):
+        self.path = path
+        self.busy_timeout_ms = busy_timeout_ms
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._conn().executescript(self.SCHEMA)
+
+    def _conn(self) -> sqlite3.Connection:
+        # One connection per thread; WAL lets readers in other processes run
+        # alongside the single writer
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=self.busy_timeout_ms / 1000, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute(f"PRAGMA busy_timeout={int(self.busy_timeout_ms)}")
+            self._local.conn = conn
+        return conn
+
+    def transaction(self, write: bool = False) -> "_Transaction":
+        return _Transaction(self._conn(), write)
+
+    @_degrade_when_busy(True)
+    def has_session(self, user_id: str) -> bool:
+        with self.transaction() as conn:
+            return conn.execute("SELECT 1 FROM sessions WHERE user_id = ?", (user_id,)).fetchone() is not None
+
+    @_degrade_when_busy(False)
+    def start_session(self, user_id: str, turns: List[Turn]) -> bool:
+        with self.transaction(write=True) as conn:
+            created = conn.execute(
+                "INSERT OR IGNORE INTO sessions (user_id, created_at) VALUES (?, ?)", (user_id, time.time())
+            ).rowcount == 1
+            if created and turns:
+                conn.executemany(
+                    "INSERT INTO turns (user_id, speaker, content) VALUES (?, ?, ?)",
+                    [(user_id, speaker, text) for speaker, text in turns]
+                )
+            return created
+
+    @_degrade_when_busy(list)
+    def get_turns(self, user_id: str, limit: Optional[int] = None) -> List[Turn]:
+        with self.transaction() as conn:
+            if limit:
+                rows = conn.execute(
+                    "SELECT speaker, content FROM (SELECT id, speaker, content FROM turns WHERE user_id = ? "
+                    "ORDER BY id DESC LIMIT ?) ORDER BY id", (user_id, limit)
+                ).fetchall()
+            else:
+                rows = conn.execute(
+                    "SELECT speaker, content FROM turns WHERE user_id = ? ORDER BY id", (user_id,)
+                ).fetchall()
+        return [(speaker, content) for speaker, content in rows]
+
+    @_degrade_when_busy(None)
+    def append_turn(self, user_id: str, user_message: str, assistant_message: str):
+        with self.transaction(write=True) as conn:
+            conn.execute("INSERT OR IGNORE INTO sessions (user_id, created_at) VALUES (?, ?)", (user_id, time.time()))
+            conn.executemany(
+                "INSERT INTO turns (user_id, speaker, content) VALUES (?, ?, ?)",
+                [(user_id, "User", user_message), (user_id, "Buddy", assistant_message)]
+            )
+
+    @_degrade_when_busy(False)
+    def fold_turns(self, user_id: str, folded: List[Turn], summary: str) -> bool:
+        with self.transaction(write=True) as conn:
+            rows = conn.execute(
+                "SELECT id, speaker, content FROM turns WHERE user_id = ? ORDER BY id LIMIT ?", (user_id, len(folded))
+            ).fetchall()
+            if [(speaker, content) for _, speaker, content in rows] != folded:
+                return False
+            conn.execute("DELETE FROM turns WHERE user_id = ? AND id <= ?", (user_id, rows[-1][0]))
+            conn.execute("UPDATE sessions SET summary = ? WHERE user_id = ?", (summary, user_id))
+            return True
+
+    @_degrade_when_busy("")
+    def get_summary(self, user_id: str) -> str:
+        with self.transaction() as conn:
+            row = conn.execute("SELECT summary FROM sessions WHERE user_id = ?", (user_id,)).fetchone()
+        return row[0] if row else ""
+
+    @_degrade_when_busy(0)
+    def message_count(self, user_id: str) -> int:
+        with self.transaction() as conn:
+            return conn.execute("SELECT COUNT(*) FROM turns WHERE user_id = ?", (user_id,)).fetchone()[0]
+
+    @_degrade_when_busy(0)
+    def session_count(self) -> int:
+        with self.transaction() as conn:
+            return conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    @_degrade_when_busy(0)
+    def total_messages(self) -> int:
+        with self.transaction() as conn:
+            return conn.execute("SELECT COUNT(*) FROM turns").fetchone()[0]
+
+    def clear_user(self, user_id: str):
+        with self.transaction(write=True) as conn:
+            conn.execute("DELETE FROM turns WHERE user_id = ?", (user_id,))
+            conn.execute("DELETE FROM sessions WHERE user_id = ?", (user_id,))
+
+    def clear_all(self):
+        with self.transaction(write=True) as conn:
+            conn.execute("DELETE FROM turns")
+            conn.execute("DELETE FROM sessions")
+
+
+class _Transaction:
+    """Run a block in one transaction; writers take the lock up front (IMMEDIATE)"""
+
+    def __init__(self, conn: sqlite3.Connection, write: bool):
+        self.conn = conn
+        self.write = write
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute("BEGIN IMMEDIATE" if self.write else "BEGIN")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+def create_session_store() -> SessionStore:
+    """Build the session backend selected by BUDDY_SESSION_BACKEND"""
+    backend = os.getenv("BUDDY_SESSION_BACKEND", "memory").lower()
+    if backend == "sqlite":
+        path = os.getenv("BUDDY_SESSION_DB", "./buddy_sessions.db")
+        log.info("session_store", backend="sqlite", path=path)
+        return SQLiteSessionStore(path, busy_timeout_ms=int(os.getenv("BUDDY_SESSION_BUSY_TIMEOUT_MS", "200")))
+    if backend != "memory":
+        raise ValueError(f"Unknown BUDDY_SESSION_BACKEND '{backend}' (expected 'memory' or 'sqlite')")
+    return MemorySessionStore()
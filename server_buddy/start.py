@@ -5,7 +5,6 @@ Production startup script for Buddy Server
 import os
 import sys
 import uvicorn
-from main import app
 
 def main():
     """Main entry point for production deployment"""
@@ -13,20 +12,32 @@ def main():
     # Get configuration from environment
     host = os.getenv("HOST", "0.0.0.0")
     port = int(os.getenv("PORT", 8001))
+    workers = int(os.getenv("WEB_CONCURRENCY", 1))
     
     # Check if required environment variables are set
-    if not os.getenv("GOOGLE_API_KEY"):
+    if not os.getenv("GOOGLE_API_KEY") and os.getenv("BUDDY_LLM_BACKEND", "gemini").lower() != "fake":
         print("ERROR: GOOGLE_API_KEY environment variable is required")
         sys.exit(1)
     
     print(f"Starting Buddy Server on {host}:{port}")
     print(f"Environment: {'Production' if os.getenv('PORT') else 'Development'}")
+    if workers > 1 and not os.getenv("CHROMA_SERVER_HOST"):
+        # Several processes writing one embedded Chroma directory can corrupt it
+        print(f"ERROR: WEB_CONCURRENCY={workers} needs a shared Chroma server. "
+              "Set CHROMA_SERVER_HOST (and CHROMA_SERVER_PORT) or run a single worker.")
+        sys.exit(1)
+    if workers > 1 and os.getenv("BUDDY_SESSION_BACKEND", "memory").lower() != "sqlite":
+        # Sessions would be split across processes otherwise
+        print(f"Running {workers} workers: using the shared SQLite session store")
+        os.environ["BUDDY_SESSION_BACKEND"] = "sqlite"
     
-    # Run the server
+    # Run the server (uvicorn imports main itself; importing it here as
+    # well would only delay binding the port)
     uvicorn.run(
-        app,
+        "main:app",
         host=host,
         port=port,
+        workers=workers,
         log_level="info",
         access_log=True
     )
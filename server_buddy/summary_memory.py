@@ -0,0 +1,109 @@
+"""
+Rolling conversation summaries for Buddy.
+
+In summary memory mode the prompt carries a fixed-size running summary per
+user plus only the most recent turns. Older turns are folded into the
+summary by a background worker after the response has been sent. The worker
+batches all foldable turns of a user into one LLM call, enforces a minimum
+interval between calls and only runs while the LLM admission queue is idle,
+so it never competes with live /chat traffic.
+
+Turns and summaries live in the session store, which folds atomically, so
+several workers racing on the same user fold each turn at most once.
+"""
+import asyncio
+import time
+from typing import Awaitable, Callable, List, Optional, Set
+
+from metrics import metrics
+from session_store import SessionStore, Turn
+from structured_logging import get_logger
+
+
+log = get_logger("buddy.summary")
+
+
+class SummaryMemory:
+    """Per-user running summaries maintained off the request path"""
+
+    def __init__(self,
+                 summarize: Callable[[str, List[Turn]], Awaitable[str]],
+                 sessions: SessionStore,
+                 is_idle: Callable[[], bool],
+                 keep_recent_messages: int = 6,
+                 batch_messages: int = 6,
+                 min_interval_seconds: float = 5.0,
+                 idle_poll_seconds: float = 1.0):
+        self.summarize = summarize
+        self.sessions = sessions
+        self.is_idle = is_idle
+        self.keep_recent_messages = keep_recent_messages
+        self.batch_messages = batch_messages
+        self.min_interval_seconds = min_interval_seconds
+        self.idle_poll_seconds = idle_poll_seconds
+        self._pending: Set[str] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+        self._worker: Optional[asyncio.Task] = None
+        self._last_call = 0.0
+
+    def schedule(self, user_id: str):
+        """Queue a user for folding once enough old turns have built up"""
+        foldable = self.sessions.message_count(user_id) - self.keep_recent_messages
+        if foldable < self.batch_messages:
+            return
+        self._pending.add(user_id)
+        metrics.set_gauge("summary_pending_users", len(self._pending))
+        self._ensure_worker()
+        self._wakeup.set()
+
+    def forget(self, user_id: str):
+        self._pending.discard(user_id)
+
+    def clear(self):
+        self._pending.clear()
+
+    def _ensure_worker(self):
+        if self._worker is None or self._worker.done():
+            self._wakeup = asyncio.Event()
+            self._worker = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._pending:
+                # Yield to live traffic: wait for an idle LLM queue and respect
+                # the minimum spacing between summarization calls
+                while not self.is_idle() or time.monotonic() - self._last_call < self.min_interval_seconds:
+                    await asyncio.sleep(self.idle_poll_seconds)
+                # forget()/clear() may have emptied the set while we waited
+                if not self._pending:
+                    break
+                user_id = self._pending.pop()
+                metrics.set_gauge("summary_pending_users", len(self._pending))
+                try:
+                    await self._fold(user_id)
+                except Exception as e:
+                    metrics.incr("summary_errors")
+                    log.error("summary_failed", user_id=user_id, error=str(e))
+
+    async def _fold(self, user_id: str):
+        turns = self.sessions.get_turns(user_id)
+        foldable = len(turns) - self.keep_recent_messages
+        if foldable < self.batch_messages:
+            return
+        old_turns = turns[:foldable]
+
+        self._last_call = time.monotonic()
+        start = time.perf_counter()
+        summary = await self.summarize(self.sessions.get_summary(user_id), old_turns)
+        metrics.observe("summary_latency", (time.perf_counter() - start) * 1000)
+
+        if not summary:
+            return
+        # Skipped if the history was cleared, or another worker folded it,
+        # while we were waiting on the LLM
+        if not self.sessions.fold_turns(user_id, old_turns, summary):
+            metrics.incr("summary_fold_conflicts")
+            return
+        metrics.incr("summary_folded_messages", foldable)
@@ -0,0 +1,233 @@
+"""
+Incrementally maintained per-user conversation stats.
+
+Every stored turn updates a small aggregate per user (turn count, first and
+last seen, bytes stored) that is persisted as JSON next to the vector
+store. Admin endpoints read this aggregate in O(users) instead of pulling
+documents out of ChromaDB and grouping them in Python.
+
+``SQLiteUserStatsStore`` keeps the same aggregate in the shared session
+database instead, so every worker sees (and updates) one copy.
+"""
+import json
+import os
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from session_store import SQLiteSessionStore
+from structured_logging import get_logger
+
+STATS_FILENAME = "user_stats.json"
+
+log = get_logger("buddy.user_stats")
+
+
+def aggregate(metadatas: Iterable[Tuple[Dict[str, Any], int]]) -> Dict[str, Dict[str, Any]]:
+    """Per-user stats from ``(metadata, size_bytes)`` pairs of stored documents (summaries excluded)"""
+    users: Dict[str, Dict[str, Any]] = {}
+    for meta, size_bytes in metadatas:
+        if meta.get("type") == "summary":
+            continue
+        user_id = meta.get("user_id", "unknown")
+        timestamp = meta.get("timestamp", "")
+        stats = users.setdefault(user_id, {
+            "turn_count": 0, "first_seen": timestamp, "last_seen": timestamp, "bytes_stored": 0
+        })
+        stats["turn_count"] += 1
+        stats["bytes_stored"] += size_bytes
+        stats["first_seen"] = min(stats["first_seen"], timestamp)
+        stats["last_seen"] = max(stats["last_seen"], timestamp)
+    return users
+
+
+class UserStatsStore:
+    """Per-user aggregate with debounced JSON persistence"""
+
+    def __init__(self, directory: str, flush_delay_seconds: float = 1.0):
+        self.path = os.path.join(directory, STATS_FILENAME)
+        self.flush_delay_seconds = flush_delay_seconds
+        self._lock = threading.Lock()
+        self._flush_timer: Optional[threading.Timer] = None
+        self._write_lock = threading.Lock()
+        self.users: Dict[str, Dict[str, Any]] = {}
+        self.loaded_from_disk = False
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    self.users = json.load(f)
+                self.loaded_from_disk = True
+            except (OSError, ValueError) as e:
+                log.warning("user_stats_load_failed", path=self.path, error=str(e))
+
+    def record_turn(self, user_id: str, timestamp: str, size_bytes: int):
+        with self._lock:
+            stats = self.users.get(user_id)
+            if stats is None:
+                stats = self.users[user_id] = {
+                    "turn_count": 0,
+                    "first_seen": timestamp,
+                    "last_seen": timestamp,
+                    "bytes_stored": 0,
+                }
+            stats["turn_count"] += 1
+            stats["bytes_stored"] += size_bytes
+            stats["first_seen"] = min(stats["first_seen"], timestamp)
+            stats["last_seen"] = max(stats["last_seen"], timestamp)
+        self._schedule_flush()
+
+    def get(self, user_id: str) -> Dict[str, Any]:
+        with self._lock:
+            return dict(self.users.get(user_id, {}))
+
+    def remove_user(self, user_id: str):
+        with self._lock:
+            self.users.pop(user_id, None)
+        self._schedule_flush()
+
+    def replace_user(self, user_id: str, stats: Optional[Dict[str, Any]]):
+        """Overwrite one user's aggregate (after compaction); None removes it"""
+        with self._lock:
+            if stats:
+                self.users[user_id] = dict(stats)
+            else:
+                self.users.pop(user_id, None)
+        self._schedule_flush()
+
+    def clear(self):
+        with self._lock:
+            self.users.clear()
+        self._schedule_flush()
+
+    def rebuild(self, metadatas: Iterable[Tuple[Dict[str, Any], int]]):
+        """Recompute every aggregate from ``(metadata, size_bytes)`` pairs of stored documents"""
+        users = aggregate(metadatas)
+        with self._lock:
+            self.users = users
+        self.flush()
+
+    def page(self, offset: int = 0, limit: int = 50, order_by: str = "last_seen") -> List[Dict[str, Any]]:
+        """Users sorted by ``order_by`` (descending), one page at a time"""
+        with self._lock:
+            rows = [{"user_id": user_id, **stats} for user_id, stats in self.users.items()]
+        rows.sort(key=lambda row: row.get(order_by, ""), reverse=True)
+        return rows[offset:offset + limit]
+
+    def totals(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "total_users": len(self.users),
+                "total_conversations": sum(s["turn_count"] for s in self.users.values()),
+                "total_bytes": sum(s["bytes_stored"] for s in self.users.values()),
+            }
+
+    def _schedule_flush(self):
+        # Coalesce bursts of writes into one file write
+        with self._lock:
+            if self._flush_timer is not None:
+                return
+            self._flush_timer = threading.Timer(self.flush_delay_seconds, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+
+    def flush(self):
+        with self._lock:
+            self._flush_timer = None
+            snapshot = json.dumps(self.users)
+        try:
+            with self._write_lock:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                tmp_path = f"{self.path}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    f.write(snapshot)
+                os.replace(tmp_path, self.path)
+        except OSError as e:
+            log.error("user_stats_save_failed", path=self.path, error=str(e))
+
+    def close(self):
+        """Write pending changes now; the flush timer is a daemon thread and dies with the process"""
+        with self._lock:
+            timer = self._flush_timer
+        if timer is not None:
+            timer.cancel()
+            self.flush()
+
+
+class SQLiteUserStatsStore:
+    """The same aggregate kept in the shared SQLite session database"""
+
+    COLUMNS = ("turn_count", "first_seen", "last_seen", "bytes_stored")
+    ORDERABLE = set(COLUMNS) | {"user_id"}
+
+    def __init__(self, db: SQLiteSessionStore):
+        self.db = db
+        with db.transaction(write=True) as conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS user_stats ("
+                "user_id TEXT PRIMARY KEY, turn_count INTEGER NOT NULL, first_seen TEXT NOT NULL, "
+                "last_seen TEXT NOT NULL, bytes_stored INTEGER NOT NULL)"
+            )
+            self.loaded_from_disk = conn.execute("SELECT 1 FROM user_stats LIMIT 1").fetchone() is not None
+
+    def record_turn(self, user_id: str, timestamp: str, size_bytes: int):
+        with self.db.transaction(write=True) as conn:
+            conn.execute(
+                "INSERT INTO user_stats VALUES (?, 1, ?, ?, ?) ON CONFLICT (user_id) DO UPDATE SET "
+                "turn_count = turn_count + 1, bytes_stored = bytes_stored + excluded.bytes_stored, "
+                "first_seen = MIN(first_seen, excluded.first_seen), last_seen = MAX(last_seen, excluded.last_seen)",
+                (user_id, timestamp, timestamp, size_bytes)
+            )
+
+    def get(self, user_id: str) -> Dict[str, Any]:
+        with self.db.transaction() as conn:
+            row = conn.execute(f"SELECT {', '.join(self.COLUMNS)} FROM user_stats WHERE user_id = ?", (user_id,)).fetchone()
+        return dict(zip(self.COLUMNS, row)) if row else {}
+
+    def remove_user(self, user_id: str):
+        with self.db.transaction(write=True) as conn:
+            conn.execute("DELETE FROM user_stats WHERE user_id = ?", (user_id,))
+
+    def replace_user(self, user_id: str, stats: Optional[Dict[str, Any]]):
+        """Overwrite one user's aggregate (after compaction); None removes it"""
+        with self.db.transaction(write=True) as conn:
+            if stats:
+                conn.execute(
+                    "INSERT OR REPLACE INTO user_stats VALUES (?, ?, ?, ?, ?)",
+                    (user_id, *(stats[column] for column in self.COLUMNS))
+                )
+            else:
+                conn.execute("DELETE FROM user_stats WHERE user_id = ?", (user_id,))
+
+    def clear(self):
+        with self.db.transaction(write=True) as conn:
+            conn.execute("DELETE FROM user_stats")
+
+    def rebuild(self, metadatas: Iterable[Tuple[Dict[str, Any], int]]):
+        """Recompute every aggregate from ``(metadata, size_bytes)`` pairs of stored documents"""
+        users = aggregate(metadatas)
+        with self.db.transaction(write=True) as conn:
+            conn.execute("DELETE FROM user_stats")
+            conn.executemany(
+                "INSERT INTO user_stats VALUES (?, ?, ?, ?, ?)",
+                [(user_id, *(stats[column] for column in self.COLUMNS)) for user_id, stats in users.items()]
+            )
+
+    def page(self, offset: int = 0, limit: int = 50, order_by: str = "last_seen") -> List[Dict[str, Any]]:
+        """Users sorted by ``order_by`` (descending), one page at a time"""
+        if order_by not in self.ORDERABLE:
+            order_by = "last_seen"
+        with self.db.transaction() as conn:
+            rows = conn.execute(
+                f"SELECT user_id, {', '.join(self.COLUMNS)} FROM user_stats ORDER BY {order_by} DESC LIMIT ? OFFSET ?",
+                (limit, offset)
+            ).fetchall()
+        return [dict(zip(("user_id",) + self.COLUMNS, row)) for row in rows]
+
+    def totals(self) -> Dict[str, int]:
+        with self.db.transaction() as conn:
+            users, conversations, size = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(turn_count), 0), COALESCE(SUM(bytes_stored), 0) FROM user_stats"
+            ).fetchone()
+        return {"total_users": users, "total_conversations": conversations, "total_bytes": size}
+
+    def close(self):
+        """Nothing to flush: every update is already committed"""